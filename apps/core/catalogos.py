@@ -0,0 +1,138 @@
+"""
+Caché por proceso de las tablas de catálogo (estados, métodos de pago,
+tipos de movimiento...). Resuelve nombre → fila e id → nombre en memoria.
+
+Invalidación:
+- post_save/post_delete del modelo limpian la caché local y suben la
+  versión compartida en la caché de Django (otros procesos la revisan
+  cada REVISION_SEGUNDOS).
+- Mientras la transacción que escribió el catálogo sigue abierta, este
+  hilo lee directo de la BD sin cachear: un rollback no deja ids
+  inexistentes en memoria.
+"""
+import copy
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+REVISION_SEGUNDOS = 5
+
+
+class Catalogo:
+    def __init__(self, modelo):
+        self.etiqueta = modelo  # "app_label.Modelo"
+        self._lock = threading.Lock()
+        self._por_nombre = None
+        self._por_id = None
+        self._version = None
+        self._revisado = 0
+
+    @property
+    def modelo(self):
+        return apps.get_model(self.etiqueta)
+
+    @property
+    def _clave_version(self):
+        return f"catalogos:{self.etiqueta}:version"
+
+    # ---------- Carga ----------
+    def _escritura_pendiente(self):
+        # El callback sigue en la cola on_commit mientras la transacción
+        # que escribió esté abierta; Django lo descarta si hace rollback.
+        return any(func == self._confirmar
+                   for _, func, _ in connection.run_on_commit)
+
+    def _filas(self):
+        if self._escritura_pendiente():
+            return self._leer()
+
+        ahora = time.monotonic()
+        if self._por_nombre is not None and ahora - self._revisado < REVISION_SEGUNDOS:
+            return self._por_nombre, self._por_id
+
+        with self._lock:
+            version = cache.get(self._clave_version)
+            if self._por_nombre is None or version != self._version:
+                self._por_nombre, self._por_id = self._leer()
+                self._version = version
+            self._revisado = ahora
+            return self._por_nombre, self._por_id
+
+    def _leer(self):
+        filas = list(self.modelo.objects.all())
+        return {f.nombre: f for f in filas}, {f.pk: f for f in filas}
+
+    def _olvidar(self):
+        with self._lock:
+            self._por_nombre = self._por_id = None
+
+    def invalidar(self):
+        """Limpia la caché local y avisa a los demás procesos."""
+        self._olvidar()
+        cache.set(self._clave_version, time.time_ns(), None)
+
+    # ---------- Consultas ----------
+    def obtener(self, nombre, crear=True, **defaults):
+        """Equivalente cacheado de get_or_create(nombre=...) (o get si crear=False)."""
+        fila = self._filas()[0].get(nombre)
+        if fila is None:
+            if not crear:
+                raise self.modelo.DoesNotExist(
+                    f"{self.modelo.__name__} '{nombre}' no existe.")
+            fila, _ = self.modelo.objects.get_or_create(
+                nombre=nombre, defaults=defaults)
+            return fila
+        return copy.copy(fila)
+
+    def id(self, nombre, crear=True):
+        return self.obtener(nombre, crear=crear).pk
+
+    def nombre(self, pk):
+        if pk is None:
+            return None
+        fila = self._filas()[1].get(pk)
+        if fila is None:
+            # Fila nueva de otro proceso aún no vista: se recarga una vez
+            self._olvidar()
+            fila = self._filas()[1].get(pk)
+        return fila.nombre if fila else None
+
+    def ids(self, nombres):
+        por_nombre = self._filas()[0]
+        return [por_nombre[n].pk for n in nombres if n in por_nombre]
+
+    # ---------- Señales ----------
+    def _al_escribir(self, sender, **kwargs):
+        self.invalidar()
+        if connection.in_atomic_block:
+            transaction.on_commit(self._confirmar)
+
+    def _confirmar(self):
+        self.invalidar()
+
+
+estados_pedido = Catalogo("pedidos.EstadoPedido")
+metodos_pago = Catalogo("pedidos.MetodoPago")
+estados_credito = Catalogo("finanzas.EstadoCredito")
+tipos_movimiento = Catalogo("finanzas.TipoMovimiento")
+estados_solicitud = Catalogo("finanzas.EstadoSolicitud")
+estados_reserva = Catalogo("reservas.EstadoReserva")
+
+CATALOGOS = [estados_pedido, metodos_pago, estados_credito,
+             tipos_movimiento, estados_solicitud, estados_reserva]
+
+
+def invalidar_todos():
+    for catalogo in CATALOGOS:
+        catalogo.invalidar()
+
+
+def conectar_senales():
+    for catalogo in CATALOGOS:
+        for senal in (post_save, post_delete):
+            senal.connect(catalogo._al_escribir, sender=catalogo.etiqueta,
+                          weak=False, dispatch_uid=f"catalogo-{catalogo.etiqueta}")
@@ -0,0 +1,101 @@
+"""
+Control de concurrencia optimista con una columna `version`.
+
+- VersionadoMixin: el UPDATE de save() lleva `WHERE version = <leída>` y
+  suma 1. Si otro proceso guardó antes no se actualiza ninguna fila y se
+  lanza ConflictoVersion en vez de pisar sus cambios.
+- Los UPDATE por queryset sobre filas versionadas suben la versión con
+  siguiente_version() (ver inventario.stock y pedidos.estados).
+- reintentar(): reintento acotado para los servicios que pueden releer y
+  recalcular lo que escriben.
+- VersionSerializerMixin / ConflictoVersionMixin: la API recibe la
+  `version` que vio el cliente y responde 409 con la representación actual.
+"""
+from django.db import transaction
+from django.db.models import F
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+INTENTOS = 3
+
+
+class ConflictoVersion(Exception):
+    """
+    La fila cambió desde que se leyó. Como un IntegrityError, deja la
+    transacción en curso marcada para rollback: se captura fuera de un
+    savepoint (reintentar y ConflictoVersionMixin ya lo abren).
+    """
+
+    def __init__(self, instancia):
+        self.instancia = instancia
+        super().__init__(
+            f"{instancia._meta.verbose_name.capitalize()} #{instancia.pk} "
+            f"fue modificado por otro usuario. Recarga e intenta de nuevo.")
+
+
+def siguiente_version():
+    """Expresión para subir la versión en un UPDATE por queryset."""
+    return F("version") + 1
+
+
+# ---------- Modelos ----------
+class VersionadoMixin:
+    """Para modelos con `version = PositiveIntegerField(default=0, editable=False)`."""
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        leida = self.version
+        campo = self._meta.get_field("version")
+        values = [v for v in values if v[0] is not campo]
+        values.append((campo, None, leida + 1))
+        actualizado = super()._do_update(
+            base_qs.filter(version=leida), using, pk_val, values,
+            update_fields, forced_update)
+        if actualizado:
+            self.version = leida + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise ConflictoVersion(self)
+        return actualizado
+
+
+def reintentar(funcion, recargar, intentos=INTENTOS):
+    """
+    Ejecuta `funcion` en un savepoint; si hay ConflictoVersion llama a
+    `recargar` y vuelve a intentar, hasta `intentos` veces.
+    """
+    for intento in range(1, intentos + 1):
+        try:
+            with transaction.atomic():
+                return funcion()
+        except ConflictoVersion:
+            if intento == intentos:
+                raise
+            recargar()
+
+
+# ---------- API ----------
+class VersionSerializerMixin(serializers.Serializer):
+    """`version` de lectura; si el cliente la envía, el guardado la compara."""
+    version = serializers.IntegerField(required=False, min_value=0)
+
+    def create(self, validated_data):
+        validated_data.pop("version", None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        version = validated_data.pop("version", None)
+        if version is not None:
+            instance.version = version
+        return super().update(instance, validated_data)
+
+
+class ConflictoVersionMixin:
+    """Vistas de actualización: 409 con el estado actual ante un conflicto."""
+
+    def update(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except ConflictoVersion as e:
+            actual = self.get_serializer(self.get_object())
+            return Response({"error": str(e), "actual": actual.data},
+                            status=status.HTTP_409_CONFLICT)
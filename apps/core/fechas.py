@@ -0,0 +1,31 @@
+"""
+Días de negocio en hora local (settings.TIME_ZONE, America/Bogota).
+
+Devuelven rangos [inicio, fin) de datetimes con zona horaria para filtrar
+con `campo__gte=inicio, campo__lt=fin`. A diferencia de `campo__date=...`,
+que envuelve la columna en un cast, el rango deja usar los índices.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_dias(desde, hasta):
+    """Desde el inicio de `desde` hasta el final de `hasta` (inclusive)."""
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
+
+
+def rango_dia(fecha=None):
+    """Rango del día `fecha` (por defecto, hoy en hora local)."""
+    fecha = fecha or timezone.localdate()
+    return rango_dias(fecha, fecha)
+
+
+def filtro_dia(campo, fecha=None):
+    """kwargs listos para filter(): {"campo__gte": inicio, "campo__lt": fin}."""
+    inicio, fin = rango_dia(fecha)
+    return {f"{campo}__gte": inicio, f"{campo}__lt": fin}
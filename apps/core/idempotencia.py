@@ -0,0 +1,98 @@
+"""
+Idempotency-Key para los POST que crean pedidos o mueven crédito.
+
+Un reintento con la misma clave (mismo usuario, método y ruta) recibe la
+respuesta guardada del primer intento sin volver a ejecutar la vista:
+
+- Primer intento: `cache.add` reserva la clave como "en curso" (atómico
+  en LocMem, Redis y Memcached), corre la vista y guarda la respuesta.
+- Reintento mientras el primero sigue en curso: 409 con Retry-After.
+- Misma clave con otro cuerpo: 422.
+- Excepciones y respuestas 5xx liberan la clave para poder reintentar.
+
+Sin la cabecera la vista se ejecuta como siempre.
+"""
+import functools
+import hashlib
+import json
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+CABECERA = "Idempotency-Key"
+TTL = 60 * 60 * 24
+TTL_EN_CURSO = 60
+LARGO_MAXIMO = 255
+# Cabeceras de la respuesta original que se repiten
+CABECERAS_GUARDADAS = ("Location",)
+
+_EN_CURSO = "en-curso"
+
+
+def _clave(request, valor):
+    usuario = request.user.pk if request.user.is_authenticated else "anonimo"
+    crudo = f"{usuario}:{request.method}:{request.path}:{valor}"
+    return "idempotencia:" + hashlib.sha256(crudo.encode()).hexdigest()
+
+
+def _huella(request):
+    datos = request.data
+    if hasattr(datos, "lists"):  # QueryDict (form/multipart)
+        datos = dict(datos.lists())
+    cuerpo = json.dumps(datos, sort_keys=True, default=str)
+    return hashlib.sha256(cuerpo.encode()).hexdigest()
+
+
+def _repetir(guardada):
+    respuesta = Response(guardada["datos"], status=guardada["status"])
+    for nombre, valor in guardada["cabeceras"].items():
+        respuesta[nombre] = valor
+    respuesta["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+def idempotente(vista):
+    """Decora un handler DRF: función de @api_view o método de una vista."""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        request = args[0] if isinstance(args[0], Request) else args[1]
+        valor = request.headers.get(CABECERA)
+        if not valor:
+            return vista(*args, **kwargs)
+        if len(valor) > LARGO_MAXIMO:
+            return Response({"error": f"{CABECERA} demasiado larga."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        clave, huella = _clave(request, valor), _huella(request)
+        if not cache.add(clave, _EN_CURSO, TTL_EN_CURSO):
+            guardada = cache.get(clave)
+            if not isinstance(guardada, dict):
+                return Response(
+                    {"error": "La petición original aún se está procesando."},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"})
+            if guardada["huella"] != huella:
+                return Response(
+                    {"error": f"{CABECERA} ya se usó con otro contenido."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return _repetir(guardada)
+
+        try:
+            respuesta = vista(*args, **kwargs)
+        except Exception:
+            cache.delete(clave)
+            raise
+        if respuesta.status_code >= 500 or not hasattr(respuesta, "data"):
+            cache.delete(clave)
+            return respuesta
+        cache.set(clave, {
+            "huella": huella,
+            "status": respuesta.status_code,
+            "datos": respuesta.data,
+            "cabeceras": {c: respuesta[c] for c in CABECERAS_GUARDADAS
+                          if respuesta.has_header(c)},
+        }, TTL)
+        return respuesta
+    return envoltura
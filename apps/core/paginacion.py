@@ -0,0 +1,134 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre una clave compuesta (p. ej. fecha + id).
+    El cursor guarda los valores de la última fila; la siguiente página es
+    un WHERE sobre el índice, así que el costo no crece con la profundidad
+    (a diferencia de OFFSET) y las páginas no se corren si entran filas nuevas.
+
+    `ordering` debe terminar en un campo único (normalmente "-id").
+
+    También acepta una lista de querysets con los mismos campos (p. ej.
+    pedidos vivos + archivados): cada uno se corta con el mismo cursor y
+    las filas se mezclan por la clave.
+    """
+    ordering = ("-id",)
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        particiones = queryset if isinstance(queryset, list) else [queryset]
+        self._modelo = particiones[0].model
+        tamano = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        despues = self._despues_de(self._decodificar(cursor)) if cursor else None
+
+        filas = []
+        for qs in particiones:
+            qs = qs.order_by(*self.ordering)
+            if despues is not None:
+                qs = qs.filter(despues)
+            filas.extend(qs[:tamano + 1])
+        if len(particiones) > 1:
+            self._ordenar(filas)
+        self.hay_siguiente = len(filas) > tamano
+        self.page = filas[:tamano]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.hay_siguiente:
+            return None
+        ultima = self.page[-1]
+        valores = [getattr(ultima, campo.lstrip("-")) for campo in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self._codificar(valores))
+
+    def _ordenar(self, filas):
+        # Ordenamientos estables del último campo al primero
+        for campo in reversed(self.ordering):
+            nombre = campo.lstrip("-")
+            filas.sort(key=lambda fila: getattr(fila, nombre),
+                       reverse=campo.startswith("-"))
+
+    # ---------- Cursor ----------
+    def _codificar(self, valores):
+        return codificar_cursor(valores)
+
+    def _decodificar(self, cursor):
+        return decodificar_cursor(cursor, self._modelo, self.ordering)
+
+    def _despues_de(self, valores):
+        return despues_de(self.ordering, valores)
+
+
+# ---------- Cursor (también lo usa el token de pedidos.sincronizacion) ----------
+def codificar_cursor(valores):
+    crudo = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v
+                        for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, modelo, ordering):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(ordering):
+            raise ValueError
+        return [modelo._meta.get_field(campo.lstrip("-")).to_python(v)
+                for campo, v in zip(ordering, valores)]
+    except Exception:
+        raise NotFound("Cursor inválido.")
+
+
+def despues_de(ordering, valores):
+    """(a, b, c) > (x, y, z) en el orden dado, como OR de prefijos iguales."""
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(ordering, valores):
+        nombre = campo.lstrip("-")
+        lookup = "lt" if campo.startswith("-") else "gt"
+        condicion |= Q(**iguales, **{f"{nombre}__{lookup}": valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+class PedidoCursorPagination(KeysetPagination):
+    ordering = ("-fecha_pedido", "-id")
+    page_size = 20
+    max_page_size = 100
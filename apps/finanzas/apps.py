@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinanzasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.finanzas'
+
+    def ready(self):
+        from . import elegibilidad
+        elegibilidad.conectar_senales()
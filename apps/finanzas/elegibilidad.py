@@ -0,0 +1,127 @@
+"""
+Elegibilidad de crédito por cliente: ¿tiene un crédito Activo y con qué
+saldo? La consulta la hace la señal validar_credito en cada guardado de
+un pedido a crédito, así que se resuelve en dos niveles:
+
+- Memo por hilo mientras dura una petición (request_started/finished).
+- Caché de Django por cliente (TTL corto), borrada en post_save/post_delete
+  de Credito y MovimientoCredito.
+
+Mientras la transacción que escribió un crédito sigue abierta, este hilo
+no guarda en memo ni en la caché compartida (un rollback dejaría un saldo
+que no existe); la entrada se borra otra vez al confirmar.
+
+Es solo para validar: las escrituras (consumir, pagar) usan la fila real.
+"""
+import threading
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.core.signals import request_started, request_finished
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+from apps.core import catalogos
+
+TTL = 30
+
+Elegibilidad = namedtuple("Elegibilidad", "credito_id saldo")
+
+_memo = threading.local()
+_SIN_CREDITO = "sin-credito"
+
+
+def _clave(cliente_id):
+    return f"finanzas:elegibilidad:{cliente_id}"
+
+
+def _memo_local():
+    """Dict del memo de la petición en curso; None fuera de una petición."""
+    return getattr(_memo, "valores", None)
+
+
+def _abrir_memo(**kwargs):
+    _memo.valores = {}
+
+
+def _cerrar_memo(**kwargs):
+    _memo.valores = None
+
+
+# ---------- Consulta ----------
+def _leer(cliente_id):
+    from .models import Credito
+    fila = (Credito.objects.filter(
+        cliente_id=cliente_id,
+        estado_id__in=catalogos.estados_credito.ids(["Activo"]),
+    ).values_list("id", "saldo").first())
+    return Elegibilidad(*fila) if fila else None
+
+
+def _escritura_pendiente():
+    return any(func == _confirmar_escritura
+               for _, func, _ in connection.run_on_commit)
+
+
+def credito_elegible(cliente_id):
+    """Elegibilidad(credito_id, saldo) del crédito Activo del cliente, o None."""
+    if not cliente_id:
+        return None
+    if _escritura_pendiente():
+        return _leer(cliente_id)
+
+    memo = _memo_local()
+    if memo is not None and cliente_id in memo:
+        return memo[cliente_id]
+
+    valor = cache.get(_clave(cliente_id))
+    if valor is None:
+        valor = _leer(cliente_id)
+        cache.set(_clave(cliente_id), valor or _SIN_CREDITO, TTL)
+    elif valor == _SIN_CREDITO:
+        valor = None
+
+    if memo is not None:
+        memo[cliente_id] = valor
+    return valor
+
+
+# ---------- Invalidación ----------
+def invalidar(cliente_id):
+    memo = _memo_local()
+    if memo is not None:
+        memo.pop(cliente_id, None)
+    cache.delete(_clave(cliente_id))
+
+
+def _confirmar_escritura():
+    # Marca de "escritura pendiente": sigue en la cola on_commit mientras
+    # la transacción esté abierta y Django la descarta si hay rollback.
+    pass
+
+
+def _al_escribir_credito(sender, instance, **kwargs):
+    _invalidar_al_confirmar(instance.cliente_id)
+
+
+def _al_escribir_movimiento(sender, instance, **kwargs):
+    # MovimientoCredito.save ya guarda el crédito; esto cubre altas/bajas directas
+    _invalidar_al_confirmar(instance.credito.cliente_id)
+
+
+def _invalidar_al_confirmar(cliente_id):
+    invalidar(cliente_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: invalidar(cliente_id))
+        if not _escritura_pendiente():
+            transaction.on_commit(_confirmar_escritura)
+
+
+def conectar_senales():
+    request_started.connect(_abrir_memo, dispatch_uid="elegibilidad-abrir-memo")
+    request_finished.connect(_cerrar_memo, dispatch_uid="elegibilidad-cerrar-memo")
+    for accion, senal in (("save", post_save), ("delete", post_delete)):
+        senal.connect(_al_escribir_credito, sender="finanzas.Credito",
+                      dispatch_uid=f"elegibilidad-credito-{accion}")
+        senal.connect(_al_escribir_movimiento, sender="finanzas.MovimientoCredito",
+                      dispatch_uid=f"elegibilidad-movimiento-{accion}")
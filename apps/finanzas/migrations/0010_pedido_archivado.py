@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0009_solicitudacreditacion_fecha_rechazo'),
+        ('pedidos', '0016_pedidoarchivado_detallepedidoarchivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditoriacredito',
+            name='pedido_archivado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='auditorias_credito', to='pedidos.pedidoarchivado'),
+        ),
+        migrations.AddField(
+            model_name='movimientocredito',
+            name='pedido_archivado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_credito', to='pedidos.pedidoarchivado'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from apps.core import catalogos
 
 User = get_user_model()
 
@@ -21,18 +22,18 @@ def validar_fecha_en_rango(credito, fecha_op=None):
 
 
 def validar_activar(credito, usuario):
-    if credito.estado and credito.estado.nombre == "Suspendido" and not usuario.is_staff:
+    if credito.nombre_estado == "Suspendido" and not usuario.is_staff:
         raise ValidationError(
             "Solo un administrador puede re-activar un crédito suspendido.")
 
 
 def validar_pago_con_estado(credito):
-    if credito.estado and credito.estado.nombre == "Pagado":
+    if credito.nombre_estado == "Pagado":
         raise ValidationError("El crédito ya está pagado.")
 
 
 def validar_cambio_a_pagado(credito):
-    if credito.estado and credito.estado.nombre == "Pagado" and credito.deuda > 0:
+    if credito.nombre_estado == "Pagado" and credito.deuda > 0:
         raise ValidationError(
             "No se puede marcar como Pagado mientras la deuda sea superior a 0.")
 
@@ -76,12 +77,16 @@ class Credito(models.Model):
     def deuda(self):
         return self.limite - self.saldo
 
+    @property
+    def nombre_estado(self):
+        return catalogos.estados_credito.nombre(self.estado_id)
+
     def clean(self):
         super().clean()
         if self.pk:
             validar_cambio_a_pagado(self)
         if self.fecha_fin and timezone.now() > self.fecha_fin:
-            if self.estado and self.estado.nombre == "Activo":
+            if self.nombre_estado == "Activo":
                 raise ValidationError(
                     "No se puede re-activar un crédito vencido.")
 
@@ -93,12 +98,11 @@ class Credito(models.Model):
 
     def actualizar_estado(self):
         if self.saldo == self.limite:
-            estado, _ = EstadoCredito.objects.get_or_create(nombre="Pagado")
+            estado = catalogos.estados_credito.obtener("Pagado")
         elif self.saldo > 0:
-            estado, _ = EstadoCredito.objects.get_or_create(nombre="Activo")
+            estado = catalogos.estados_credito.obtener("Activo")
         else:
-            estado, _ = EstadoCredito.objects.get_or_create(
-                nombre="Suspendido")
+            estado = catalogos.estados_credito.obtener("Suspendido")
         self.estado = estado
         self.save(update_fields=["estado"])
 
@@ -108,8 +112,7 @@ class Credito(models.Model):
         if monto > self.saldo:
             raise ValueError("Saldo insuficiente.")
         validar_fecha_en_rango(self)
-        tipo_consumo, _ = TipoMovimiento.objects.get_or_create(
-            nombre="Consumo")
+        tipo_consumo = catalogos.tipos_movimiento.obtener("Consumo")
         MovimientoCredito.objects.create(
             credito=self,
             tipo=tipo_consumo,
@@ -129,7 +132,7 @@ class Credito(models.Model):
         if monto > deuda:
             raise ValueError("El pago excede la deuda.")
         validar_fecha_en_rango(self)
-        tipo_pago, _ = TipoMovimiento.objects.get_or_create(nombre="Pago")
+        tipo_pago = catalogos.tipos_movimiento.obtener("Pago")
         MovimientoCredito.objects.create(
             credito=self,
             tipo=tipo_pago,
@@ -154,21 +157,33 @@ class MovimientoCredito(models.Model):
         blank=True,
         related_name="movimientos_credito"
     )
+    # Si el pedido se archivó (ver pedidos.archivo), el enlace queda aquí
+    pedido_archivado = models.ForeignKey(
+        "pedidos.PedidoArchivado",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="movimientos_credito"
+    )
 
     class Meta:
         ordering = ["-fecha"]
 
+    @property
+    def nombre_tipo(self):
+        return catalogos.tipos_movimiento.nombre(self.tipo_id)
+
     def clean(self):
         super().clean()
         if self.monto is None or self.monto <= 0:
             raise ValidationError("Monto debe ser mayor a 0.")
-        if not self.tipo:
+        if not self.tipo_id:
             raise ValidationError("Tipo de movimiento obligatorio.")
         validar_fecha_en_rango(self.credito, self.fecha)
-        if self.tipo.nombre == "Consumo":
+        if self.nombre_tipo == "Consumo":
             if self.monto > self.credito.saldo:
                 raise ValidationError("Saldo insuficiente.")
-        elif self.tipo.nombre == "Pago":
+        elif self.nombre_tipo == "Pago":
             validar_pago_con_estado(self.credito)
             deuda = self.credito.limite - self.credito.saldo
             if self.monto > deuda:
@@ -177,9 +192,9 @@ class MovimientoCredito(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         with transaction.atomic():
-            if self.tipo.nombre == "Consumo":
+            if self.nombre_tipo == "Consumo":
                 self.credito.saldo -= self.monto
-            elif self.tipo.nombre == "Pago":
+            elif self.nombre_tipo == "Pago":
                 self.credito.saldo += self.monto
             self.credito.save(update_fields=["saldo"])
             super().save(*args, **kwargs)
@@ -188,7 +203,7 @@ class MovimientoCredito(models.Model):
                 credito=self.credito,
                 usuario=self.credito.cliente,
                 pedido=self.pedido,
-                accion=f"{self.tipo.nombre} de crédito",
+                accion=f"{self.nombre_tipo} de crédito",
                 detalle=f"Monto: {self.monto}",
             )
 
@@ -208,6 +223,13 @@ class AuditoriaCredito(models.Model):
         blank=True,
         related_name="auditorias_credito"
     )
+    pedido_archivado = models.ForeignKey(
+        "pedidos.PedidoArchivado",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="auditorias_credito"
+    )
     accion = models.CharField(max_length=100)
     fecha = models.DateTimeField(default=timezone.now)
     detalle = models.TextField(blank=True, null=True)
@@ -250,6 +272,6 @@ class SolicitudAcreditacion(models.Model):
         return f"Solicitud de {self.cliente} - ${self.monto_solicitado} ({self.estado})"
 
     def clean(self):
-        if self.estado and self.estado.nombre == "Aprobado" and not self.credito_resultante:
+        if catalogos.estados_solicitud.nombre(self.estado_id) == "Aprobado" and not self.credito_resultante:
             raise ValidationError(
                 "Una solicitud aprobada debe tener un crédito asociado.")
@@ -16,6 +16,8 @@ from .serializers import (
     EstadoSolicitudSerializer, SolicitudAcreditacionSerializer
 )
 from .filters import MovimientoFilter
+from apps.core import catalogos
+from apps.core.idempotencia import idempotente
 
 
 # ---------- ADMIN ----------
@@ -44,6 +46,7 @@ class CreditoViewSet(viewsets.ModelViewSet):
         return qs.filter(cliente=user).select_related("cliente", "estado")
 
     @action(detail=True, methods=["post"])
+    @idempotente
     def consumir(self, request, pk=None):
         credito = self.get_object()
         if credito.cliente != request.user:
@@ -65,6 +68,7 @@ class CreditoViewSet(viewsets.ModelViewSet):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=["post"])
+    @idempotente
     def pagar(self, request, pk=None):
         credito = self.get_object()
         if credito.cliente != request.user:
@@ -155,13 +159,13 @@ class SolicitudAcreditacionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         if SolicitudAcreditacion.objects.filter(
             cliente=self.request.user,
-            estado__nombre__in=["En revisión", "Aprobado"],
+            estado_id__in=catalogos.estados_solicitud.ids(
+                ["En revisión", "Aprobado"]),
             credito_resultante__isnull=True
         ).exists():
             raise serializers.ValidationError(
                 "Ya tienes una solicitud en curso.")
-        estado_pendiente, _ = EstadoSolicitud.objects.get_or_create(
-            nombre="En revisión")
+        estado_pendiente = catalogos.estados_solicitud.obtener("En revisión")
         serializer.save(cliente=self.request.user, estado=estado_pendiente)
 
     @action(detail=True, methods=["patch"], permission_classes=[permissions.IsAdminUser])
@@ -176,12 +180,12 @@ class SolicitudAcreditacionViewSet(viewsets.ModelViewSet):
         observaciones = request.data.get("observaciones_staff", "")
 
         try:
-            nuevo_estado = EstadoSolicitud.objects.get(
-                nombre=nuevo_estado_nombre)
+            nuevo_estado = catalogos.estados_solicitud.obtener(
+                nuevo_estado_nombre, crear=False)
         except EstadoSolicitud.DoesNotExist:
             return Response({"error": "Estado inválido."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if solicitud.estado.nombre != "En revisión":
+        if catalogos.estados_solicitud.nombre(solicitud.estado_id) != "En revisión":
             return Response({"error": "La solicitud ya fue respondida."}, status=status.HTTP_400_BAD_REQUEST)
 
         solicitud.estado = nuevo_estado
@@ -189,8 +193,7 @@ class SolicitudAcreditacionViewSet(viewsets.ModelViewSet):
         solicitud.fecha_respuesta = timezone.now()
 
         if nuevo_estado.nombre == "Aprobado":
-            estado_activo, _ = EstadoCredito.objects.get_or_create(
-                nombre="Activo")
+            estado_activo = catalogos.estados_credito.obtener("Activo")
             credito = Credito.objects.create(
                 cliente=solicitud.cliente,
                 limite=solicitud.monto_solicitado,
@@ -227,6 +230,7 @@ class CreditoListMeseroView(generics.ListAPIView):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotente
 def registrar_abono_mesero(request):
     """
     Registra un abono (pago) sobre un crédito existente.
@@ -249,7 +253,7 @@ def registrar_abono_mesero(request):
     credito = get_object_or_404(Credito, pk=credito_id)
 
     # Crear movimiento de tipo "Pago"
-    tipo_pago, _ = TipoMovimiento.objects.get_or_create(nombre="Pago")
+    tipo_pago = catalogos.tipos_movimiento.obtener("Pago")
     mov = credito.movimientos.create(
         tipo=tipo_pago,
         monto=monto,
@@ -3,7 +3,29 @@ from django.utils.html import format_html
 from django.db import transaction
 from django.shortcuts import render
 from django.forms import BaseInlineFormSet
-from .models import Ubicacion, Categoria, SubCategoria, Producto, ProductoVariante
+from django.http import HttpResponseRedirect
+from apps.core.concurrencia import ConflictoVersion, siguiente_version
+from .models import (
+    Ubicacion, Categoria, SubCategoria, Producto, ProductoVariante,
+    MovimientoInventario)
+from . import menu, stock
+
+# ---------- Concurrencia ----------
+
+
+class ConflictoVersionAdminMixin:
+    """
+    El motor de stock sube `version` en cada reserva/consumo: si una
+    variante cambió mientras se guardaba el formulario, se vuelve a él con
+    el error (la transacción del admin ya se revirtió) en vez de un 500.
+    """
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConflictoVersion as e:
+            messages.error(request, str(e))
+            return HttpResponseRedirect(request.get_full_path())
 
 # ---------- Ubicación ----------
 
@@ -69,7 +91,7 @@ class ProductoVarianteInline(admin.TabularInline):
 
 
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(ConflictoVersionAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'nombre', 'subcategoria', 'activo')
     list_filter = ('subcategoria__categoria', 'subcategoria', 'activo')
     search_fields = ('nombre', 'descripcion')
@@ -80,7 +102,7 @@ class ProductoAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductoVariante)
-class ProductoVarianteAdmin(admin.ModelAdmin):
+class ProductoVarianteAdmin(ConflictoVersionAdminMixin, admin.ModelAdmin):
     list_display = (
         "id", "sku", "codigo_barras", "nombre_variante",
         "stock_disponible_colored", "precio", "costo", "margen",
@@ -113,9 +135,13 @@ class ProductoVarianteAdmin(admin.ModelAdmin):
     def ajustar_stock(self, request, queryset):
         if "apply" in request.POST:
             cantidad = int(request.POST["cantidad"])
-            for variante in queryset:
-                variante.stock += cantidad
-                variante.save(update_fields=["stock"])
+            # Un solo UPDATE y su movimiento de kardex (ver stock.ajustar)
+            try:
+                stock.ajustar([(pk, cantidad) for pk in queryset.values_list("pk", flat=True)],
+                              usuario=request.user)
+            except stock.StockInsuficiente as e:
+                self.message_user(request, e.message, messages.ERROR)
+                return
             self.message_user(
                 request, f"Stock ajustado en {cantidad} unidades.", messages.SUCCESS)
             return
@@ -123,12 +149,14 @@ class ProductoVarianteAdmin(admin.ModelAdmin):
     ajustar_stock.short_description = "🔧 Ajustar stock masivamente"
 
     def activar_seleccionados(self, request, queryset):
-        queryset.update(activo=True)
+        queryset.update(activo=True, version=siguiente_version())
+        menu.invalidar()
         self.message_user(request, "Variantes activadas.", messages.SUCCESS)
     activar_seleccionados.short_description = "✅ Activar seleccionados"
 
     def desactivar_seleccionados(self, request, queryset):
-        queryset.update(activo=False)
+        queryset.update(activo=False, version=siguiente_version())
+        menu.invalidar()
         self.message_user(request, "Variantes desactivadas.", messages.SUCCESS)
     desactivar_seleccionados.short_description = "❌ Desactivar seleccionados"
 
@@ -136,9 +164,15 @@ class ProductoVarianteAdmin(admin.ModelAdmin):
         total = 0
         for variante in queryset:
             if variante.stock_bloqueado > 0:
-                total += variante.stock_bloqueado
+                bloqueado = variante.stock_bloqueado
                 variante.stock_bloqueado = 0
-                variante.save(update_fields=['stock_bloqueado'])
+                try:
+                    with transaction.atomic():
+                        variante.save(update_fields=['stock_bloqueado'])
+                except ConflictoVersion as e:
+                    self.message_user(request, str(e), messages.ERROR)
+                    continue
+                total += bloqueado
         self.message_user(
             request, f"Se liberaron {total} unidades bloqueadas.", messages.SUCCESS)
     liberar_bloqueo.short_description = "🔓 Liberar stock bloqueado"
@@ -147,3 +181,24 @@ class ProductoVarianteAdmin(admin.ModelAdmin):
         obj.clean()
         obj.save()
         super().save_model(request, obj, form, change)
+
+
+# ---------- Kardex ----------
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'variante', 'tipo', 'cantidad', 'delta_stock',
+                    'numero_pedido', 'usuario')
+    list_filter = ('tipo',)
+    search_fields = ('variante__sku', 'variante__nombre_variante')
+    list_select_related = ('variante__producto', 'usuario')
+    raw_id_fields = ('variante', 'usuario')
+
+    # El libro solo se agrega desde el motor de stock
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.inventario'
+
+    def ready(self):
+        from . import busqueda, imagenes, menu
+        menu.conectar_senales()
+        imagenes.conectar_senales()
+        busqueda.conectar_senales()
@@ -0,0 +1,269 @@
+"""
+Búsqueda de productos en memoria (BusquedaViewSet, /api/inventario/buscar/).
+
+Índice invertido por proceso sobre nombre del producto, nombre y SKU de
+sus variantes, subcategoría y categoría:
+
+- Texto normalizado: minúsculas y sin tildes ("Café" → "cafe", "ñ" → "n").
+- Prefijos: "capu" encuentra "capuchino" (mientras se escribe).
+- Errores de tipeo: términos de MIN_TIPEO letras o más aceptan un error
+  (letra de más, de menos, cambiada o dos letras invertidas), con el
+  vecindario de borrados de cada token precalculado.
+- Todos los términos tienen que coincidir; el puntaje suma el peso del
+  campo (PESOS) por la calidad de la coincidencia (exacta > prefijo > tipeo).
+
+Se arma completo en la primera búsqueda y después se mantiene con las
+señales del catálogo (al confirmar la transacción, solo los productos
+tocados). Como cada proceso tiene el suyo, se rearma cada REFRESCO para
+tomar lo escrito desde otros procesos.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_save, post_delete
+
+from .models import Categoria, Producto, ProductoVariante, SubCategoria
+
+REFRESCO = 15 * 60
+MIN_TIPEO = 4
+MAX_PREFIJO = 12
+
+PESOS = {"nombre": 5, "sku": 4, "variante": 3, "subcategoria": 2, "categoria": 1}
+CALIDAD = {"exacta": 1.0, "prefijo": 0.6, "tipeo": 0.4}
+
+# Campos de ProductoVariante que entran al índice
+CAMPOS_VARIANTE = {"nombre_variante", "sku", "producto", "producto_id"}
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+
+# ---------- Texto ----------
+def normalizar(texto):
+    """Minúsculas, sin tildes y solo letras/dígitos separados por espacio."""
+    plano = unicodedata.normalize("NFKD", texto or "")
+    plano = "".join(c for c in plano if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(" ", plano.casefold()).strip()
+
+
+def tokens(texto):
+    return normalizar(texto).split()
+
+
+def _borrados(token):
+    """El token y sus variantes con una letra menos."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _a_un_error(a, b):
+    """True si a y b difieren en a lo sumo una edición (con transposición)."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return (a[i + 1:] == b[i + 1:]
+                or (a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:]))
+    return a[i + 1:] == b[i:] if la > lb else a[i:] == b[i + 1:]
+
+
+def documento(producto):
+    """{token: peso} de un producto con subcategoría, categoría y variantes cargadas."""
+    pesos = {}
+
+    def sumar(texto, campo):
+        for token in tokens(texto):
+            pesos[token] = max(pesos.get(token, 0), PESOS[campo])
+
+    sumar(producto.nombre, "nombre")
+    for var in producto.variantes.all():
+        sumar(var.nombre_variante, "variante")
+        sumar(var.sku, "sku")
+        sumar(normalizar(var.sku).replace(" ", ""), "sku")  # "CAF-001" → "caf001"
+    sub = producto.subcategoria
+    if sub is not None:
+        sumar(sub.nombre, "subcategoria")
+        sumar(sub.categoria.nombre, "categoria")
+    return pesos
+
+
+# ---------- Índice ----------
+class Indice:
+    def __init__(self):
+        self.postings = {}                 # token → {producto_id: peso}
+        self.prefijos = defaultdict(set)   # prefijo → tokens
+        self.borrados = defaultdict(set)   # borrado → tokens
+        self.por_producto = {}             # producto_id → {token: peso}
+        self.nombres = {}                  # producto_id → nombre normalizado
+        self.creado = time.monotonic()
+
+    def poner(self, producto_id, nombre, pesos):
+        self.quitar(producto_id)
+        self.por_producto[producto_id] = pesos
+        self.nombres[producto_id] = normalizar(nombre)
+        for token, peso in pesos.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                for n in range(1, min(len(token), MAX_PREFIJO) + 1):
+                    self.prefijos[token[:n]].add(token)
+                if len(token) >= MIN_TIPEO - 1:
+                    for borrado in _borrados(token):
+                        self.borrados[borrado].add(token)
+            self.postings[token][producto_id] = peso
+
+    def quitar(self, producto_id):
+        self.nombres.pop(producto_id, None)
+        for token in self.por_producto.pop(producto_id, {}):
+            postings = self.postings[token]
+            postings.pop(producto_id, None)
+            if postings:
+                continue
+            del self.postings[token]
+            for n in range(1, min(len(token), MAX_PREFIJO) + 1):
+                self._descartar(self.prefijos, token[:n], token)
+            if len(token) >= MIN_TIPEO - 1:
+                for borrado in _borrados(token):
+                    self._descartar(self.borrados, borrado, token)
+
+    @staticmethod
+    def _descartar(mapa, clave, token):
+        grupo = mapa.get(clave)
+        if grupo is not None:
+            grupo.discard(token)
+            if not grupo:
+                del mapa[clave]
+
+    def _coincidencias(self, termino):
+        """{token: calidad} para un término de la consulta."""
+        encontrados = {}
+        if len(termino) >= MIN_TIPEO:
+            for borrado in _borrados(termino):
+                for token in self.borrados.get(borrado, ()):
+                    if _a_un_error(termino, token):
+                        encontrados[token] = CALIDAD["tipeo"]
+        for token in self.prefijos.get(termino[:MAX_PREFIJO], ()):
+            if token.startswith(termino):
+                encontrados[token] = CALIDAD["prefijo"]
+        if termino in self.postings:
+            encontrados[termino] = CALIDAD["exacta"]
+        return encontrados
+
+    def buscar(self, consulta):
+        """[(producto_id, puntaje), ...] de mayor a menor puntaje."""
+        puntajes = None
+        for termino in dict.fromkeys(tokens(consulta)):
+            del_termino = {}
+            for token, calidad in self._coincidencias(termino).items():
+                for producto_id, peso in self.postings[token].items():
+                    puntaje = peso * calidad
+                    if puntaje > del_termino.get(producto_id, 0):
+                        del_termino[producto_id] = puntaje
+            if puntajes is None:
+                puntajes = del_termino
+            else:
+                puntajes = {pid: p + del_termino[pid]
+                            for pid, p in puntajes.items() if pid in del_termino}
+            if not puntajes:
+                return []
+        return sorted((puntajes or {}).items(),
+                      key=lambda fila: (-fila[1], self.nombres[fila[0]], fila[0]))
+
+
+# ---------- Carga ----------
+def _productos(filtro=None):
+    qs = Producto.objects.filter(activo=True)
+    if filtro is not None:
+        qs = qs.filter(pk__in=filtro)
+    return qs.select_related("subcategoria__categoria").prefetch_related(
+        Prefetch("variantes", queryset=ProductoVariante.objects.only(
+            "id", "producto_id", "nombre_variante", "sku")))
+
+
+def armar():
+    indice = Indice()
+    for producto in _productos():
+        indice.poner(producto.id, producto.nombre, documento(producto))
+    return indice
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def indice():
+    global _indice
+    actual = _indice
+    if actual is None or time.monotonic() - actual.creado > REFRESCO:
+        nuevo = armar()
+        with _lock:
+            _indice = actual = nuevo
+    return actual
+
+
+def invalidar():
+    """Descarta el índice del proceso; se rearma en la próxima búsqueda."""
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def reindexar(producto_ids):
+    """Vuelve a leer esos productos; los que ya no están activos salen del índice."""
+    if _indice is None or not producto_ids:
+        return
+    vigentes = {p.id: p for p in _productos(producto_ids)}
+    with _lock:
+        actual = _indice
+        if actual is None:
+            return
+        for producto_id in producto_ids:
+            producto = vigentes.get(producto_id)
+            if producto is None:
+                actual.quitar(producto_id)
+            else:
+                actual.poner(producto_id, producto.nombre, documento(producto))
+
+
+def buscar(consulta):
+    actual = indice()
+    with _lock:
+        return actual.buscar(consulta)
+
+
+# ---------- Señales ----------
+def _afectados(sender, instance):
+    if sender is Producto:
+        return [instance.pk]
+    if sender is ProductoVariante:
+        return [instance.producto_id]
+    if sender is SubCategoria:
+        return list(Producto.objects.filter(subcategoria=instance)
+                    .values_list("pk", flat=True))
+    return list(Producto.objects.filter(subcategoria__categoria=instance)
+                .values_list("pk", flat=True))
+
+
+def _al_escribir(sender, instance, update_fields=None, **kwargs):
+    if _indice is None:
+        return  # todavía no se armó: lo hará completo
+    if (sender is ProductoVariante and update_fields is not None
+            and not CAMPOS_VARIANTE & set(update_fields)):
+        return  # cambios de stock, precio, etc.
+    afectados = _afectados(sender, instance)
+    if afectados:
+        transaction.on_commit(lambda: reindexar(afectados))
+
+
+def conectar_senales():
+    for modelo in (Categoria, SubCategoria, Producto, ProductoVariante):
+        for senal in (post_save, post_delete):
+            senal.connect(_al_escribir, sender=modelo, weak=False,
+                          dispatch_uid=f"busqueda-{modelo.__name__}")
@@ -0,0 +1,176 @@
+"""
+Derivados de las imágenes de Producto y ProductoVariante.
+
+Al subir una imagen se generan versiones WebP y JPEG en tres anchos
+(thumb, card, full) junto al original, con el hash del contenido en el
+nombre: el mismo archivo siempre da los mismos nombres, así que reprocesar
+no duplica nada y se pueden cachear sin vencimiento. El resultado queda
+en `imagen_derivados` y el menú lo expone como srcset (ver srcset()).
+
+- Los derivados que quedan reemplazados (imagen nueva o borrada) se
+  eliminan del storage.
+- post_save encola el trabajo al confirmar la transacción en un pool de
+  hilos (Pillow suelta el GIL al redimensionar y comprimir). Con
+  settings.IMAGENES_ASYNC = False corre en línea (tests).
+- `manage.py regenerar_imagenes` recorre el catálogo en paralelo y salta
+  lo ya procesado, así que se puede cortar y volver a correr.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps
+
+from .models import Producto, ProductoVariante
+from . import menu
+
+logger = logging.getLogger(__name__)
+
+# Ancho máximo de cada derivado (nunca se agranda el original)
+TAMANOS = {"thumb": 160, "card": 480, "full": 1200}
+FORMATOS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+HILOS = 4
+
+# Modelo → campo de imagen
+CAMPOS = {Producto: "imagen", ProductoVariante: "imagen_variante"}
+
+_pool = None
+_lock = threading.Lock()
+
+
+# ---------- Generación ----------
+def _codificar(imagen, formato):
+    nombre_pil, opciones = FORMATOS[formato]
+    if formato == "jpeg" and imagen.mode != "RGB":
+        imagen = imagen.convert("RGB")
+    salida = BytesIO()
+    imagen.save(salida, nombre_pil, **opciones)
+    return salida.getvalue()
+
+
+def generar(archivo):
+    """Crea los derivados de `archivo` (FieldFile) y devuelve su descripción."""
+    with archivo.open("rb") as f:
+        contenido = f.read()
+    digest = hashlib.sha1(contenido).hexdigest()[:12]
+    original = ImageOps.exif_transpose(Image.open(BytesIO(contenido)))
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+
+    ruta = PurePosixPath(archivo.name)
+    tamanos, por_ancho = {}, {}
+    for tamano, ancho in TAMANOS.items():
+        ancho = min(ancho, original.width)
+        if ancho not in por_ancho:  # original chico: un solo archivo por ancho
+            alto = max(1, round(original.height * ancho / original.width))
+            imagen = original.resize((ancho, alto), Image.LANCZOS)
+            nombres = {}
+            for formato in FORMATOS:
+                nombre = str(ruta.with_name(f"{ruta.stem}.{digest}.{tamano}.{formato}"))
+                if not default_storage.exists(nombre):
+                    nombre = default_storage.save(
+                        nombre, ContentFile(_codificar(imagen, formato)))
+                nombres[formato] = nombre
+            por_ancho[ancho] = nombres
+        tamanos[tamano] = {"ancho": ancho, **por_ancho[ancho]}
+    return {"origen": archivo.name, "hash": digest, "tamanos": tamanos}
+
+
+def procesar(modelo, pk):
+    """Genera y guarda los derivados de una fila. Devuelve False si no había imagen."""
+    campo = CAMPOS[modelo]
+    obj = modelo.objects.filter(pk=pk).only(campo, "imagen_derivados").first()
+    if obj is None:
+        return False
+    archivo = getattr(obj, campo)
+    derivados = generar(archivo) if archivo else {}
+    # Sin tocar `version`: los derivados no son una edición del cliente y
+    # no deben invalidar la copia que recibió al subir la imagen (409)
+    qs = modelo.objects.filter(pk=pk)
+    if archivo:
+        # Si la imagen cambió mientras tanto, la nueva tarea la procesa
+        qs = qs.filter(**{campo: archivo.name})
+    anteriores, nuevos = _archivos(obj.imagen_derivados), _archivos(derivados)
+    if qs.update(imagen_derivados=derivados):
+        _borrar(anteriores - nuevos)
+        menu.invalidar()
+    else:
+        _borrar(nuevos - anteriores)
+    return bool(archivo)
+
+
+def _archivos(derivados):
+    return {nombre for tam in (derivados or {}).get("tamanos", {}).values()
+            for formato, nombre in tam.items() if formato in FORMATOS}
+
+
+def _borrar(nombres):
+    for nombre in nombres:
+        default_storage.delete(nombre)
+
+
+def pendiente(obj):
+    """True si la imagen actual no tiene derivados al día."""
+    archivo = getattr(obj, CAMPOS[type(obj)])
+    return (archivo.name or None) != (obj.imagen_derivados or {}).get("origen")
+
+
+# ---------- Cola ----------
+def _pool_hilos():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(HILOS, thread_name_prefix="imagenes")
+        return _pool
+
+
+def _en_hilo(modelo, pk):
+    try:
+        procesar(modelo, pk)
+    except Exception:
+        logger.exception("No se pudieron generar los derivados de %s #%s",
+                         modelo.__name__, pk)
+    finally:
+        connection.close()
+
+
+def encolar(modelo, pk):
+    if getattr(settings, "IMAGENES_ASYNC", True):
+        _pool_hilos().submit(_en_hilo, modelo, pk)
+    else:
+        procesar(modelo, pk)
+
+
+def _al_guardar(sender, instance, **kwargs):
+    if pendiente(instance):
+        transaction.on_commit(lambda: encolar(sender, instance.pk))
+
+
+def conectar_senales():
+    for modelo in CAMPOS:
+        post_save.connect(_al_guardar, sender=modelo, weak=False,
+                          dispatch_uid=f"imagenes-{modelo.__name__}")
+
+
+# ---------- Lectura ----------
+def srcset(derivados, url):
+    """{"webp": "url 160w, url 480w, ...", "jpeg": ...} o None sin derivados."""
+    tamanos = (derivados or {}).get("tamanos")
+    if not tamanos:
+        return None
+    por_ancho = sorted({t["ancho"]: t for t in tamanos.values()}.items())
+    return {
+        formato: ", ".join(f"{url(t[formato])} {ancho}w" for ancho, t in por_ancho)
+        for formato in FORMATOS
+    }
@@ -0,0 +1,98 @@
+"""
+Kardex: historial de stock por variante.
+
+- MovimientoInventario: cada operación de stock.py agrega sus filas en el
+  mismo INSERT (una por variante y pedido); los save() de
+  ProductoVariante que cambian el stock agregan un ajuste.
+- CorteInventario: foto periódica del stock por variante, calculada desde
+  el libro (corte anterior + movimientos nuevos), sin bloquear variantes.
+  Se corre con `manage.py corte_inventario` (p. ej. cada noche por cron).
+- stock_al(): stock a una fecha = último corte anterior + los movimientos
+  entre el corte y la fecha.
+
+Como en la sincronización de tablets, el corte solo toma movimientos con
+más de MARGEN de antigüedad: una transacción que todavía no confirmó no
+queda fuera para siempre.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import CorteInventario, MovimientoInventario, ProductoVariante
+
+MARGEN = timedelta(minutes=1)
+
+
+# ---------- Cortes ----------
+def _ultimos_cortes(variante_ids):
+    ultimos = (CorteInventario.objects.filter(variante_id__in=variante_ids)
+               .values("variante_id").annotate(ultimo=Max("id"))
+               .values_list("ultimo", flat=True))
+    return {c.variante_id: c for c in CorteInventario.objects.filter(pk__in=ultimos)}
+
+
+@transaction.atomic
+def cortar(ahora=None):
+    """Corte de las variantes con movimientos desde el anterior. Devuelve cuántas."""
+    limite = (ahora or timezone.now()) - MARGEN
+    hasta = MovimientoInventario.objects.filter(fecha__lt=limite).aggregate(
+        m=Max("id"))["m"]
+    desde = CorteInventario.objects.aggregate(m=Max("ultimo_movimiento"))["m"] or 0
+    if hasta is None or hasta <= desde:
+        return 0
+
+    deltas = dict(
+        MovimientoInventario.objects.filter(id__gt=desde, id__lte=hasta)
+        .values_list("variante_id").annotate(Sum("delta_stock")))
+    anteriores = _ultimos_cortes(list(deltas))
+    CorteInventario.objects.bulk_create([
+        CorteInventario(
+            variante_id=variante_id, fecha=limite, ultimo_movimiento=hasta,
+            stock=(anteriores[variante_id].stock if variante_id in anteriores else 0)
+            + delta)
+        for variante_id, delta in deltas.items()
+    ])
+    return len(deltas)
+
+
+@transaction.atomic
+def abrir(variantes=None):
+    """
+    Corte inicial con el stock actual para las variantes sin cortes (datos
+    cargados sin pasar por el kardex). Queda alineado con el último corte:
+    lo movido después se descuenta y lo toma el próximo cortar().
+    """
+    qs = ProductoVariante.objects.filter(cortes__isnull=True)
+    if variantes is not None:
+        qs = qs.filter(pk__in=variantes)
+    actuales = dict(qs.values_list("pk", "stock"))
+    desde = CorteInventario.objects.aggregate(m=Max("ultimo_movimiento"))["m"] or 0
+    posteriores = dict(
+        MovimientoInventario.objects.filter(id__gt=desde, variante_id__in=actuales)
+        .values_list("variante_id").annotate(Sum("delta_stock")))
+    ahora = timezone.now()
+    return len(CorteInventario.objects.bulk_create([
+        CorteInventario(variante_id=pk, fecha=ahora, ultimo_movimiento=desde,
+                        stock=stock - posteriores.get(pk, 0))
+        for pk, stock in actuales.items()
+    ]))
+
+
+# ---------- Consultas ----------
+def stock_al(variante_id, fecha):
+    """Stock físico de la variante en `fecha` (corte + movimientos)."""
+    corte = (CorteInventario.objects.filter(variante_id=variante_id, fecha__lte=fecha)
+             .order_by("-fecha", "-id").first())
+    base, desde = (corte.stock, corte.ultimo_movimiento) if corte else (0, 0)
+    delta = MovimientoInventario.objects.filter(
+        variante_id=variante_id, id__gt=desde, fecha__lte=fecha,
+    ).aggregate(total=Sum("delta_stock"))["total"] or 0
+    return base + delta
+
+
+def movimientos(variante_id):
+    """Kardex de la variante (para KeysetPagination por -id)."""
+    return (MovimientoInventario.objects.filter(variante_id=variante_id)
+            .select_related("usuario"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventario import kardex
+
+
+class Command(BaseCommand):
+    help = ("Guarda un corte de stock por variante con los movimientos del "
+            "kardex desde el corte anterior.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--abrir", action="store_true",
+            help="Antes, corte inicial con el stock actual para las variantes sin cortes.")
+
+    def handle(self, *args, **opts):
+        if opts["abrir"]:
+            abiertas = kardex.abrir()
+            self.stdout.write(f"{abiertas} variantes con corte inicial.")
+        total = kardex.cortar()
+        self.stdout.write(self.style.SUCCESS(f"{total} variantes con corte nuevo."))
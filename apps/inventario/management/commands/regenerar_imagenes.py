@@ -0,0 +1,72 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.inventario import imagenes
+
+
+def _procesar(modelo, pk):
+    try:
+        return imagenes.procesar(modelo, pk)
+    finally:
+        connection.close()
+
+
+class _EnLinea:
+    """Mismo API que el pool, para --hilos=1 (sin conexiones extra)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, funcion, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*args))
+        except Exception as exc:
+            futuro.set_exception(exc)
+        return futuro
+
+
+class Command(BaseCommand):
+    help = ("Genera los derivados (WebP/JPEG en varios anchos) de las imágenes "
+            "de productos y variantes. Salta lo ya procesado, así que se puede "
+            "cortar y volver a correr.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=imagenes.HILOS)
+        parser.add_argument("--lote", type=int, default=500,
+                            help="Filas leídas por consulta.")
+        parser.add_argument("--forzar", action="store_true",
+                            help="Rehace también las que ya tienen derivados.")
+
+    def _pendientes(self, modelo, lote, forzar):
+        campo = imagenes.CAMPOS[modelo]
+        qs = (modelo.objects.exclude(**{f"{campo}__isnull": True})
+              .exclude(**{campo: ""}).only(campo, "imagen_derivados").order_by("pk"))
+        for obj in qs.iterator(chunk_size=lote):
+            if forzar or imagenes.pendiente(obj):
+                yield obj.pk
+
+    def handle(self, *args, **opts):
+        hechas = errores = 0
+        hilos = opts["hilos"]
+        with (ThreadPoolExecutor(hilos) if hilos > 1 else _EnLinea()) as pool:
+            for modelo in imagenes.CAMPOS:
+                futuros = {
+                    pool.submit(_procesar if hilos > 1 else imagenes.procesar,
+                                modelo, pk): pk
+                    for pk in self._pendientes(modelo, opts["lote"], opts["forzar"])
+                }
+                for futuro in as_completed(futuros):
+                    try:
+                        hechas += futuro.result()
+                    except Exception as exc:
+                        errores += 1
+                        self.stderr.write(
+                            f"{modelo.__name__} #{futuros[futuro]}: {exc}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{hechas} imágenes procesadas, {errores} con error."))
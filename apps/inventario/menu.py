@@ -0,0 +1,226 @@
+"""
+Menú público precalculado (MenuViewSet.menu).
+
+El documento completo se arma con pocas consultas y se guarda en la caché
+de Django junto a su ETag, bajo la versión del catálogo:
+
+- post_save/post_delete de Ubicacion, Categoria, SubCategoria, Producto y
+  ProductoVariante suben la versión. Las operaciones de stock (stock.py),
+  que no pasan por save(), solo la suben cuando una variante se agota o
+  vuelve a tener stock, así una reserva común no lo invalida. Como en
+  core.catalogos, la versión se sube al escribir y otra vez al confirmar
+  la transacción.
+- El "stock" de cada variante no se guarda en el documento: con_stock()
+  lo lee al servir con una sola consulta y el ETag del menú lo incluye.
+- Si la versión cambió, se sigue sirviendo el documento anterior mientras
+  un solo hilo lo reconstruye en segundo plano (candado con cache.add);
+  los demás pedidos no golpean la BD. Sin documento previo se arma en
+  línea.
+
+Las URLs de imágenes (y sus srcset, ver imagenes.py) son absolutas, así
+que hay un documento por host.
+"""
+import hashlib
+import json
+import threading
+import time
+from urllib.parse import urljoin
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F, Prefetch
+from django.db.models.signals import post_save, post_delete
+
+from .models import Categoria, Producto, ProductoVariante, SubCategoria
+from . import imagenes
+
+CLAVE_VERSION = "menu:version"
+CANDADO_SEGUNDOS = 30
+
+MODELOS = ["inventario.Ubicacion", "inventario.Categoria", "inventario.SubCategoria",
+           "inventario.Producto", "inventario.ProductoVariante"]
+
+
+# ---------- Versión ----------
+def version():
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        actual = time.time_ns()
+        if not cache.add(CLAVE_VERSION, actual, None):
+            actual = cache.get(CLAVE_VERSION)
+    return actual
+
+
+def _subir_version():
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar():
+    """Marca el menú como viejo (ahora y al confirmar la transacción)."""
+    _subir_version()
+    if connection.in_atomic_block:
+        transaction.on_commit(_subir_version)
+
+
+def _al_escribir(sender, **kwargs):
+    invalidar()
+
+
+def conectar_senales():
+    for modelo in MODELOS:
+        for senal in (post_save, post_delete):
+            senal.connect(_al_escribir, sender=modelo, weak=False,
+                          dispatch_uid=f"menu-{modelo}")
+
+
+# ---------- Armado ----------
+def _categorias():
+    return Categoria.objects.filter(estado=True).prefetch_related(
+        Prefetch("subcategorias",
+                 queryset=SubCategoria.objects.filter(estado=True)),
+        Prefetch("subcategorias__productos",
+                 queryset=Producto.objects.filter(activo=True)),
+        Prefetch("subcategorias__productos__variantes",
+                 queryset=ProductoVariante.objects.filter(
+                     activo=True, stock__gt=F("stock_bloqueado"))
+                 .select_related("ubicacion")),
+    )
+
+
+def armar(base):
+    """Solo ramas con stock > 0; `base` es la URL raíz para las imágenes."""
+    def url(archivo):
+        return urljoin(base, archivo.url) if archivo else None
+
+    def url_derivado(nombre):
+        return urljoin(base, default_storage.url(nombre))
+
+    data = []
+    for cat in _categorias():
+        cat_data = {"categoria": cat.nombre, "subcategorias": []}
+        for sub in cat.subcategorias.all():
+            sub_data = {"nombre": sub.nombre, "productos": []}
+            for prod in sub.productos.all():
+                variantes = prod.variantes.all()
+                if not variantes:
+                    continue
+                sub_data["productos"].append({
+                    "id": prod.id,
+                    "nombre": prod.nombre,
+                    "descripcion": prod.descripcion,
+                    "imagen": url(prod.imagen),
+                    "imagen_srcset": imagenes.srcset(prod.imagen_derivados, url_derivado),
+                    "variantes": [
+                        {
+                            "id": var.id,
+                            "nombre_variante": var.nombre_variante,
+                            "sku": var.sku,
+                            "precio": float(var.precio),
+                            "stock_minimo": var.stock_minimo,
+                            "codigo_barras": var.codigo_barras,
+                            "imagen_variante": url(var.imagen_variante),
+                            "imagen_variante_srcset": imagenes.srcset(
+                                var.imagen_derivados, url_derivado),
+                            "ubicacion": var.ubicacion.nombre
+                            if var.ubicacion else None,
+                        }
+                        for var in variantes
+                    ],
+                })
+            if sub_data["productos"]:
+                cat_data["subcategorias"].append(sub_data)
+        if cat_data["subcategorias"]:
+            data.append(cat_data)
+    return data
+
+
+# ---------- Documento ----------
+def _clave(base):
+    return f"menu:documento:{base}"
+
+
+def _candado(base):
+    return f"menu:reconstruyendo:{base}"
+
+
+def construir(base):
+    """Arma el documento de la versión actual y lo deja en caché."""
+    actual = version()
+    data = armar(base)
+    contenido = json.dumps(data, sort_keys=True).encode()
+    documento = {
+        "version": actual,
+        "etag": f'"{hashlib.sha1(contenido).hexdigest()}"',
+        "data": data,
+    }
+    cache.set(_clave(base), documento, None)
+    return documento
+
+
+def _reconstruir(base):
+    try:
+        construir(base)
+    finally:
+        cache.delete(_candado(base))
+        connection.close()
+
+
+def productos(documento):
+    """{producto_id: datos del producto} de un documento del menú."""
+    return {
+        prod["id"]: prod
+        for cat in documento["data"] for sub in cat["subcategorias"]
+        for prod in sub["productos"]
+    }
+
+
+def documento(base):
+    """{"version", "etag", "data"}; puede ser el anterior mientras se rehace."""
+    actual = cache.get(_clave(base))
+    if actual is None:
+        return construir(base)
+    if actual["version"] == version():
+        return actual
+    if cache.add(_candado(base), 1, CANDADO_SEGUNDOS):
+        if connection.in_atomic_block:
+            # Otro hilo no vería lo que esta transacción aún no confirmó
+            cache.delete(_candado(base))
+            return construir(base)
+        threading.Thread(target=_reconstruir, args=(base,), daemon=True).start()
+    return actual
+
+
+# ---------- Stock vivo ----------
+def stock_vivo(variante_ids):
+    """{variante_id: stock disponible} leído ahora de la BD."""
+    return dict(ProductoVariante.objects.filter(pk__in=variante_ids).values_list(
+        "pk", F("stock") - F("stock_bloqueado")))
+
+
+def con_stock(productos, vivo=None):
+    """Copia de los productos con el "stock" actual de cada variante."""
+    productos = list(productos)
+    if vivo is None:
+        vivo = stock_vivo([var["id"] for prod in productos for var in prod["variantes"]])
+    return [
+        {**prod, "variantes": [{**var, "stock": max(vivo.get(var["id"], 0), 0)}
+                               for var in prod["variantes"]]}
+        for prod in productos
+    ]
+
+
+def servir(base):
+    """documento() con el stock vivo de cada variante y un ETag que lo incluye."""
+    actual = documento(base)
+    vivo = stock_vivo(var["id"] for prod in productos(actual).values()
+                      for var in prod["variantes"])
+    data = [
+        {**cat, "subcategorias": [
+            {**sub, "productos": con_stock(sub["productos"], vivo)}
+            for sub in cat["subcategorias"]]}
+        for cat in actual["data"]
+    ]
+    huella = json.dumps(sorted(vivo.items())).encode()
+    etag = hashlib.sha1(actual["etag"].encode() + huella).hexdigest()
+    return {"version": actual["version"], "etag": f'"{etag}"', "data": data}
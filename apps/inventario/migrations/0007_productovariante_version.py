@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_alter_producto_imagen_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productovariante',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
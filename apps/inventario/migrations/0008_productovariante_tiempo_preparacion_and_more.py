@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_productovariante_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productovariante',
+            name='tiempo_preparacion',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subcategoria',
+            name='tiempo_preparacion',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def corte_inicial(apps, schema_editor):
+    # El historial empieza aquí: un corte con el stock actual de cada variante
+    ProductoVariante = apps.get_model("inventario", "ProductoVariante")
+    CorteInventario = apps.get_model("inventario", "CorteInventario")
+    ahora = django.utils.timezone.now()
+    CorteInventario.objects.bulk_create([
+        CorteInventario(variante_id=pk, fecha=ahora, stock=stock)
+        for pk, stock in ProductoVariante.objects.values_list("pk", "stock")
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_productovariante_tiempo_preparacion_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('ultimo_movimiento', models.BigIntegerField(default=0)),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='inventario.productovariante')),
+            ],
+            options={
+                'verbose_name': 'Corte de inventario',
+                'verbose_name_plural': 'Cortes de inventario',
+                'indexes': [models.Index(fields=['variante', 'fecha'], name='corte_variante_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('reserva', 'Reserva'), ('liberacion', 'Liberación'), ('consumo', 'Consumo'), ('ingreso', 'Ingreso'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('delta_stock', models.IntegerField(default=0)),
+                ('numero_pedido', models.BigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to=settings.AUTH_USER_MODEL)),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.productovariante')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de inventario',
+                'verbose_name_plural': 'Movimientos de inventario',
+                'indexes': [models.Index(fields=['variante', 'id'], name='kardex_variante_idx'), models.Index(fields=['fecha'], name='kardex_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(corte_inicial, migrations.RunPython.noop),
+    ]
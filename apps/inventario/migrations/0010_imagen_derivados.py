@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_kardex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productovariante',
+            name='imagen_derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import uuid
+from apps.core.concurrencia import VersionadoMixin
 
 # ---------- Ubicación ----------
 
@@ -39,6 +42,8 @@ class SubCategoria(models.Model):
     descripcion = models.TextField(blank=True, null=True)
     estado = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Minutos por unidad; las variantes pueden sobreescribirlo (ver pedidos.cocina)
+    tiempo_preparacion = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Subcategoría"
@@ -62,6 +67,8 @@ class Producto(models.Model):
         null=True,
         blank=True
     )
+    # Versiones redimensionadas de `imagen` (ver imagenes.py)
+    imagen_derivados = models.JSONField(default=dict, blank=True, editable=False)
     activo = models.BooleanField(default=True)
 
     def __str__(self):
@@ -70,7 +77,7 @@ class Producto(models.Model):
 # ---------- ProductoVariante ----------
 
 
-class ProductoVariante(models.Model):
+class ProductoVariante(VersionadoMixin, models.Model):
     producto = models.ForeignKey(
         Producto, on_delete=models.CASCADE, related_name='variantes')
     nombre_variante = models.CharField(max_length=255)
@@ -80,17 +87,22 @@ class ProductoVariante(models.Model):
     stock = models.PositiveIntegerField(default=0)
     stock_minimo = models.PositiveIntegerField(default=5)
     stock_bloqueado = models.PositiveIntegerField(default=0, editable=False)
+    # Concurrencia optimista (ver apps.core.concurrencia)
+    version = models.PositiveIntegerField(default=0, editable=False)
     ubicacion = models.ForeignKey(
         Ubicacion, on_delete=models.SET_NULL, null=True, blank=True)
     codigo_barras = models.CharField(
         max_length=50, blank=True, null=True, unique=True)
     ultima_compra = models.DateField(null=True, blank=True)
+    # Minutos por unidad; si es None se usa el de la subcategoría
+    tiempo_preparacion = models.PositiveIntegerField(null=True, blank=True)
     activo = models.BooleanField()
     imagen_variante = models.ImageField(
         upload_to='variantes',  # ← dentro de MEDIA_ROOT
         null=True,
         blank=True
     )
+    imagen_derivados = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.producto.nombre} - {self.nombre_variante}"
@@ -110,21 +122,71 @@ class ProductoVariante(models.Model):
         return ((self.precio - self.costo) / self.precio * 100) if self.costo else 0
 
     # --- MÉTODOS DE STOCK ---
-    def bloquear(self, cantidad):
-        if cantidad > self.stock_disponible:
-            raise ValidationError("No hay stock suficiente para bloquear.")
-        self.stock_bloqueado += cantidad
-        self.save(update_fields=['stock_bloqueado'])
-
-    def desbloquear(self, cantidad):
-        self.stock_bloqueado = max(0, self.stock_bloqueado - cantidad)
-        self.save(update_fields=['stock_bloqueado'])
-
-    def descontar(self, cantidad):
-        if cantidad > self.stock_disponible:
-            raise ValidationError("No hay stock suficiente para descontar.")
-        self.stock -= cantidad
-        self.save(update_fields=['stock'])
+    # Cada uno es un solo UPDATE condicional (ver stock.py) que ajusta
+    # también `activo`; los valores nuevos vuelven por RETURNING.
+    def bloquear(self, cantidad, usuario=None):
+        from . import stock
+        self._asignar_stock(stock.reservar(
+            [(self.pk, cantidad)], devolver=True, usuario=usuario))
+
+    def desbloquear(self, cantidad, usuario=None):
+        from . import stock
+        self._asignar_stock(stock.liberar(
+            [(self.pk, cantidad)], devolver=True, usuario=usuario))
+
+    def descontar(self, cantidad, usuario=None):
+        from . import stock
+        self._asignar_stock(stock.descontar(
+            [(self.pk, cantidad)], devolver=True, usuario=usuario))
+
+    def _asignar_stock(self, nuevos):
+        if self.pk in nuevos:
+            for campo, valor in nuevos[self.pk].items():
+                setattr(self, campo, valor)
+            self._marcar_stock_guardado()
+        else:  # BD sin RETURNING
+            self._releer_stock()
+
+    def _releer_stock(self):
+        self.refresh_from_db(
+            fields=['stock', 'stock_bloqueado', 'activo', 'version'])
+
+    # --- KARDEX ---
+    # stock/stock_bloqueado tal como se leyeron: save() registra la
+    # diferencia en MovimientoInventario (el motor de stock registra lo suyo).
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._marcar_stock_guardado()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or {'stock', 'stock_bloqueado'} & set(fields):
+            self._marcar_stock_guardado()
+
+    def _marcar_stock_guardado(self):
+        d = self.__dict__
+        self._stock_guardado = (d.get('stock'), d.get('stock_bloqueado'))
+
+    def _movimientos_de_save(self, creada):
+        if creada:
+            antes = (0, 0)
+        else:
+            antes = getattr(self, '_stock_guardado', (self.stock, self.stock_bloqueado))
+        delta = self.stock - antes[0]
+        bloqueo = self.stock_bloqueado - antes[1]
+        movimientos = []
+        if delta:
+            tipo = MovimientoInventario.INGRESO if creada else MovimientoInventario.AJUSTE
+            movimientos.append(MovimientoInventario(
+                variante=self, tipo=tipo, cantidad=abs(delta), delta_stock=delta))
+        if bloqueo:
+            tipo = (MovimientoInventario.RESERVA if bloqueo > 0
+                    else MovimientoInventario.LIBERACION)
+            movimientos.append(MovimientoInventario(
+                variante=self, tipo=tipo, cantidad=abs(bloqueo), delta_stock=0))
+        return movimientos
 
     # --- VALIDACIONES ---
     def clean(self):
@@ -140,12 +202,87 @@ class ProductoVariante(models.Model):
         if not self.codigo_barras:
             self.codigo_barras = str(
                 uuid.uuid4()).replace('-', '').upper()[:12]
-        # Activo según stock disponible
+        # Activo según stock disponible. El UPDATE lleva la versión leída
+        # (VersionadoMixin): si otro cambió el stock entre medio no se
+        # escribe nada, así que stock/stock_bloqueado en memoria son los de
+        # la fila y `activo` sale en la misma sentencia.
         self.activo = self.stock_disponible > 0
-        super().save(*args, **kwargs)
-        # 3. después de guardar, refrescamos por si alguien tocó solo stock
-        self.refresh_from_db(fields=['stock', 'stock_bloqueado'])
-        if self.stock_disponible == 0 and self.activo:
-            # fuerza el flag a False sin entrar en recursión
-            self.activo = False
-            super().save(update_fields=['activo'])
+        campos = kwargs.get('update_fields')
+        toca_stock = campos is None or bool({'stock', 'stock_bloqueado'} & set(campos))
+        if campos is not None and toca_stock:
+            kwargs['update_fields'] = {*campos, 'activo'}
+        creada = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if toca_stock:
+                MovimientoInventario.objects.bulk_create(
+                    self._movimientos_de_save(creada))
+                self._marcar_stock_guardado()
+
+
+# ---------- Kardex (ver kardex.py) ----------
+class MovimientoInventario(models.Model):
+    """
+    Libro de movimientos de stock, solo se agrega. `delta_stock` es el
+    efecto sobre el stock físico; las reservas/liberaciones lo dejan en 0
+    y `cantidad` dice cuánto se bloqueó o liberó.
+    """
+    RESERVA = "reserva"
+    LIBERACION = "liberacion"
+    CONSUMO = "consumo"
+    INGRESO = "ingreso"
+    AJUSTE = "ajuste"
+    TIPO_CHOICES = [
+        (RESERVA, "Reserva"),
+        (LIBERACION, "Liberación"),
+        (CONSUMO, "Consumo"),
+        (INGRESO, "Ingreso"),
+        (AJUSTE, "Ajuste"),
+    ]
+
+    # CASCADE: el historial se va con la variante, como sus demás datos
+    variante = models.ForeignKey(
+        ProductoVariante, on_delete=models.CASCADE, related_name="movimientos")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    cantidad = models.PositiveIntegerField()
+    delta_stock = models.IntegerField(default=0)
+    # Sin FK: el pedido puede pasar al archivo (ver pedidos.archivo)
+    numero_pedido = models.BigIntegerField(null=True, blank=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="movimientos_inventario")
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Movimiento de inventario"
+        verbose_name_plural = "Movimientos de inventario"
+        indexes = [
+            models.Index(fields=["variante", "id"], name="kardex_variante_idx"),
+            models.Index(fields=["fecha"], name="kardex_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.delta_stock:+d} - {self.variante_id}"
+
+
+class CorteInventario(models.Model):
+    """
+    Stock de una variante en `fecha`, con los movimientos hasta
+    `ultimo_movimiento` incluidos. El stock a una fecha es el último corte
+    anterior más los movimientos posteriores (ver kardex.stock_al).
+    """
+    variante = models.ForeignKey(
+        ProductoVariante, on_delete=models.CASCADE, related_name="cortes")
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+    ultimo_movimiento = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Corte de inventario"
+        verbose_name_plural = "Cortes de inventario"
+        indexes = [
+            models.Index(fields=["variante", "fecha"], name="corte_variante_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.variante_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.stock}"
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
-from .models import Ubicacion, Categoria, SubCategoria, Producto, ProductoVariante
+from apps.core.concurrencia import VersionSerializerMixin
+from .models import (
+    Ubicacion, Categoria, SubCategoria, Producto, ProductoVariante,
+    MovimientoInventario)
 
 
 # ---------- Ubicación ----------
@@ -58,7 +61,7 @@ class ProductoSerializer(serializers.ModelSerializer):
 
 
 # ---------- ProductoVariante ----------
-class ProductoVarianteSerializer(serializers.ModelSerializer):
+class ProductoVarianteSerializer(VersionSerializerMixin, serializers.ModelSerializer):
     stock_disponible = serializers.ReadOnlyField()
     alerta_stock = serializers.ReadOnlyField()
     margen = serializers.ReadOnlyField()
@@ -106,3 +109,15 @@ class ProductosDisponiblesSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductoVariante
         fields = '__all__'
+
+
+# ---------- Kardex ----------
+class MovimientoInventarioSerializer(serializers.ModelSerializer):
+    usuario_nombre = serializers.CharField(
+        source="usuario.username", read_only=True, default=None)
+
+    class Meta:
+        model = MovimientoInventario
+        fields = ["id", "tipo", "cantidad", "delta_stock", "numero_pedido",
+                  "usuario", "usuario_nombre", "fecha"]
+        read_only_fields = fields
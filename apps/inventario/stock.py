@@ -0,0 +1,323 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models import (
+    Case, F, Q, Value, When, BooleanField, PositiveIntegerField)
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from apps.core.concurrencia import siguiente_version
+from .models import MovimientoInventario, ProductoVariante
+from . import menu
+
+# Máximo de variantes por sentencia UPDATE (cada una agrega un CASE).
+TAMANO_LOTE = 200
+
+# Columnas que devuelve el UPDATE ... RETURNING (ver _actualizar)
+DEVUELTAS = ["id", "stock", "stock_bloqueado", "activo", "version"]
+
+
+# ---------- Errores ----------
+class StockInsuficiente(ValidationError):
+    """
+    Una o más variantes no tienen stock para la operación.
+    `faltantes` = {variante_id: {"solicitado": n, "disponible": m}}
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        partes = [
+            f"variante {vid}: solicitado {d['solicitado']}, disponible {d['disponible']}"
+            for vid, d in sorted(faltantes.items())
+        ]
+        super().__init__("No hay stock suficiente (" + "; ".join(partes) + ").")
+
+
+# ---------- Operaciones ----------
+# Cada operación describe, para una cantidad `q`, la guarda del WHERE,
+# las expresiones nuevas de stock/stock_bloqueado y la condición que
+# deja la variante activa (stock disponible > 0 después del cambio).
+# `antes(stock, bloqueado)` reconstruye desde los valores nuevos los
+# (stock, bloqueado) posibles antes del cambio; cuando la resta se
+# recortó a 0 basta con los extremos 0 y q.
+# Las restas se protegen con CASE para no producir negativos en columnas
+# UNSIGNED (MySQL).
+
+def _bloqueado_menos(q):
+    return Case(
+        When(stock_bloqueado__gte=q, then=F("stock_bloqueado") - q),
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _reserva(q):
+    return {
+        "guarda": Q(stock__gte=F("stock_bloqueado") + q),
+        "stock": None,
+        "stock_bloqueado": F("stock_bloqueado") + q,
+        "activo": Q(stock__gt=F("stock_bloqueado") + q),
+        "antes": lambda s, b: [(s, b - q)],
+    }
+
+
+def _liberacion(q):
+    return {
+        "guarda": Q(),
+        "stock": None,
+        "stock_bloqueado": _bloqueado_menos(q),
+        "activo": Q(stock_bloqueado__gte=q, stock_bloqueado__lt=F("stock") + q)
+        | Q(stock_bloqueado__lt=q, stock__gt=0),
+        "antes": lambda s, b: [(s, b + q)] if b else [(s, 0), (s, q)],
+    }
+
+
+def _consumo(q):
+    # Libera la reserva y descuenta: stock - max(0, bloqueado - q) >= q
+    return {
+        "guarda": Q(stock_bloqueado__gte=q, stock__gte=F("stock_bloqueado"))
+        | Q(stock_bloqueado__lt=q, stock__gte=q),
+        "stock": F("stock") - q,
+        "stock_bloqueado": _bloqueado_menos(q),
+        "activo": Q(stock_bloqueado__gte=q, stock__gt=F("stock_bloqueado"))
+        | Q(stock_bloqueado__lt=q, stock__gt=q),
+        "antes": lambda s, b: [(s + q, b + q)] if b else [(s + q, 0), (s + q, q)],
+    }
+
+
+def _descuento(q):
+    # Baja stock físico sin tocar lo reservado (ajustes, mermas)
+    return {
+        "guarda": Q(stock__gte=F("stock_bloqueado") + q),
+        "stock": F("stock") - q,
+        "stock_bloqueado": F("stock_bloqueado"),
+        "activo": Q(stock__gt=F("stock_bloqueado") + q),
+        "antes": lambda s, b: [(s + q, b)],
+    }
+
+
+def _ingreso(q):
+    return {
+        "guarda": Q(),
+        "stock": F("stock") + q,
+        "stock_bloqueado": F("stock_bloqueado"),
+        "activo": Q(stock_bloqueado__lt=F("stock") + q),
+        "antes": lambda s, b: [(s - q, b)],
+    }
+
+
+# Movimiento que deja cada operación en el kardex: (tipo, signo del stock)
+KARDEX = {
+    _reserva: (MovimientoInventario.RESERVA, 0),
+    _liberacion: (MovimientoInventario.LIBERACION, 0),
+    _consumo: (MovimientoInventario.CONSUMO, -1),
+    _descuento: (MovimientoInventario.AJUSTE, -1),
+    _ingreso: (MovimientoInventario.INGRESO, 1),
+}
+
+
+def _disponible_para(operacion, stock, bloqueado, q):
+    """Stock disponible para `q` unidades según la operación (en Python)."""
+    if operacion is _consumo:
+        return stock - max(0, bloqueado - q)
+    return stock - bloqueado
+
+
+# ---------- Helpers ----------
+# Las líneas son (variante_id, cantidad) o (variante_id, cantidad, pedido_id);
+# el pedido solo se usa para el kardex.
+def agrupar(lineas):
+    """[(variante_id, cantidad[, pedido_id]), ...] → {variante_id: cantidad_total}"""
+    cantidades = defaultdict(int)
+    for variante_id, cantidad, *_ in lineas:
+        if variante_id is not None and cantidad:
+            cantidades[variante_id] += cantidad
+    return dict(cantidades)
+
+
+def _movimientos(operacion, lineas, usuario, tipo=None):
+    """Una fila de kardex por variante y pedido."""
+    por_pedido = defaultdict(int)
+    for variante_id, cantidad, *pedido in lineas:
+        if variante_id is not None and cantidad:
+            por_pedido[(variante_id, pedido[0] if pedido else None)] += cantidad
+    tipo_op, signo = KARDEX[operacion]
+    ahora = timezone.now()
+    return [
+        MovimientoInventario(
+            variante_id=variante_id, tipo=tipo or tipo_op, cantidad=q,
+            delta_stock=signo * q, numero_pedido=pedido_id,
+            usuario=usuario, fecha=ahora)
+        for (variante_id, pedido_id), q in sorted(
+            por_pedido.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+    ]
+
+
+def lineas_de_pedido(pedido):
+    """Líneas (variante_id, cantidad) de un pedido en una sola consulta."""
+    return list(pedido.detalles.values_list("variante_id", "cantidad"))
+
+
+def _lotes(cantidades):
+    items = sorted(cantidades.items())  # orden fijo → evita deadlocks
+    for i in range(0, len(items), TAMANO_LOTE):
+        yield items[i:i + TAMANO_LOTE]
+
+
+class _LoteIncompleto(Exception):
+    pass
+
+
+def _admite_returning(alias):
+    # MySQL/MariaDB no tienen UPDATE ... RETURNING
+    conexion = connections[alias]
+    return (conexion.vendor in ("postgresql", "sqlite")
+            and conexion.features.can_return_columns_from_insert)
+
+
+def _actualizar(qs, valores):
+    """
+    qs.update(**valores). Con RETURNING disponible devuelve {id: {columna:
+    valor}} con lo que quedó en la fila (la misma sentencia); si no, el conteo.
+    """
+    if not _admite_returning(qs.db):
+        return qs.update(**valores)
+    query = qs.query.chain(UpdateQuery)
+    query.add_update_values(valores)
+    sql, params = query.get_compiler(qs.db).as_sql()
+    conexion = connections[qs.db]
+    columnas = ", ".join(conexion.ops.quote_name(c) for c in DEVUELTAS)
+    with conexion.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {columnas}", params)
+        filas = cursor.fetchall()
+    return {fila[0]: {"stock": fila[1], "stock_bloqueado": fila[2],
+                      "activo": bool(fila[3]), "version": fila[4]}
+            for fila in filas}
+
+
+def _aplicar(operacion, lineas, devolver=False, usuario=None, tipo=None):
+    lineas = list(lineas)
+    cantidades = agrupar(lineas)
+    if not cantidades:
+        return cantidades
+    nuevos = {}
+
+    try:
+        with transaction.atomic():
+            for lote in _lotes(cantidades):
+                ops = [(vid, operacion(q)) for vid, q in lote]
+                valores = {
+                    # `activo` va primero: MySQL evalúa las asignaciones de
+                    # izquierda a derecha con los valores ya modificados.
+                    "activo": Case(
+                        *[When(Q(pk=vid) & op["activo"], then=Value(True))
+                          for vid, op in ops],
+                        default=Value(False),
+                        output_field=BooleanField(),
+                    ),
+                    "stock_bloqueado": Case(
+                        *[When(pk=vid, then=op["stock_bloqueado"])
+                          for vid, op in ops],
+                        default=F("stock_bloqueado"),
+                        output_field=PositiveIntegerField(),
+                    ),
+                    # Invalida las copias leídas antes (concurrencia optimista)
+                    "version": siguiente_version(),
+                }
+                if any(op["stock"] is not None for _, op in ops):
+                    valores["stock"] = Case(
+                        *[When(pk=vid, then=op["stock"])
+                          for vid, op in ops if op["stock"] is not None],
+                        default=F("stock"),
+                        output_field=PositiveIntegerField(),
+                    )
+
+                condicion = reduce(
+                    or_, (Q(pk=vid) & op["guarda"] for vid, op in ops))
+                actualizadas = _actualizar(
+                    ProductoVariante.objects.filter(condicion), valores)
+                if isinstance(actualizadas, dict):
+                    nuevos.update(actualizadas)
+                    actualizadas = len(actualizadas)
+                if actualizadas != len(lote):
+                    raise _LoteIncompleto
+            MovimientoInventario.objects.bulk_create(
+                _movimientos(operacion, lineas, usuario, tipo))
+    except _LoteIncompleto:
+        raise StockInsuficiente(_faltantes(operacion, cantidades))
+
+    # El menú oculta lo agotado: solo cambia si alguna variante se agotó o
+    # volvió a tener stock. Sin RETURNING no se sabe, se invalida siempre.
+    if not nuevos or _cambia_disponibilidad(operacion, cantidades, nuevos):
+        menu.invalidar()
+    return nuevos if devolver else cantidades
+
+
+def _cambia_disponibilidad(operacion, cantidades, nuevos):
+    for vid, q in cantidades.items():
+        fila = nuevos[vid]
+        disponible = fila["stock"] > fila["stock_bloqueado"]
+        if any((s > b) != disponible
+               for s, b in operacion(q)["antes"](fila["stock"], fila["stock_bloqueado"])):
+            return True
+    return False
+
+
+def _faltantes(operacion, cantidades):
+    """Se calcula tras el rollback, sólo cuando la operación falló."""
+    actuales = {
+        vid: (stock, bloqueado)
+        for vid, stock, bloqueado in ProductoVariante.objects.filter(
+            pk__in=cantidades).values_list("pk", "stock", "stock_bloqueado")
+    }
+    faltantes = {}
+    for vid, q in cantidades.items():
+        stock, bloqueado = actuales.get(vid, (0, 0))
+        disponible = max(0, _disponible_para(operacion, stock, bloqueado, q))
+        if disponible < q:
+            faltantes[vid] = {"solicitado": q, "disponible": disponible}
+    return faltantes
+
+
+# ---------- API pública ----------
+# Con devolver=True cada operación devuelve {variante_id: valores nuevos}
+# (ver _actualizar); vacío si la BD no tiene UPDATE ... RETURNING.
+# `usuario` queda en el kardex.
+def reservar(lineas, devolver=False, usuario=None):
+    """Bloquea stock. Todo o nada: si falta alguna variante lanza StockInsuficiente."""
+    return _aplicar(_reserva, lineas, devolver, usuario)
+
+
+def liberar(lineas, devolver=False, usuario=None):
+    """Devuelve stock bloqueado (nunca baja de 0)."""
+    return _aplicar(_liberacion, lineas, devolver, usuario)
+
+
+def consumir(lineas, devolver=False, usuario=None):
+    """Libera la reserva y descuenta el stock físico (entrega)."""
+    return _aplicar(_consumo, lineas, devolver, usuario)
+
+
+def descontar(lineas, devolver=False, usuario=None):
+    """Descuenta stock físico libre (no toca lo reservado)."""
+    return _aplicar(_descuento, lineas, devolver, usuario)
+
+
+def ingresar(lineas, devolver=False, usuario=None):
+    """Suma stock físico (compras, recepción de mercadería)."""
+    return _aplicar(_ingreso, lineas, devolver, usuario)
+
+
+@transaction.atomic
+def ajustar(lineas, usuario=None):
+    """Ajuste de inventario con cantidades con signo (conteos, mermas)."""
+    lineas = list(lineas)
+    entradas = [(vid, q, *resto) for vid, q, *resto in lineas if q > 0]
+    salidas = [(vid, -q, *resto) for vid, q, *resto in lineas if q < 0]
+    if entradas:
+        _aplicar(_ingreso, entradas, usuario=usuario, tipo=MovimientoInventario.AJUSTE)
+    if salidas:
+        _aplicar(_descuento, salidas, usuario=usuario)
@@ -1,3 +1,575 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.contrib import messages
+from django.contrib.admin import site
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest.mock import patch
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.core.concurrencia import ConflictoVersion
+from .models import (
+    Categoria, SubCategoria, Producto, ProductoVariante, MovimientoInventario,
+    CorteInventario)
+from . import busqueda, imagenes, kardex, menu, stock
+from .admin import ProductoVarianteAdmin
+
+
+def crear_variante(producto, sku, stock_inicial=10, precio=5000):
+    return ProductoVariante.objects.create(
+        producto=producto,
+        nombre_variante=sku,
+        sku=sku,
+        precio=precio,
+        stock=stock_inicial,
+    )
+
+
+def en_hilos(n, funcion):
+    """Corre funcion(i) en n hilos a la vez; devuelve (resultados, errores)."""
+    barrera = threading.Barrier(n)
+    resultados, errores = [], []
+
+    def correr(i):
+        try:
+            barrera.wait()
+            resultados.append(funcion(i))
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    hilos = [threading.Thread(target=correr, args=(i,)) for i in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados, errores
+
+
+class MotorStockTests(TestCase):
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        self.producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.a = crear_variante(self.producto, "LAT-S", stock_inicial=5)
+        self.b = crear_variante(self.producto, "LAT-M", stock_inicial=2)
+
+    def test_reservar_en_una_sola_sentencia(self):
+        with CaptureQueriesContext(connection) as ctx:
+            stock.reservar([(self.a.id, 2), (self.b.id, 1), (self.a.id, 1)])
+        sentencias = [q["sql"] for q in ctx.captured_queries
+                      if "SAVEPOINT" not in q["sql"]]
+        # El UPDATE de stock y el INSERT del kardex
+        self.assertEqual(len(sentencias), 2)
+        self.assertTrue(sentencias[0].startswith("UPDATE"))
+        self.assertTrue(sentencias[1].startswith('INSERT INTO "inventario_movimientoinventario"'))
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual(self.a.stock_bloqueado, 3)
+        self.assertEqual(self.b.stock_bloqueado, 1)
+
+    def test_reservar_sin_stock_no_aplica_nada_y_reporta_faltantes(self):
+        with self.assertRaises(stock.StockInsuficiente) as ctx:
+            stock.reservar([(self.a.id, 1), (self.b.id, 3)])
+        self.assertEqual(
+            ctx.exception.faltantes, {self.b.id: {"solicitado": 3, "disponible": 2}})
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock_bloqueado, 0)
+
+    def test_consumir_libera_reserva_y_descuenta(self):
+        stock.reservar([(self.b.id, 2)])
+        self.b.refresh_from_db()
+        self.assertFalse(self.b.activo)
+
+        stock.consumir([(self.b.id, 2)])
+        self.b.refresh_from_db()
+        self.assertEqual((self.b.stock, self.b.stock_bloqueado), (0, 0))
+        self.assertFalse(self.b.activo)
+
+    def test_liberar_reactiva_variante(self):
+        stock.reservar([(self.b.id, 2)])
+        stock.liberar([(self.b.id, 5)])
+        self.b.refresh_from_db()
+        self.assertEqual(self.b.stock_bloqueado, 0)
+        self.assertTrue(self.b.activo)
+
+
+class VersionVarianteTests(TestCase):
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.variante = crear_variante(producto, "LAT-S", stock_inicial=5)
+
+    def test_guardar_copia_vieja_lanza_conflicto(self):
+        a = ProductoVariante.objects.get(pk=self.variante.pk)
+        b = ProductoVariante.objects.get(pk=self.variante.pk)
+        a.precio = 6000
+        a.save()
+        b.stock = 50
+        with self.assertRaises(ConflictoVersion), transaction.atomic():
+            b.save()
+        self.variante.refresh_from_db()
+        self.assertEqual((self.variante.precio, self.variante.stock), (6000, 5))
+
+    def test_motor_de_stock_sube_la_version(self):
+        copia = ProductoVariante.objects.get(pk=self.variante.pk)
+        stock.reservar([(self.variante.pk, 2)])
+        copia.precio = 6000
+        with self.assertRaises(ConflictoVersion), transaction.atomic():
+            copia.save()
+
+    def test_descontar_reintenta_con_la_version_nueva(self):
+        copia = ProductoVariante.objects.get(pk=self.variante.pk)
+        stock.reservar([(self.variante.pk, 2)])
+        copia.descontar(3)
+        self.assertEqual((copia.stock, copia.stock_bloqueado), (2, 2))
+        with self.assertRaises(ValidationError):
+            copia.descontar(1)
+
+    def test_bloquear_usa_el_stock_actual(self):
+        copia = ProductoVariante.objects.get(pk=self.variante.pk)
+        stock.reservar([(self.variante.pk, 4)])
+        with self.assertRaises(ValidationError):
+            copia.bloquear(2)
+        copia.bloquear(1)
+        self.assertEqual(copia.stock_bloqueado, 5)
+        self.assertFalse(copia.activo)
+
+    def test_admin_informa_el_conflicto_en_vez_de_500(self):
+        admin = get_user_model().objects.create_superuser(
+            "admin", "admin@test.com", "pass1234")
+        self.client.force_login(admin)
+        url = reverse("admin:inventario_productovariante_change", args=[self.variante.pk])
+        form = self.client.get(url).context["adminform"].form
+        datos = {k: v for k, v in form.initial.items()
+                 if v not in (None, "") and k != "imagen_variante"}
+        datos["precio"] = 6000
+
+        original = ProductoVarianteAdmin.save_model
+
+        def con_reserva_en_medio(modelo, request, obj, *args):
+            stock.reservar([(obj.pk, 1)])  # un pedido entra mientras se guarda
+            return original(modelo, request, obj, *args)
+
+        with patch.object(ProductoVarianteAdmin, "save_model", con_reserva_en_medio):
+            resp = self.client.post(url, datos, follow=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("modificado por otro usuario",
+                      " ".join(str(m) for m in resp.context["messages"]))
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.precio, 5000)
+
+    def test_accion_liberar_informa_el_conflicto(self):
+        stock.reservar([(self.variante.pk, 2)])
+        copia = ProductoVariante.objects.get(pk=self.variante.pk)
+        stock.reservar([(self.variante.pk, 1)])
+        request = RequestFactory().post("/")
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        ProductoVarianteAdmin(ProductoVariante, site).liberar_bloqueo(request, [copia])
+        self.assertEqual(len([m for m in request._messages
+                              if m.level == messages.ERROR]), 1)
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock_bloqueado, 3)
+
+
+class EscrituraUnicaVarianteTests(TestCase):
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.variante = crear_variante(producto, "LAT-S", stock_inicial=3)
+
+    def sentencias(self, funcion):
+        """Las del cambio de stock, sin savepoints ni el INSERT del kardex."""
+        with CaptureQueriesContext(connection) as ctx:
+            funcion()
+        return [q["sql"] for q in ctx.captured_queries
+                if "SAVEPOINT" not in q["sql"]
+                and "inventario_movimientoinventario" not in q["sql"]]
+
+    def test_bloquear_y_descontar_en_una_sentencia(self):
+        version = self.variante.version
+        sql = self.sentencias(lambda: self.variante.bloquear(2))
+        self.assertEqual(len(sql), 1)
+        self.assertTrue(sql[0].startswith("UPDATE"))
+        sql = self.sentencias(lambda: self.variante.descontar(1))
+        self.assertEqual(len(sql), 1)
+        # Valores devueltos por el UPDATE, sin releer
+        self.assertEqual((self.variante.stock, self.variante.stock_bloqueado,
+                          self.variante.activo, self.variante.version),
+                         (2, 2, False, version + 2))
+        with self.assertRaises(stock.StockInsuficiente):
+            self.variante.descontar(1)
+
+    def test_save_de_stock_escribe_activo_en_el_mismo_update(self):
+        self.variante.stock_bloqueado = 3
+        self.variante.save(update_fields=["stock_bloqueado"])
+        self.variante.stock = 5
+        sql = self.sentencias(
+            lambda: self.variante.save(update_fields=["stock"]))
+        self.assertEqual(len(sql), 1)
+        self.assertIn('"activo"', sql[0])
+        self.variante.refresh_from_db()
+        self.assertTrue(self.variante.activo)
+
+
+class ConcurrenciaStockTests(TransactionTestCase):
+    """Hilos reales contra una BD en archivo (ver DATABASES["TEST"])."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Requiere una BD compartida entre conexiones.")
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.variante = crear_variante(producto, "LAT-S", stock_inicial=12)
+
+    def test_bloqueos_simultaneos_no_sobrevenden(self):
+        def bloquear(i):
+            ProductoVariante.objects.get(pk=self.variante.pk).bloquear(1)
+
+        resultados, errores = en_hilos(20, bloquear)
+        self.assertEqual(len(resultados), 12)
+        self.assertTrue(all(isinstance(e, ValidationError) for e in errores))
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock_bloqueado, 12)
+
+    def test_descuentos_simultaneos_no_pierden_escrituras(self):
+        def descontar(i):
+            ProductoVariante.objects.get(pk=self.variante.pk).descontar(1)
+
+        resultados, errores = en_hilos(8, descontar)
+        # Con reintento acotado puede agotarse algún hilo, pero lo que se
+        # confirmó coincide exactamente con el stock final.
+        self.assertTrue(all(isinstance(e, ConflictoVersion) for e in errores))
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock, 12 - len(resultados))
+
+
+class MenuDocumentoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        self.productos = [
+            Producto.objects.create(nombre=f"Producto {i}", subcategoria=sub)
+            for i in range(4)]
+        self.variantes = [
+            crear_variante(p, f"SKU-{i}-{j}", stock_inicial=2)
+            for i, p in enumerate(self.productos) for j in range(2)]
+        self.client = APIClient()
+        self.url = reverse("menu-menu")
+
+    def test_consultas_fijas_y_luego_desde_cache(self):
+        with CaptureQueriesContext(connection) as armado:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data[0]["subcategorias"][0]["productos"]), 4)
+        self.assertEqual(len(armado), 5)  # categorías, subs, productos, variantes + stock vivo
+        with CaptureQueriesContext(connection) as cacheado:
+            self.client.get(self.url)
+        self.assertEqual(len(cacheado), 1)  # solo el stock vivo
+
+    def test_etag_y_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+
+        self.productos[0].nombre = "Renombrado"
+        self.productos[0].save()
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_stock_agotado_sale_del_menu(self):
+        self.client.get(self.url)
+        stock.reservar([(v.pk, 2) for v in self.variantes[:2]])
+        productos = self.client.get(self.url).data[0]["subcategorias"][0]["productos"]
+        self.assertNotIn(self.productos[0].pk, [p["id"] for p in productos])
+
+    def test_stock_vivo_sin_reconstruir(self):
+        resp = self.client.get(self.url)
+        variante = resp.data[0]["subcategorias"][0]["productos"][0]["variantes"][0]
+        self.assertEqual(variante["stock"], 2)
+        version = menu.version()
+
+        stock.reservar([(variante["id"], 1)])
+        self.assertEqual(menu.version(), version)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        variante = resp.data[0]["subcategorias"][0]["productos"][0]["variantes"][0]
+        self.assertEqual(variante["stock"], 1)
+
+        resp = self.client.get(reverse("buscar-list"), {"q": "Producto"})
+        self.assertEqual(resp.data[0]["variantes"][0]["stock"], 1)
+
+    def test_solo_invalida_si_cambia_la_disponibilidad(self):
+        vid = self.variantes[0].pk
+
+        def invalida(operacion, cantidad):
+            antes = menu.version()
+            operacion([(vid, cantidad)])
+            return menu.version() != antes
+
+        self.assertFalse(invalida(stock.reservar, 1))   # 2 → 1 disponible
+        self.assertTrue(invalida(stock.reservar, 1))    # se agota
+        self.assertTrue(invalida(stock.liberar, 1))     # vuelve
+        self.assertFalse(invalida(stock.consumir, 1))   # 1 → 1 (sin reserva previa)
+        self.assertTrue(invalida(stock.descontar, 1))   # se agota
+        self.assertTrue(invalida(stock.ingresar, 3))
+        self.assertFalse(invalida(stock.ingresar, 1))
+        self.assertFalse(invalida(stock.liberar, 1))    # nada bloqueado: sigue igual
+
+    def test_mientras_otro_reconstruye_sirve_el_anterior(self):
+        base = "http://testserver/"
+        anterior = menu.documento(base)
+        menu.invalidar()
+        cache.add(menu._candado(base), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            servido = menu.documento(base)
+        self.assertEqual(servido["version"], anterior["version"])
+        self.assertNotEqual(servido["version"], menu.version())
+        self.assertEqual(len(ctx), 0)
+
+
+class KardexTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            "admin", "admin@test.com", password="pass1234", rol="ADMIN")
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.variante = crear_variante(producto, "LAT-S", stock_inicial=10)
+
+    def movimientos(self):
+        return list(MovimientoInventario.objects.filter(variante=self.variante)
+                    .order_by("id").values_list("tipo", "cantidad", "delta_stock",
+                                                "numero_pedido"))
+
+    def test_motor_y_save_registran_movimientos(self):
+        vid = self.variante.pk
+        stock.reservar([(vid, 2, 7), (vid, 1, 8)])
+        stock.consumir([(vid, 2, 7)])
+        stock.ajustar([(vid, -3)], usuario=self.admin)
+        self.variante.refresh_from_db()
+        self.variante.stock += 5
+        self.variante.save(update_fields=["stock"])
+        M = MovimientoInventario
+        self.assertEqual(self.movimientos(), [
+            (M.INGRESO, 10, 10, None),
+            (M.RESERVA, 2, 0, 7), (M.RESERVA, 1, 0, 8),
+            (M.CONSUMO, 2, -2, 7),
+            (M.AJUSTE, 3, -3, None),
+            (M.AJUSTE, 5, 5, None),
+        ])
+        self.assertEqual(M.objects.get(delta_stock=-3).usuario, self.admin)
+        self.assertEqual(self.variante.stock, 10)
+
+    def test_borrar_producto_con_movimientos(self):
+        stock.consumir([(self.variante.pk, 2)])
+        kardex.abrir()
+        self.variante.producto.delete()
+        self.assertFalse(ProductoVariante.objects.exists())
+        self.assertFalse(MovimientoInventario.objects.exists())
+        self.assertFalse(CorteInventario.objects.exists())
+
+    def test_stock_al_con_cortes(self):
+        vid = self.variante.pk
+        inicio = timezone.now()
+        stock.consumir([(vid, 4)])
+        MovimientoInventario.objects.update(fecha=inicio - timedelta(hours=2))
+        self.assertEqual(kardex.cortar(), 1)
+        corte = CorteInventario.objects.get()
+        self.assertEqual(corte.stock, 6)
+        self.assertEqual(kardex.cortar(), 0)  # nada nuevo
+
+        stock.ingresar([(vid, 3)])
+        self.assertEqual(kardex.stock_al(vid, inicio - timedelta(hours=3)), 0)
+        self.assertEqual(kardex.stock_al(vid, inicio), 6)
+        self.assertEqual(kardex.stock_al(vid, timezone.now()), 9)
+
+    def test_abrir_para_datos_sin_kardex(self):
+        MovimientoInventario.objects.all().delete()
+        stock.descontar([(self.variante.pk, 1)])
+        self.assertEqual(kardex.abrir(), 1)
+        self.assertEqual(CorteInventario.objects.get().stock, 10)
+        self.assertEqual(kardex.stock_al(self.variante.pk, timezone.now()), 9)
+
+    def test_endpoint_kardex_paginado(self):
+        for _ in range(3):
+            stock.reservar([(self.variante.pk, 1)])
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse("productovariante-kardex", args=[self.variante.pk])
+        primera = client.get(url, {"page_size": 2})
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual([m["tipo"] for m in primera.data["results"]],
+                         ["reserva", "reserva"])
+        segunda = client.get(primera.data["next"])
+        self.assertEqual([m["tipo"] for m in segunda.data["results"]],
+                         ["reserva", "ingreso"])
+        self.assertIsNone(segunda.data["next"])
+
+        resp = client.get(reverse("productovariante-stock-al", args=[self.variante.pk]),
+                          {"fecha": timezone.now().isoformat()})
+        self.assertEqual(resp.data["stock"], 10)
+
+
+def imagen_jpeg(ancho, alto, nombre="foto.jpg"):
+    salida = BytesIO()
+    Image.new("RGB", (ancho, alto), (120, 60, 30)).save(salida, "JPEG")
+    return SimpleUploadedFile(nombre, salida.getvalue(), content_type="image/jpeg")
+
+
+class ImagenesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, IMAGENES_ASYNC=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        self.sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+
+    def crear_producto(self, ancho=800, alto=600):
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.create(
+                nombre="Latte", subcategoria=self.sub, imagen=imagen_jpeg(ancho, alto))
+        producto.refresh_from_db()
+        return producto
+
+    def test_genera_derivados_al_subir(self):
+        producto = self.crear_producto()
+        derivados = producto.imagen_derivados
+        self.assertEqual(derivados["origen"], producto.imagen.name)
+        self.assertEqual(set(derivados["tamanos"]), set(imagenes.TAMANOS))
+        self.assertEqual(derivados["tamanos"]["thumb"]["ancho"], 160)
+        self.assertEqual(derivados["tamanos"]["full"]["ancho"], 800)  # no agranda
+        for tam in derivados["tamanos"].values():
+            for formato in imagenes.FORMATOS:
+                self.assertIn(derivados["hash"], tam[formato])
+                self.assertTrue(default_storage.exists(tam[formato]))
+        with default_storage.open(derivados["tamanos"]["card"]["webp"]) as f:
+            self.assertEqual(Image.open(f).size, (480, 360))
+        self.assertFalse(imagenes.pendiente(producto))
+
+    def test_menu_expone_srcset(self):
+        producto = self.crear_producto(ancho=300, alto=300)
+        crear_variante(producto, "LATTE-1")
+        prod = self.client.get(reverse("menu-menu")).data[0][
+            "subcategorias"][0]["productos"][0]
+        webp = prod["imagen_srcset"]["webp"].split(", ")
+        self.assertEqual(len(webp), 2)  # 160w y 300w (card y full coinciden)
+        self.assertTrue(webp[0].startswith("http://testserver/media/"))
+        self.assertTrue(webp[-1].endswith(" 300w"))
+        self.assertIsNone(prod["variantes"][0]["imagen_variante_srcset"])
+
+    def test_variante_conserva_version_y_reemplazo_borra_derivados(self):
+        variante = crear_variante(self.crear_producto(), "LATTE-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            variante.imagen_variante = imagen_jpeg(400, 400, "v.jpg")
+            variante.save()
+        version = variante.version
+        variante.refresh_from_db()
+        self.assertEqual(variante.version, version)  # un PATCH con ella no da 409
+        viejos = imagenes._archivos(variante.imagen_derivados)
+        self.assertTrue(viejos)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variante.imagen_variante = imagen_jpeg(300, 200, "otra.jpg")
+            variante.save()
+        variante.refresh_from_db()
+        self.assertFalse(any(default_storage.exists(n) for n in viejos))
+        self.assertTrue(all(default_storage.exists(n)
+                            for n in imagenes._archivos(variante.imagen_derivados)))
+
+    def test_regenerar_salta_lo_procesado(self):
+        producto = self.crear_producto()
+        Producto.objects.filter(pk=producto.pk).update(imagen_derivados={})
+        salida = StringIO()
+        call_command("regenerar_imagenes", "--hilos=1", stdout=salida)
+        self.assertIn("1 imágenes procesadas", salida.getvalue())
+        call_command("regenerar_imagenes", "--hilos=1", stdout=salida)
+        self.assertIn("0 imágenes procesadas", salida.getvalue())
+        call_command("regenerar_imagenes", "--hilos=1", "--forzar", stdout=salida)
+        self.assertIn("1 imágenes procesadas", salida.getvalue().splitlines()[-1])
+        producto.refresh_from_db()
+        self.assertFalse(imagenes.pendiente(producto))
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        busqueda.invalidar()
+        self.addCleanup(busqueda.invalidar)
+        bebidas = Categoria.objects.create(nombre="Bebidas")
+        cafe = SubCategoria.objects.create(categoria=bebidas, nombre="Café")
+        postres = SubCategoria.objects.create(
+            categoria=Categoria.objects.create(nombre="Postres"), nombre="Tortas")
+        self.capuchino = Producto.objects.create(nombre="Capuchino", subcategoria=cafe)
+        self.latte = Producto.objects.create(nombre="Café Latte", subcategoria=cafe)
+        self.torta = Producto.objects.create(nombre="Torta de Ñame", subcategoria=postres)
+        crear_variante(self.capuchino, "CAP-001")
+        crear_variante(self.latte, "LAT-002")
+        crear_variante(self.torta, "TOR-003")
+        self.client = APIClient()
+        self.url = reverse("buscar-list")
+
+    def ids(self, q):
+        resp = self.client.get(self.url, {"q": q})
+        self.assertEqual(resp.status_code, 200)
+        return [p["id"] for p in resp.data]
+
+    def test_normaliza_prefijos_y_tipeo(self):
+        self.assertEqual(busqueda.normalizar("Café  Ñandú!"), "cafe nandu")
+        self.assertEqual(self.ids("ñame"), [self.torta.pk])
+        self.assertEqual(self.ids("capu"), [self.capuchino.pk])
+        self.assertEqual(self.ids("capuhcino"), [self.capuchino.pk])  # transposición
+        self.assertEqual(self.ids("cafe latte"), [self.latte.pk])
+        self.assertEqual(self.ids("lat002"), [self.latte.pk])
+        self.assertEqual(self.ids("postres"), [self.torta.pk])
+        self.assertEqual(self.ids("zzz"), [])
+        self.assertEqual(self.ids(""), [])
+
+    def test_nombre_pesa_mas_que_categoria(self):
+        # "cafe" es el nombre de Café Latte y la subcategoría de Capuchino
+        self.assertEqual(self.ids("cafe"), [self.latte.pk, self.capuchino.pk])
+
+    def test_se_actualiza_con_las_senales(self):
+        self.ids("capu")  # arma el índice
+        with self.captureOnCommitCallbacks(execute=True):
+            self.capuchino.nombre = "Cappuccino"
+            self.capuchino.save()
+        self.assertEqual(self.ids("cappu"), [self.capuchino.pk])
+        self.assertEqual(self.ids("capuchino"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.torta.activo = False
+            self.torta.save()
+        self.assertEqual(busqueda.buscar("torta"), [])
+        self.assertNotIn("name", busqueda.indice().postings)
+
+    def test_sin_stock_no_aparece(self):
+        stock.reservar([(self.capuchino.variantes.get().pk, 10)])
+        self.assertEqual(self.ids("capuchino"), [])
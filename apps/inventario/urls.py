@@ -11,6 +11,7 @@ router.register(r'variantes', ProductoVarianteViewSet)
 router.register(r'productos_disponibles',
                 ProductosDisponiblesViewSet, basename='productos_disponibles')
 router.register(r'menu', MenuViewSet, basename='menu')
+router.register(r'buscar', BusquedaViewSet, basename='buscar')
 router.register(r'productos', ProductoViewSet, basename='productos')
 
 urlpatterns = [
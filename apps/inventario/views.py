@@ -1,12 +1,17 @@
-from datetime import timedelta
-from django.db.models import Count, F
+from django.core.files.storage import default_storage
+from django.db.models import F
 from django.utils import timezone
-from rest_framework import viewsets
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from apps.core.concurrencia import ConflictoVersionMixin
+from apps.core.paginacion import KeysetPagination
+from apps.pedidos import populares
 from .models import *
 from .serializers import *
-from apps.pedidos.models import DetallePedido
+from . import busqueda, imagenes, kardex, menu
 
 
 # --------------------------------------------------
@@ -47,30 +52,42 @@ class ProductoViewSet(viewsets.ModelViewSet):
         )
         return Response(self._build_home_list(ultimos, request))
 
-    # ----------  TOP 10 MÁS VENDIDOS  ----------
+    # ----------  MÁS VENDIDOS  ----------
     @action(detail=False, methods=['get'])
     def mas_vendidos(self, request):
-        from apps.pedidos.models import DetallePedido
-        hace_30_dias = timezone.now() - timedelta(days=30)
+        # Índice móvil en caché (apps.pedidos.populares) + documento del
+        # menú para los datos del producto: sin consultas con caché caliente.
+        try:
+            ventana = int(request.query_params.get('ventana', populares.VENTANA))
+            limite = int(request.query_params.get('limite', 10))
+        except ValueError:
+            return Response({"detail": "ventana y limite deben ser enteros."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        orden = request.query_params.get('orden', 'unidades')
+        if ventana not in populares.VENTANAS or orden not in populares.ORDENES:
+            return Response(
+                {"detail": f"ventana debe ser una de {list(populares.VENTANAS)} "
+                           f"y orden una de {list(populares.ORDENES)}."},
+                status=status.HTTP_400_BAD_REQUEST)
+        limite = max(1, min(limite, 50))
+
+        disponibles = menu.productos(menu.documento(request.build_absolute_uri("/")))
+        top = []
+        for producto_id, unidades, _ in populares.ranking(ventana, orden):
+            if producto_id in disponibles:
+                top.append({**disponibles[producto_id], "unidades_vendidas": unidades})
+                if len(top) == limite:
+                    break
+        return Response(menu.con_stock(top))
 
-        top = (
-            Producto.objects.filter(
-                activo=True,
-                variantes__activo=True,
-                variantes__stock__gt=F('variantes__stock_bloqueado'),
-                variantes__detallepedido__pedido__fecha_pedido__gte=hace_30_dias,
-                variantes__detallepedido__pedido__cancelado=False,
-            )
-            .annotate(unidades=Count('variantes__detallepedido__cantidad'))
-            .order_by('-unidades')
-            .distinct()[:10]
-        )
-        return Response(self._build_home_list(top, request))
     # ----------  HELPER COMÚN  ----------
 
     def _build_home_list(self, qs, request):
         def build_url(path): return request.build_absolute_uri(
             path) if path else None
+
+        def url_derivado(nombre): return request.build_absolute_uri(
+            default_storage.url(nombre))
         data = []
 
         for prod in qs:
@@ -85,6 +102,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
                 "nombre": prod.nombre,
                 "descripcion": prod.descripcion,
                 "imagen": build_url(prod.imagen.url) if prod.imagen else None,
+                "imagen_srcset": imagenes.srcset(prod.imagen_derivados, url_derivado),
                 "variantes": [
                     {
                         "id": var.id,
@@ -97,6 +115,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
                         "imagen_variante": build_url(var.imagen_variante.url)
                         if var.imagen_variante
                         else None,
+                        "imagen_variante_srcset": imagenes.srcset(
+                            var.imagen_derivados, url_derivado),
                         "ubicacion": var.ubicacion.nombre if var.ubicacion else None,
                     }
                     for var in variantes_ok
@@ -117,10 +137,32 @@ class ProductoViewSet(viewsets.ModelViewSet):
         return Response(data[0] if data else {"detail": "Sin variantes disponibles"}, status=200)
 
 
-class ProductoVarianteViewSet(viewsets.ModelViewSet):
+class ProductoVarianteViewSet(ConflictoVersionMixin, viewsets.ModelViewSet):
     queryset = ProductoVariante.objects.all()
     serializer_class = ProductoVarianteSerializer
 
+    # ----------  KARDEX (ver kardex.py)  ----------
+    @action(detail=True, methods=['get'])
+    def kardex(self, request, pk=None):
+        variante = self.get_object()
+        paginador = KeysetPagination()
+        pagina = paginador.paginate_queryset(
+            kardex.movimientos(variante.pk), request, view=self)
+        return paginador.get_paginated_response(
+            MovimientoInventarioSerializer(pagina, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path='stock-al')
+    def stock_al(self, request, pk=None):
+        variante = self.get_object()
+        fecha = parse_datetime(request.query_params.get('fecha', ''))
+        if fecha is None:
+            return Response({"fecha": "Fecha y hora ISO 8601 requerida."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return Response({"variante": variante.pk, "fecha": fecha,
+                         "stock": kardex.stock_al(variante.pk, fecha)})
+
 
 class ProductosDisponiblesViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductosDisponiblesSerializer
@@ -132,61 +174,42 @@ class ProductosDisponiblesViewSet(viewsets.ReadOnlyModelViewSet):
 class MenuViewSet(viewsets.ViewSet):
     """
     Menú limpio: solo ramas con stock > 0.
-    URLs absolutas para imágenes.
+    URLs absolutas para imágenes. Documento precalculado con ETag (ver menu.py).
     """
 
     @action(detail=False, methods=['get'])
     def menu(self, request):
-        def build_url(path): return request.build_absolute_uri(
-            path) if path else None
+        documento = menu.servir(request.build_absolute_uri("/"))
+        cabeceras = {"ETag": documento["etag"], "Cache-Control": "no-cache"}
+        etags = parse_etags(request.headers.get("If-None-Match", ""))
+        if documento["etag"] in etags or "*" in etags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+        return Response(documento["data"], headers=cabeceras)
 
-        data = []
-        categorias = (
-            Categoria.objects.filter(estado=True)
-            .prefetch_related("subcategorias__productos__variantes")
-        )
 
-        for cat in categorias:
-            cat_data = {"categoria": cat.nombre, "subcategorias": []}
-
-            for sub in cat.subcategorias.filter(estado=True):
-                sub_data = {"nombre": sub.nombre, "productos": []}
-
-                for prod in sub.productos.filter(activo=True):
-                    variantes_disponibles = prod.variantes.filter(
-                        activo=True, stock__gt=F("stock_bloqueado")
-                    )
-
-                    if variantes_disponibles.exists():
-                        sub_data["productos"].append({
-                            "id": prod.id,
-                            "nombre": prod.nombre,
-                            "descripcion": prod.descripcion,
-                            "imagen": build_url(prod.imagen.url) if prod.imagen else None,
-                            "variantes": [
-                                {
-                                    "id": var.id,
-                                    "nombre_variante": var.nombre_variante,
-                                    "sku": var.sku,
-                                    "precio": float(var.precio),
-                                    "stock": var.stock_disponible,
-                                    "stock_minimo": var.stock_minimo,
-                                    "codigo_barras": var.codigo_barras,
-                                    "imagen_variante": build_url(var.imagen_variante.url)
-                                    if var.imagen_variante
-                                    else None,
-                                    "ubicacion": var.ubicacion.nombre
-                                    if var.ubicacion
-                                    else None,
-                                }
-                                for var in variantes_disponibles
-                            ],
-                        })
-
-                if sub_data["productos"]:
-                    cat_data["subcategorias"].append(sub_data)
-
-            if cat_data["subcategorias"]:
-                data.append(cat_data)
-
-        return Response(data)
+class BusquedaViewSet(viewsets.ViewSet):
+    """
+    Búsqueda de productos para el POS: ?q=texto&limite=20.
+    Índice en memoria (ver busqueda.py); los datos salen del menú, así que
+    solo aparecen productos con stock.
+    """
+
+    def list(self, request):
+        consulta = request.query_params.get('q', '').strip()
+        try:
+            limite = int(request.query_params.get('limite', 20))
+        except ValueError:
+            return Response({"detail": "limite debe ser entero."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limite = max(1, min(limite, 50))
+        if not busqueda.tokens(consulta):
+            return Response([])
+
+        disponibles = menu.productos(menu.documento(request.build_absolute_uri("/")))
+        resultados = []
+        for producto_id, _ in busqueda.buscar(consulta):
+            if producto_id in disponibles:
+                resultados.append(disponibles[producto_id])
+                if len(resultados) == limite:
+                    break
+        return Response(menu.con_stock(resultados))
@@ -2,11 +2,14 @@ from decimal import Decimal
 from django import forms
 from django.contrib import admin, messages
 from django.utils.html import format_html
-from django.db import transaction
 from django.core.exceptions import ValidationError
+from apps.core import catalogos
 from apps.finanzas.models import Credito
 from apps.inventario.models import ProductoVariante
-from .models import Pedido, EstadoPedido, MetodoPago, DetallePedido
+from .models import (
+    Pedido, EstadoPedido, MetodoPago, DetallePedido, EstacionCocina, TicketCocina,
+    PedidoArchivado, DetallePedidoArchivado)
+from . import estados, archivo
 
 
 # ---------- Detalle Inline ----------
@@ -40,7 +43,7 @@ class DetallePedidoInline(admin.TabularInline):
     variante_info.short_description = "Variante"
 
     def has_add_permission(self, request, obj=None):
-        if obj and obj.estado.nombre in ["Entregado", "Cancelado"]:
+        if obj and estados.es_final(obj.estado_id):
             return False
         return super().has_add_permission(request, obj)
 
@@ -104,7 +107,8 @@ class PedidoAdminForm(forms.ModelForm):
                 raise forms.ValidationError("Error de validación en crédito.")
 
             credito = Credito.objects.filter(
-                cliente=cliente, estado__nombre="Activo").first()
+                cliente=cliente,
+                estado_id__in=catalogos.estados_credito.ids(["Activo"])).first()
             if not credito:
                 self.add_error(
                     "cliente", "El cliente no tiene un crédito activo aprobado.")
@@ -147,7 +151,7 @@ class PedidoAdmin(admin.ModelAdmin):
 
         if object_id:
             pedido = Pedido.objects.filter(pk=object_id).first()
-            if pedido and pedido.estado.nombre in ["Entregado", "Cancelado"]:
+            if pedido and estados.es_final(pedido.estado_id):
                 # Si está entregado o cancelado, solo mostrar "Cerrar" y "Eliminar"
                 extra_context["show_save"] = False
                 extra_context["show_save_and_continue"] = False
@@ -174,101 +178,60 @@ class PedidoAdmin(admin.ModelAdmin):
             "Entregado": "#23314d",
             "Cancelado": "#ff0000",
         }
-        color = colores.get(obj.estado.nombre, "#ccc")
+        color = colores.get(obj.nombre_estado, "#ccc")
         return format_html('<span style="background-color:{};padding:4px 8px;border-radius:4px;">{}</span>',
-                           color, obj.estado.nombre)
+                           color, obj.nombre_estado)
     estado_coloreado.short_description = "Estado"
 
-    @transaction.atomic
-    def marcar_en_cocina(self, request, queryset):
-        estado_cocina, _ = EstadoPedido.objects.get_or_create(
-            nombre="En cocina")
-        confirmados = 0
-        for pedido in queryset:
-            try:
-                pedido.confirmar()
-                pedido.estado = estado_cocina
-                pedido.save(update_fields=["estado"])
-                confirmados += 1
-            except ValidationError as e:
-                self.message_user(
-                    request, f"Pedido {pedido.id}: {e}", messages.ERROR)
-        if confirmados:
+    def _transicionar(self, request, queryset, destino, mensaje, nivel=messages.SUCCESS):
+        # Stock agregado y un solo UPDATE; los pedidos que fallan se
+        # reportan sin revertir a los demás.
+        movidos, errores = estados.transicionar_parcial(queryset, destino)
+        for pedido_id, error in errores.items():
             self.message_user(
-                request, f"{confirmados} pedidos pasaron a En cocina.", messages.SUCCESS)
+                request, f"Pedido {pedido_id}: {error}", messages.ERROR)
+        if movidos:
+            self.message_user(request, mensaje.format(len(movidos)), nivel)
+
+    def marcar_en_cocina(self, request, queryset):
+        self._transicionar(request, queryset, estados.EN_COCINA,
+                           "{} pedidos pasaron a En cocina.")
     marcar_en_cocina.short_description = "🍳 Pasar a En cocina (descontar stock)"
 
     def marcar_listo(self, request, queryset):
-        estado_listo, _ = EstadoPedido.objects.get_or_create(nombre="Listo")
-        actualizados = queryset.update(estado=estado_listo)
-        if actualizados:
-            self.message_user(
-                request, f"{actualizados} pedidos marcados como Listo.", messages.SUCCESS)
+        self._transicionar(request, queryset, estados.LISTO,
+                           "{} pedidos marcados como Listo.")
     marcar_listo.short_description = "🔔 Marcar como Listo"
 
-    @transaction.atomic
     def marcar_entregado(self, request, queryset):
-        estado_entregado, _ = EstadoPedido.objects.get_or_create(
-            nombre="Entregado")
-        entregados = 0
-        for pedido in queryset:
-            try:
-                if pedido.estado.nombre not in ["En cocina", "Entregado"]:
-                    pedido.confirmar()
-                pedido.entregar()
-                entregados += 1
-            except ValidationError as e:
-                self.message_user(
-                    request, f"Pedido {pedido.id}: {e}", messages.ERROR)
-        if entregados:
-            self.message_user(
-                request, f"Se entregaron {entregados} pedidos.", messages.SUCCESS)
+        self._transicionar(request, queryset, estados.ENTREGADO,
+                           "Se entregaron {} pedidos.")
     marcar_entregado.short_description = "✔ Marcar como Entregado"
 
-    @transaction.atomic
     def cancelar_pedidos(self, request, queryset):
-        estado_cancelado, _ = EstadoPedido.objects.get_or_create(
-            nombre="Cancelado")
-        cancelados = 0
-        for pedido in queryset:
-            try:
-                pedido.cancelar()
-                cancelados += 1
-            except ValidationError as e:
-                self.message_user(
-                    request, f"Pedido {pedido.id}: {e}", messages.ERROR)
-        if cancelados:
-            self.message_user(
-                request, f"Se cancelaron {cancelados} pedidos.", messages.WARNING)
+        self._transicionar(request, queryset, estados.CANCELADO,
+                           "Se cancelaron {} pedidos.", messages.WARNING)
     cancelar_pedidos.short_description = "❌ Cancelar pedidos seleccionados"
 
     def get_readonly_fields(self, request, obj=None):
         readonly = list(super().get_readonly_fields(request, obj))
-        if obj and obj.estado.nombre in ["Entregado", "Cancelado"]:
+        if obj and estados.es_final(obj.estado_id):
             for field in self.model._meta.fields:
                 readonly.append(field.name)
         return readonly
 
     def has_change_permission(self, request, obj=None):
-        if obj and obj.estado.nombre in ["Entregado", "Cancelado"]:
+        if obj and estados.es_final(obj.estado_id):
             return request.method in ["GET", "HEAD"]
         return super().has_change_permission(request, obj)
 
     def save_model(self, request, obj, form, change):
-        if change:
-            old = Pedido.objects.get(pk=obj.pk)
-            if old.estado.nombre != "Entregado" and obj.estado.nombre == "Entregado":
-                try:
-                    obj.entregar()
-                except ValidationError as e:
-                    self.message_user(request, str(e), level=messages.ERROR)
-                    return
-            elif old.estado.nombre != "Cancelado" and obj.estado.nombre == "Cancelado":
-                try:
-                    obj.cancelar()
-                except ValidationError as e:
-                    self.message_user(request, str(e), level=messages.ERROR)
-                    return
+        if change and "estado" in form.changed_data:
+            try:
+                obj.transicionar(obj.estado.nombre)
+            except ValidationError as e:
+                self.message_user(request, " ".join(e.messages), level=messages.ERROR)
+                return
         super().save_model(request, obj, form, change)
 
 
@@ -283,3 +246,52 @@ class EstadoPedidoAdmin(admin.ModelAdmin):
 @admin.register(MetodoPago)
 class MetodoPagoAdmin(admin.ModelAdmin):
     list_display = ("nombre", "descripcion", "activo")
+
+
+# ---------- Cocina ----------
+@admin.register(EstacionCocina)
+class EstacionCocinaAdmin(admin.ModelAdmin):
+    list_display = ("nombre", "por_defecto", "activo")
+    filter_horizontal = ("subcategorias", "cocineros")
+
+
+@admin.register(TicketCocina)
+class TicketCocinaAdmin(admin.ModelAdmin):
+    list_display = ("id", "pedido", "estacion", "cocinero", "estado",
+                    "inicio_estimado", "fin_estimado")
+    list_filter = ("estado", "estacion")
+    readonly_fields = [f.name for f in TicketCocina._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ---------- Archivo ----------
+class DetallePedidoArchivadoInline(admin.TabularInline):
+    model = DetallePedidoArchivado
+    extra = 0
+    can_delete = False
+    readonly_fields = [f.name for f in DetallePedidoArchivado._meta.fields]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PedidoArchivado)
+class PedidoArchivadoAdmin(admin.ModelAdmin):
+    inlines = [DetallePedidoArchivadoInline]
+    list_display = ("id", "cliente", "empleado", "estado", "total",
+                    "fecha_pedido", "fecha_archivo")
+    list_filter = ("estado", "tipo", "metodo_pago")
+    search_fields = ("=id", "cliente__username", "empleado__username")
+    readonly_fields = [f.name for f in PedidoArchivado._meta.fields]
+    ordering = ("-fecha_pedido",)
+    actions = ["restaurar_pedidos"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def restaurar_pedidos(self, request, queryset):
+        total = archivo.restaurar(queryset.values_list("pk", flat=True))
+        self.message_user(request, f"Se restauraron {total} pedidos.")
+    restaurar_pedidos.short_description = "↩ Restaurar a pedidos activos"
@@ -0,0 +1,115 @@
+"""
+Archivo de pedidos cerrados (tablas vivas acotadas + tablas de archivo).
+
+- archivar(): mueve por lotes los pedidos Entregados/Cancelados anteriores
+  a una fecha a PedidoArchivado / DetallePedidoArchivado (mismos ids) y
+  repunta sus movimientos y auditorías de crédito al archivo. Cada lote es
+  su propia transacción, así no se bloquea todo el histórico de una vez.
+- restaurar(): el camino inverso para pedidos concretos.
+- historial(): vivo + archivo para paginar juntos (ver KeysetPagination);
+  el historial del cliente no nota dónde está cada pedido.
+
+Se corre con `manage.py archivar_pedidos` (p. ej. a diario por cron).
+"""
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+from apps.core import catalogos
+from apps.finanzas.models import AuditoriaCredito, MovimientoCredito
+from .models import (
+    ESTADOS_FINALES, DetallePedido, DetallePedidoArchivado, Pedido,
+    PedidoArchivado, TicketCocina)
+
+DIAS = 21
+LOTE = 500
+
+ENLACES_CREDITO = (MovimientoCredito, AuditoriaCredito)
+
+
+def _campos(origen, destino):
+    """Columnas comunes (el archivo no guarda `actualizado`, etc.)."""
+    comunes = {f.attname for f in origen._meta.concrete_fields}
+    return [f.attname for f in destino._meta.concrete_fields
+            if f.attname in comunes]
+
+
+def _copiar(origen, destino, **filtro):
+    """Copia filas entre la tabla viva y la de archivo."""
+    return destino.objects.bulk_create(
+        destino(**fila)
+        for fila in origen.objects.filter(**filtro).values(
+            *_campos(origen, destino)))
+
+
+def _borrar_detalles(modelo, pedido_ids):
+    # Sin señales ni delete() por línea: el stock de un pedido cerrado ya
+    # se consumió o liberó, y sus tickets se borran antes.
+    qs = modelo.objects.filter(pedido_id__in=pedido_ids)
+    qs._raw_delete(qs.db)
+
+
+# ---------- Archivar ----------
+def archivar(antes_de, lote=LOTE):
+    """Archiva los pedidos cerrados anteriores a `antes_de`. Devuelve cuántos."""
+    cerrados = catalogos.estados_pedido.ids(ESTADOS_FINALES)
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Pedido.objects.select_for_update()
+                .filter(estado_id__in=cerrados, fecha_pedido__lt=antes_de)
+                .order_by("id").values_list("id", flat=True)[:lote])
+            if not ids:
+                return total
+            _archivar_lote(ids)
+        total += len(ids)
+
+
+def _archivar_lote(ids):
+    _copiar(Pedido, PedidoArchivado, pk__in=ids)
+    _copiar(DetallePedido, DetallePedidoArchivado, pedido_id__in=ids)
+    for modelo in ENLACES_CREDITO:
+        modelo.objects.filter(pedido_id__in=ids).update(
+            pedido_archivado_id=F("pedido_id"), pedido=None)
+    TicketCocina.objects.filter(pedido_id__in=ids).delete()
+    _borrar_detalles(DetallePedido, ids)
+    Pedido.objects.filter(pk__in=ids).delete()
+
+
+# ---------- Restaurar ----------
+@transaction.atomic
+def restaurar(ids):
+    """Devuelve a las tablas vivas los pedidos archivados `ids`."""
+    ids = list(PedidoArchivado.objects.select_for_update()
+               .filter(pk__in=ids).values_list("id", flat=True))
+    if not ids:
+        return 0
+    restaurados = _copiar(PedidoArchivado, Pedido, pk__in=ids)
+    # fecha_pedido es auto_now_add: bulk_create la pisa, se repone aquí
+    fechas = dict(PedidoArchivado.objects.filter(pk__in=ids)
+                  .values_list("id", "fecha_pedido"))
+    for pedido in restaurados:
+        pedido.fecha_pedido = fechas[pedido.pk]
+    Pedido.objects.bulk_update(restaurados, ["fecha_pedido"])
+    _copiar(DetallePedidoArchivado, DetallePedido, pedido_id__in=ids)
+    for modelo in ENLACES_CREDITO:
+        modelo.objects.filter(pedido_archivado_id__in=ids).update(
+            pedido_id=F("pedido_archivado_id"), pedido_archivado=None)
+    _borrar_detalles(DetallePedidoArchivado, ids)
+    PedidoArchivado.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+# ---------- Lectura ----------
+def historial(**filtro):
+    """[vivos, archivados] con el mismo filtro y las mismas relaciones."""
+    return [
+        modelo.objects.filter(**filtro)
+        .select_related("cliente", "empleado", "estado", "metodo_pago")
+        .prefetch_related(Prefetch(
+            "detalles",
+            queryset=detalle.objects.select_related(
+                "variante", "variante__producto")))
+        for modelo, detalle in ((Pedido, DetallePedido),
+                                (PedidoArchivado, DetallePedidoArchivado))
+    ]
@@ -0,0 +1,336 @@
+"""
+Banco de carga del ciclo de vida de un pedido (ver `manage.py bench`).
+
+- sembrar(): catálogo, usuarios, créditos, reservas y un histórico de
+  pedidos con bulk_create (sin pasar por stock ni señales), más el
+  rollup VentaDiaria. Determinista según `semilla`.
+- Escenario: recorre las rutas reales con el cliente de pruebas de Django
+  (JWT en la cabecera, como el front) y mide por paso la latencia, las
+  consultas y la memoria asignada.
+- resumen() / comparar(): percentiles y diferencias contra un resultado
+  anterior, para ver regresiones entre commits.
+"""
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import time as dt_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.core import catalogos
+from apps.finanzas.models import Credito, MovimientoCredito
+from apps.inventario import kardex, menu
+from apps.inventario.models import Categoria, Producto, ProductoVariante, SubCategoria
+from apps.reservas.models import EstadoReserva, Mesa, Reserva, Ubicacion
+from apps.usuarios.models import Usuario
+from .models import (
+    ESTADOS_RESERVAN, DetallePedido, MetodoPago, Pedido, resumir_items)
+from . import estados, ventas
+
+LOTE = 1000
+STOCK = 10 ** 6
+LIMITE_CREDITO = Decimal("10000000")
+
+
+# ---------- Datos ----------
+def sembrar(variantes=300, pedidos=20000, hoy=150, clientes=500, dias=60,
+            reservas=2000, semilla=1):
+    """Puebla la base vacía. Devuelve un resumen de lo creado."""
+    rnd = random.Random(semilla)
+    ahora = timezone.now()
+    for nombre in estados.NOMBRES:
+        catalogos.estados_pedido.id(nombre)
+    efectivo = MetodoPago.objects.create(nombre="Efectivo")
+    credito = MetodoPago.objects.create(nombre="credito")
+
+    catalogo = _sembrar_catalogo(rnd, variantes)
+    usuarios = _sembrar_usuarios(clientes)
+    con_credito = _sembrar_creditos(usuarios["CLIENTE"], ahora - timedelta(days=dias))
+
+    # Histórico (entregados / cancelados) + pedidos abiertos de hoy
+    cerrados = [estados.ENTREGADO] * 9 + [estados.CANCELADO]
+    abiertos = [estados.PENDIENTE, estados.EN_COCINA, estados.LISTO]
+    filas = []
+    for i in range(pedidos + hoy):
+        es_hoy = i >= pedidos
+        cliente = rnd.choice(usuarios["CLIENTE"])
+        fiado = cliente.pk in con_credito and rnd.random() < 0.2
+        fecha = (ahora - timedelta(minutes=rnd.randint(0, 180)) if es_hoy
+                 else ahora - timedelta(days=rnd.randint(1, dias),
+                                        minutes=rnd.randint(0, 720)))
+        filas.append((
+            Pedido(
+                cliente=cliente,
+                empleado=rnd.choice(usuarios["MESERO"]),
+                estado_id=catalogos.estados_pedido.id(
+                    rnd.choice(abiertos if es_hoy else cerrados)),
+                metodo_pago=credito if fiado else efectivo,
+                mesa=rnd.randint(1, 30),
+            ),
+            fecha,
+            [(rnd.choice(catalogo), rnd.randint(1, 3))
+             for _ in range(rnd.randint(1, 4))],
+        ))
+    _sembrar_pedidos(filas, con_credito)
+    menu.invalidar()  # bulk_update de stock_bloqueado no pasa por señales
+    kardex.abrir()  # bulk_create tampoco deja movimientos de ingreso
+    _sembrar_reservas(rnd, usuarios["CLIENTE"], reservas)
+    ventas.reconstruir(timezone.localdate(ahora - timedelta(days=dias)),
+                       timezone.localdate(ahora))
+    return {
+        "variantes": len(catalogo),
+        "pedidos": Pedido.objects.count(),
+        "lineas": DetallePedido.objects.count(),
+        "clientes": len(usuarios["CLIENTE"]),
+        "creditos": len(con_credito),
+        "reservas": Reserva.objects.count(),
+    }
+
+
+def _sembrar_catalogo(rnd, cantidad):
+    categorias = Categoria.objects.bulk_create(
+        [Categoria(nombre=f"Categoría {i}") for i in range(6)])
+    subcategorias = SubCategoria.objects.bulk_create(
+        [SubCategoria(categoria=c, nombre=f"Sub {c.nombre} {j}")
+         for c in categorias for j in range(4)])
+    productos = Producto.objects.bulk_create(
+        [Producto(nombre=f"Producto {i}", subcategoria=rnd.choice(subcategorias))
+         for i in range((cantidad + 2) // 3)])
+    return ProductoVariante.objects.bulk_create([
+        ProductoVariante(
+            producto=productos[i // 3], nombre_variante=f"Variante {i}",
+            sku=f"BENCH-{i:05d}", codigo_barras=f"B{i:011d}",
+            precio=Decimal(rnd.randrange(3000, 30000, 500)),
+            costo=Decimal(rnd.randrange(1000, 3000, 100)),
+            stock=STOCK, activo=True)
+        for i in range(cantidad)
+    ], batch_size=LOTE)
+
+
+def _sembrar_usuarios(clientes):
+    # Un solo hash: create_user tarda ~0.3 s por usuario
+    clave = make_password("bench")
+    cantidades = {"CLIENTE": clientes, "MESERO": 8, "COCINERO": 3, "ADMIN": 1}
+    Usuario.objects.bulk_create([
+        Usuario(username=f"{rol.lower()}{i}", email=f"{rol.lower()}{i}@bench.test",
+                rol=rol, password=clave)
+        for rol, n in cantidades.items() for i in range(n)
+    ], batch_size=LOTE)
+    usuarios = defaultdict(list)
+    for usuario in Usuario.objects.order_by("pk"):
+        usuarios[usuario.rol].append(usuario)
+    return usuarios
+
+
+def _sembrar_creditos(clientes, inicio):
+    activo = catalogos.estados_credito.obtener("Activo")
+    creditos = Credito.objects.bulk_create([
+        Credito(cliente=c, limite=LIMITE_CREDITO, saldo=LIMITE_CREDITO,
+                estado=activo, fecha_inicio=inicio)
+        for c in clientes[::3]
+    ])
+    return {c.cliente_id: c for c in creditos}
+
+
+def _sembrar_pedidos(filas, con_credito):
+    consumo = catalogos.tipos_movimiento.obtener("Consumo")
+    entregado = catalogos.estados_pedido.id(estados.ENTREGADO)
+    reservan = set(catalogos.estados_pedido.ids(ESTADOS_RESERVAN))
+    for inicio in range(0, len(filas), LOTE):
+        tramo = filas[inicio:inicio + LOTE]
+        for pedido, _, lineas in tramo:
+            pedido.total = sum(v.precio * n for v, n in lineas)
+            # bulk_create no pasa por actualizar_total: resumen a mano
+            pedido.num_lineas = len(lineas)
+            pedido.num_unidades = sum(n for _, n in lineas)
+            pedido.resumen_items = resumir_items(
+                (n, v.producto.nombre, v.nombre_variante) for v, n in lineas)
+        creados = Pedido.objects.bulk_create([p for p, _, _ in tramo])
+        # fecha_pedido es auto_now_add: bulk_create la pisa
+        for pedido, (_, fecha, _) in zip(creados, tramo):
+            pedido.fecha_pedido = pedido.fecha_estado = fecha
+        Pedido.objects.bulk_update(
+            creados, ["fecha_pedido", "fecha_estado"], batch_size=500)
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, variante=v, cantidad=n,
+                          precio_unitario=v.precio, subtotal=v.precio * n)
+            for pedido, (_, _, lineas) in zip(creados, tramo)
+            for v, n in lineas
+        ])
+        MovimientoCredito.objects.bulk_create([
+            MovimientoCredito(credito=con_credito[p.cliente_id], tipo=consumo,
+                              monto=p.total, fecha=p.fecha_pedido, pedido=p,
+                              detalle=f"Pedido #{p.pk}")
+            for p in creados
+            if p.metodo_pago.nombre == "credito" and p.estado_id == entregado
+        ])
+    # Reservas de stock coherentes con los pedidos abiertos
+    bloqueado = dict(
+        DetallePedido.objects.filter(pedido__estado_id__in=reservan)
+        .values_list("variante_id").annotate(Sum("cantidad")))
+    variantes = list(ProductoVariante.objects.filter(pk__in=bloqueado))
+    for v in variantes:
+        v.stock_bloqueado = bloqueado[v.pk]
+    ProductoVariante.objects.bulk_update(variantes, ["stock_bloqueado"])
+
+
+def _sembrar_reservas(rnd, clientes, cantidad):
+    ubicacion = Ubicacion.objects.create(nombre="Salón")
+    mesas = Mesa.objects.bulk_create(
+        [Mesa(numero=i, capacidad=4, ubicacion=ubicacion) for i in range(1, 31)])
+    estados_reserva = EstadoReserva.objects.bulk_create(
+        [EstadoReserva(nombre=n) for n in ("Pendiente", "Confirmada", "Cancelada")])
+    hoy = timezone.localdate()
+    franjas = [dt_time(h, m) for h in range(12, 22) for m in (0, 30)]
+    ocupadas = set()
+    reservas = []
+    while len(reservas) < cantidad:
+        clave = (rnd.choice(mesas), hoy + timedelta(days=rnd.randint(-30, 30)),
+                 rnd.choice(franjas))
+        if clave in ocupadas:
+            continue
+        ocupadas.add(clave)
+        mesa, fecha, inicio = clave
+        reservas.append(Reserva(
+            usuario=rnd.choice(clientes), mesa=mesa, fecha=fecha,
+            hora_inicio=inicio, hora_fin=dt_time(inicio.hour, inicio.minute + 29),
+            numero_personas=rnd.randint(1, 4), estado=rnd.choice(estados_reserva),
+            codigo_confirmacion=f"{len(reservas):06X}"))
+    Reserva.objects.bulk_create(reservas, batch_size=LOTE)
+
+
+# ---------- Escenario ----------
+class Paso:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.latencias = []
+        self.consultas = []
+        self.memoria = []
+
+
+class ErrorEscenario(Exception):
+    pass
+
+
+class Escenario:
+    """
+    Un ciclo = crear pedido a crédito, agregar líneas, lista de cocina,
+    entregar (consume el crédito), menú e historial del cliente.
+    """
+    PASOS = ["crear_pedido", "agregar_lineas", "cocina", "entregar_credito",
+             "menu", "mis_pedidos"]
+
+    def __init__(self, lineas=3, semilla=1):
+        self.rnd = random.Random(semilla)
+        self.lineas = lineas
+        self.pasos = {nombre: Paso(nombre) for nombre in self.PASOS}
+        self.mesero = self._cliente_http(Usuario.objects.filter(rol="MESERO").first())
+        self.cocinero = self._cliente_http(Usuario.objects.filter(rol="COCINERO").first())
+        self.anonimo = Client()
+        creditos = Credito.objects.select_related("cliente").order_by("pk")
+        self.clientes = [(c.cliente, self._cliente_http(c.cliente)) for c in creditos]
+        self.variantes = list(ProductoVariante.objects.values_list("pk", flat=True))
+        self.pendiente = catalogos.estados_pedido.id(estados.PENDIENTE)
+        self.credito = MetodoPago.objects.get(nombre="credito").pk
+
+    @staticmethod
+    def _cliente_http(usuario):
+        return Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(usuario)}")
+
+    def ciclo(self, medir=True, memoria=False):
+        cliente, http_cliente = self.rnd.choice(self.clientes)
+        resp = self._pedir(
+            "crear_pedido", self.mesero.post, reverse("pedido-list-create"),
+            {"cliente": cliente.pk, "estado_id": self.pendiente,
+             "metodo_pago_id": self.credito, "mesa": self.rnd.randint(1, 30)},
+            201, medir, memoria)
+        pedido = resp.json()["id"]
+        self._pedir(
+            "agregar_lineas", self.mesero.post,
+            reverse("pedido-detalles-bulk", args=[pedido]),
+            {"detalles": [{"variante_id": v, "cantidad": 1}
+                          for v in self.rnd.sample(self.variantes, self.lineas)]},
+            201, medir, memoria)
+        self._pedir("cocina", self.cocinero.get, reverse("pedidos-cocina"),
+                    None, 200, medir, memoria)
+        self._pedir("entregar_credito", self.mesero.post,
+                    reverse("pedido-transiciones"),
+                    {"pedidos": [pedido], "estado": estados.ENTREGADO},
+                    200, medir, memoria)
+        self._pedir("menu", self.anonimo.get, reverse("menu-menu"),
+                    None, 200, medir, memoria)
+        self._pedir("mis_pedidos", http_cliente.get, reverse("mis-pedidos-todos"),
+                    None, 200, medir, memoria)
+
+    def _pedir(self, nombre, metodo, url, datos, esperado, medir, memoria):
+        kwargs = {"data": datos, "content_type": "application/json"} if datos else {}
+        paso = self.pasos[nombre]
+        with CaptureQueriesContext(connection) as ctx:
+            if memoria:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            inicio = time.perf_counter()
+            resp = metodo(url, **kwargs)
+            duracion = time.perf_counter() - inicio
+            if memoria:
+                paso.memoria.append(tracemalloc.get_traced_memory()[1] - base)
+        if resp.status_code != esperado:
+            raise ErrorEscenario(
+                f"{nombre}: {resp.status_code} (esperado {esperado}) "
+                f"{resp.content[:300]!r}")
+        if medir and not memoria:
+            paso.latencias.append(duracion)
+            paso.consultas.append(len(ctx.captured_queries))
+        return resp
+
+
+# ---------- Resultados ----------
+def percentil(valores, p):
+    """Rango más cercano: el menor valor con al menos p% de datos <= él."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, -(-len(ordenados) * p // 100) - 1)
+    return ordenados[int(indice)]
+
+
+def resumen(paso):
+    ms = [v * 1000 for v in paso.latencias]
+    return {
+        "n": len(ms),
+        "p50_ms": round(percentil(ms, 50), 2),
+        "p95_ms": round(percentil(ms, 95), 2),
+        "p99_ms": round(percentil(ms, 99), 2),
+        "media_ms": round(sum(ms) / len(ms), 2),
+        "consultas": percentil(paso.consultas, 50),
+        "consultas_max": max(paso.consultas),
+        "memoria_kb": (round(percentil(paso.memoria, 50) / 1024, 1)
+                       if paso.memoria else None),
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """
+    [(paso, campo, antes, ahora, regresion)] para p95 y consultas.
+    Es regresión si p95 crece más que `tolerancia` (fracción) o si sube
+    el número de consultas.
+    """
+    filas = []
+    for nombre, ahora in actual.items():
+        antes = base.get(nombre)
+        if antes is None:
+            continue
+        filas.append((nombre, "p95_ms", antes["p95_ms"], ahora["p95_ms"],
+                      ahora["p95_ms"] > antes["p95_ms"] * (1 + tolerancia)))
+        filas.append((nombre, "consultas", antes["consultas"], ahora["consultas"],
+                      ahora["consultas"] > antes["consultas"]))
+    return filas
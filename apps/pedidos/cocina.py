@@ -0,0 +1,347 @@
+"""
+Planificador de cocina.
+
+Cada línea de un pedido en cocina se convierte en un TicketCocina con una
+duración estimada (minutos de la variante, o de su subcategoría, por la
+cantidad). La estación sale de la subcategoría del producto y, dentro de
+la estación, el ticket va al cocinero que se libera primero:
+
+- Un heap por estación con (libre_en, cocinero).
+- Dentro de un pedido se asignan primero los tickets más largos (LPT):
+  reparte la carga entre cocineros y acerca el fin del pedido al mínimo.
+- Los pedidos se atienden por orden de llegada. Planificar uno nuevo solo
+  lee el `libre_en` de cada cocinero (una consulta agregada) y agrega sus
+  tickets al final de las colas; no se reordena el día.
+
+Cuando un ticket empieza o termina antes/después de lo estimado, o se
+retira, solo se recalcula la cola de ese cocinero.
+
+Sin estaciones activas no se planifica nada (la cocina sigue con la
+lista de pedidos de siempre).
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from apps.core import catalogos
+from .models import DetallePedido, EstacionCocina, TicketCocina, ESTADOS_RESERVAN
+from . import eventos
+
+# Minutos por unidad cuando ni la variante ni la subcategoría lo definen
+TIEMPO_POR_DEFECTO = 5
+
+_LINEA = ("id", "pedido_id", "cantidad", "variante__tiempo_preparacion",
+          "variante__producto__subcategoria_id",
+          "variante__producto__subcategoria__tiempo_preparacion")
+
+
+def duracion(cantidad, minutos_variante=None, minutos_subcategoria=None):
+    """Segundos estimados de una línea."""
+    minutos = next((m for m in (minutos_variante, minutos_subcategoria)
+                    if m is not None), TIEMPO_POR_DEFECTO)
+    return minutos * 60 * cantidad
+
+
+def _clave(cocinero_id, estacion_id):
+    # Una cola por cocinero; las estaciones sin cocineros tienen una sola
+    return cocinero_id if cocinero_id is not None else ("estacion", estacion_id)
+
+
+def _filtro_colas(claves):
+    return reduce(or_, (
+        Q(cocinero_id=c) if not isinstance(c, tuple)
+        else Q(cocinero__isnull=True, estacion_id=c[1])
+        for c in claves))
+
+
+# ---------- Estaciones ----------
+def _estaciones():
+    """(ids activas, estación por subcategoría, por defecto, cocineros por estación)."""
+    activas = list(EstacionCocina.objects.filter(activo=True).order_by("id")
+                   .values_list("id", "por_defecto"))
+    ids = [pk for pk, _ in activas]
+    if not ids:
+        return ids, {}, None, {}
+    por_defecto = next((pk for pk, defecto in activas if defecto), None)
+
+    por_subcategoria = dict(
+        EstacionCocina.subcategorias.through.objects
+        .filter(estacioncocina_id__in=ids)
+        .order_by("estacioncocina_id")
+        .values_list("subcategoria_id", "estacioncocina_id"))
+
+    cocineros = defaultdict(list)
+    for estacion_id, usuario_id in (
+            EstacionCocina.cocineros.through.objects
+            .filter(estacioncocina_id__in=ids, usuario__is_active=True)
+            .order_by("usuario_id")
+            .values_list("estacioncocina_id", "usuario_id")):
+        cocineros[estacion_id].append(usuario_id)
+    return ids, por_subcategoria, por_defecto, cocineros
+
+
+def _bloquear(estacion_ids, cocineros):
+    """
+    Bloquea, en orden de pk, las estaciones que reciben tickets y las que
+    comparten algún cocinero con ellas (su cola es la misma). Solo se
+    esperan los planificadores que tocan las mismas colas.
+    """
+    estacion_ids = {e for e in estacion_ids if e is not None}
+    propios = {c for e in estacion_ids for c in cocineros.get(e, ())}
+    estacion_ids |= {e for e, cs in cocineros.items() if propios.intersection(cs)}
+    list(EstacionCocina.objects.select_for_update()
+         .filter(pk__in=estacion_ids).order_by("id").values_list("id", flat=True))
+
+
+def _libre_en(claves, ahora):
+    """{clave: momento en que termina su último ticket abierto}"""
+    libre = dict.fromkeys(claves, ahora)
+    if not claves:
+        return libre
+    for estacion_id, cocinero_id, fin in (
+            TicketCocina.objects
+            .filter(_filtro_colas(claves), estado__in=TicketCocina.ABIERTOS)
+            .values_list("estacion_id", "cocinero_id")
+            .annotate(fin=Max("fin_estimado")).order_by()):
+        clave = _clave(cocinero_id, estacion_id)
+        libre[clave] = max(libre[clave], fin)
+    return libre
+
+
+def _tomar(heap, libre):
+    """Saca del heap al trabajador que se libera primero."""
+    while True:
+        inicio, orden, clave = heapq.heappop(heap)
+        if inicio == libre[clave]:
+            return inicio, orden, clave
+        # Ya recibió tickets desde otra estación: se reubica
+        heapq.heappush(heap, (libre[clave], orden, clave))
+
+
+# ---------- Planificación ----------
+@transaction.atomic
+def planificar(detalle_ids=None, pedido_ids=None):
+    """
+    Crea los tickets de las líneas sin ticket de pedidos en cocina (de
+    `detalle_ids` o `pedido_ids`) y los agrega al final de las colas.
+    Devuelve los tickets creados.
+    """
+    lineas = DetallePedido.objects.filter(
+        ticket__isnull=True, variante__isnull=False,
+        pedido__estado_id__in=catalogos.estados_pedido.ids(ESTADOS_RESERVAN))
+    if detalle_ids is not None:
+        lineas = lineas.filter(pk__in=list(detalle_ids))
+    if pedido_ids is not None:
+        lineas = lineas.filter(pedido_id__in=list(pedido_ids))
+    lineas = list(lineas.order_by("pedido_id", "id").values_list(*_LINEA))
+    if not lineas:
+        return []
+
+    activas, por_subcategoria, por_defecto, cocineros = _estaciones()
+    if not activas:
+        return []
+    destino = {linea[0]: por_subcategoria.get(linea[4], por_defecto) for linea in lineas}
+    _bloquear(set(destino.values()), cocineros)
+    # Con las colas bloqueadas: otra transacción pudo planificar alguna línea
+    planificadas = set(TicketCocina.objects.filter(detalle_id__in=list(destino))
+                       .values_list("detalle_id", flat=True))
+    lineas = [linea for linea in lineas if linea[0] not in planificadas]
+    if not lineas:
+        return []
+
+    ahora = timezone.now()
+    por_pedido = defaultdict(lambda: defaultdict(list))
+    for detalle_id, pedido_id, cantidad, min_var, sub_id, min_sub in lineas:
+        estacion_id = destino[detalle_id]
+        por_pedido[pedido_id][estacion_id].append(TicketCocina(
+            detalle_id=detalle_id, pedido_id=pedido_id, estacion_id=estacion_id,
+            duracion=duracion(cantidad, min_var, min_sub)))
+
+    trabajadores = {
+        e: cocineros.get(e) or [_clave(None, e)]
+        for estaciones in por_pedido.values() for e in estaciones}
+    libre = _libre_en({c for cs in trabajadores.values() for c in cs}, ahora)
+    heaps = {e: [(libre[c], i, c) for i, c in enumerate(cs)]
+             for e, cs in trabajadores.items()}
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    tickets = []
+    for pedido_id in sorted(por_pedido):  # orden de llegada
+        for estacion_id, pendientes in por_pedido[pedido_id].items():
+            heap = heaps[estacion_id]
+            for ticket in sorted(pendientes, key=lambda t: -t.duracion):
+                inicio, orden, clave = _tomar(heap, libre)
+                ticket.cocinero_id = None if isinstance(clave, tuple) else clave
+                ticket.inicio_estimado = inicio
+                ticket.fin_estimado = inicio + timedelta(seconds=ticket.duracion)
+                libre[clave] = ticket.fin_estimado
+                heapq.heappush(heap, (libre[clave], orden, clave))
+                tickets.append(ticket)
+
+    # ignore_conflicts: red de seguridad si la línea se planificó por otra
+    # vía; solo cuentan los tickets que quedaron insertados
+    armados = {t.detalle_id: t for t in tickets}
+    TicketCocina.objects.bulk_create(tickets, ignore_conflicts=True)
+    tickets = [
+        t for t in TicketCocina.objects.filter(detalle_id__in=list(armados))
+        .order_by("id")
+        if (t.cocinero_id, t.estacion_id, t.inicio_estimado)
+        == (armados[t.detalle_id].cocinero_id, armados[t.detalle_id].estacion_id,
+            armados[t.detalle_id].inicio_estimado)]
+    if len(tickets) < len(armados):
+        # Los saltados dejaron huecos en las colas
+        recalcular_colas({_clave(t.cocinero_id, t.estacion_id)
+                          for t in armados.values()})
+        tickets = list(TicketCocina.objects.filter(pk__in=[t.pk for t in tickets])
+                       .order_by("id"))
+
+    for pedido_id in sorted({t.pedido_id for t in tickets}):
+        propios = [t for t in tickets if t.pedido_id == pedido_id]
+        eventos.publicar(
+            eventos.TICKETS_PLANIFICADOS, pedido_id,
+            estaciones=sorted({t.estacion_id for t in propios
+                               if t.estacion_id is not None}),
+            fin_estimado=max(t.fin_estimado for t in propios).isoformat(),
+        )
+    return tickets
+
+
+def recalcular_colas(claves, ahora=None):
+    """Reencadena desde ahora los tickets abiertos de esas colas."""
+    if not claves:
+        return
+    ahora = ahora or timezone.now()
+    abiertos = sorted(
+        TicketCocina.objects.filter(
+            _filtro_colas(claves), estado__in=TicketCocina.ABIERTOS),
+        key=lambda t: (t.estado != TicketCocina.PREPARANDO,
+                       t.inicio_estimado, t.id))
+
+    libre, cambiados = {}, []
+    for t in abiertos:
+        clave = _clave(t.cocinero_id, t.estacion_id)
+        if t.estado == TicketCocina.PREPARANDO:
+            inicio = t.inicio_real or t.inicio_estimado
+            fin = max(inicio + timedelta(seconds=t.duracion), ahora)
+        else:
+            inicio = libre.get(clave, ahora)
+            fin = inicio + timedelta(seconds=t.duracion)
+        if (inicio, fin) != (t.inicio_estimado, t.fin_estimado):
+            t.inicio_estimado, t.fin_estimado = inicio, fin
+            cambiados.append(t)
+        libre[clave] = max(libre.get(clave, ahora), fin)
+    TicketCocina.objects.bulk_update(
+        cambiados, ["inicio_estimado", "fin_estimado"], batch_size=500)
+
+
+def _claves_de(tickets):
+    return {_clave(c, e) for c, e in tickets.values_list("cocinero_id", "estacion_id")}
+
+
+# ---------- Cambios de líneas y pedidos ----------
+@transaction.atomic
+def actualizar_lineas(detalle_ids):
+    """Recalcula la duración de tickets pendientes cuya línea cambió."""
+    pendientes = TicketCocina.objects.filter(
+        detalle_id__in=list(detalle_ids), estado=TicketCocina.PENDIENTE
+    ).select_related("detalle__variante__producto__subcategoria")
+    cambiados = []
+    for t in pendientes:
+        variante = t.detalle.variante
+        subcategoria = variante.producto.subcategoria
+        nueva = duracion(t.detalle.cantidad, variante.tiempo_preparacion,
+                         subcategoria and subcategoria.tiempo_preparacion)
+        if nueva != t.duracion:
+            t.duracion = nueva
+            cambiados.append(t)
+    if cambiados:
+        TicketCocina.objects.bulk_update(cambiados, ["duracion"])
+        recalcular_colas({_clave(t.cocinero_id, t.estacion_id) for t in cambiados})
+
+
+@transaction.atomic
+def retirar(pedido_ids=None, detalle_ids=None):
+    """Borra los tickets abiertos (pedido cancelado o línea eliminada)."""
+    abiertos = TicketCocina.objects.filter(estado__in=TicketCocina.ABIERTOS)
+    if pedido_ids is not None:
+        abiertos = abiertos.filter(pedido_id__in=list(pedido_ids))
+    if detalle_ids is not None:
+        abiertos = abiertos.filter(detalle_id__in=list(detalle_ids))
+    claves = _claves_de(abiertos)
+    if claves:
+        abiertos.delete()
+        recalcular_colas(claves)
+
+
+@transaction.atomic
+def cerrar(pedido_ids):
+    """Marca como listos los tickets abiertos (pedido Listo o Entregado)."""
+    abiertos = TicketCocina.objects.filter(
+        pedido_id__in=list(pedido_ids), estado__in=TicketCocina.ABIERTOS)
+    claves = _claves_de(abiertos)
+    if claves:
+        abiertos.update(estado=TicketCocina.LISTO, fin_real=timezone.now())
+        recalcular_colas(claves)
+
+
+# ---------- Avance de tickets ----------
+def _releer(ticket):
+    """Relee el ticket con la fila bloqueada: otro request pudo haberlo avanzado."""
+    ticket.refresh_from_db(from_queryset=TicketCocina.objects.select_for_update())
+
+
+@transaction.atomic
+def iniciar(ticket, cocinero=None):
+    """El ticket pasa a Preparando; un cocinero puede tomarlo de otra cola."""
+    _releer(ticket)
+    if ticket.estado != TicketCocina.PENDIENTE:
+        raise ValidationError("Solo se puede iniciar un ticket pendiente.")
+    claves = {_clave(ticket.cocinero_id, ticket.estacion_id)}
+    if cocinero is not None and cocinero.pk != ticket.cocinero_id:
+        ticket.cocinero = cocinero
+        claves.add(_clave(cocinero.pk, ticket.estacion_id))
+    ticket.estado = TicketCocina.PREPARANDO
+    ticket.inicio_real = ticket.inicio_estimado = timezone.now()
+    ticket.save(update_fields=["estado", "cocinero", "inicio_real",
+                               "inicio_estimado"])
+    recalcular_colas(claves)
+    ticket.refresh_from_db(fields=["fin_estimado"])
+    return ticket
+
+
+@transaction.atomic
+def completar(ticket):
+    """El ticket pasa a Listo; la cola del cocinero se adelanta o atrasa."""
+    _releer(ticket)
+    if ticket.estado == TicketCocina.LISTO:
+        raise ValidationError("El ticket ya está listo.")
+    ahora = timezone.now()
+    ticket.estado = TicketCocina.LISTO
+    ticket.inicio_real = ticket.inicio_real or ahora
+    ticket.fin_real = ticket.fin_estimado = ahora
+    ticket.save(update_fields=["estado", "inicio_real", "fin_real", "fin_estimado"])
+    recalcular_colas({_clave(ticket.cocinero_id, ticket.estacion_id)}, ahora)
+    return ticket
+
+
+def pedido_listo(pedido_id):
+    """¿Ya no quedan tickets abiertos del pedido?"""
+    return not TicketCocina.objects.filter(
+        pedido_id=pedido_id, estado__in=TicketCocina.ABIERTOS).exists()
+
+
+# ---------- Lectura ----------
+def cola(estacion_id):
+    """Tickets abiertos de una estación en el orden en que se van a preparar."""
+    return (TicketCocina.objects
+            .filter(estacion_id=estacion_id, estado__in=TicketCocina.ABIERTOS)
+            .select_related("pedido", "cocinero", "detalle__variante__producto")
+            .order_by("inicio_estimado", "id"))
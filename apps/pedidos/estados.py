@@ -0,0 +1,341 @@
+"""
+Máquina de estados de Pedido.
+
+TRANSICIONES declara, por estado de origen, los destinos permitidos y los
+efectos de cada paso (stock, crédito, cancelación). A partir de ella se
+arma una tabla por ids (origen_id, destino_id) → Transicion: se calcula
+en el primer uso y se rehace solo si cambian los ids del catálogo.
+
+`transicionar(pedidos, destino)` es la única puerta para cambiar estados:
+valida todo el lote, aplica el stock agregado de todos los pedidos en una
+operación por efecto, escribe el estado con un UPDATE por grupo y publica
+los eventos de cocina/seguimiento al confirmar. `transicionar_parcial`
+hace lo mismo pero reporta los pedidos que fallan sin revertir el resto
+(acciones masivas del admin).
+"""
+import threading
+from collections import defaultdict, namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from apps.core import catalogos
+from apps.core.concurrencia import siguiente_version
+from apps.inventario import stock
+from apps.inventario.stock import StockInsuficiente
+from .models import Pedido, DetallePedido, ESTADOS_FINALES
+from . import cocina, eventos, seguimiento, ventas
+
+PENDIENTE = "Pendiente"
+EN_COCINA = "En cocina"
+LISTO = "Listo"
+ENTREGADO = "Entregado"
+CANCELADO = "Cancelado"
+
+NOMBRES = [PENDIENTE, EN_COCINA, LISTO, ENTREGADO, CANCELADO]
+FINALES = set(ESTADOS_FINALES)
+
+# Efectos
+RESERVAR = "reservar"
+CONSUMIR = "consumir"
+LIBERAR = "liberar"
+CREDITO = "credito"
+CANCELAR = "cancelar"
+VENTA = "venta"              # suma al rollup VentaDiaria
+ANULAR_VENTA = "anular_venta"  # resta lo que sumó la entrega
+
+# Estados fuera del flujo (creados a mano en el catálogo): no reservan stock
+OTRO = None
+
+TRANSICIONES = {
+    OTRO: {
+        PENDIENTE: [RESERVAR],
+        EN_COCINA: [RESERVAR],
+        ENTREGADO: [RESERVAR, CONSUMIR, CREDITO, VENTA],
+        CANCELADO: [CANCELAR],
+    },
+    PENDIENTE: {
+        EN_COCINA: [],
+        LISTO: [],
+        ENTREGADO: [CONSUMIR, CREDITO, VENTA],
+        CANCELADO: [LIBERAR, CANCELAR],
+    },
+    EN_COCINA: {
+        PENDIENTE: [],
+        LISTO: [],
+        ENTREGADO: [CONSUMIR, CREDITO, VENTA],
+        CANCELADO: [LIBERAR, CANCELAR],
+    },
+    LISTO: {
+        EN_COCINA: [],
+        ENTREGADO: [CONSUMIR, CREDITO, VENTA],
+        CANCELADO: [LIBERAR, CANCELAR],
+    },
+    # Anulación de una entrega: lo servido no vuelve al inventario y los
+    # reintegros de crédito van por finanzas; solo se descuenta la venta.
+    ENTREGADO: {
+        CANCELADO: [ANULAR_VENTA, CANCELAR],
+    },
+    CANCELADO: {},
+}
+
+# Orden en que se aplican los efectos de stock sobre el lote
+EFECTOS_STOCK = [(RESERVAR, stock.reservar), (CONSUMIR, stock.consumir),
+                 (LIBERAR, stock.liberar)]
+
+Transicion = namedtuple("Transicion", "origen destino destino_id efectos")
+
+
+class TransicionInvalida(ValidationError):
+    """Lleva `errores = {pedido_id: mensaje}` de los pedidos rechazados."""
+
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__([f"Pedido #{pk}: {msg}" for pk, msg in errores.items()])
+
+
+# ---------- Tabla precalculada ----------
+_tabla = None
+_ids = None
+_lock = threading.Lock()
+
+
+def _construir(ids):
+    por_nombre = dict(zip(NOMBRES, ids))
+    tabla = {}
+    for origen, destinos in TRANSICIONES.items():
+        origen_id = por_nombre[origen] if origen is not OTRO else OTRO
+        for destino, efectos in destinos.items():
+            tabla[(origen_id, por_nombre[destino])] = Transicion(
+                origen, destino, por_nombre[destino], frozenset(efectos))
+    return tabla
+
+
+def tabla():
+    """{(origen_id, destino_id): Transicion}; OTRO como origen comodín."""
+    global _tabla, _ids
+    ids = tuple(catalogos.estados_pedido.ids(NOMBRES))
+    if len(ids) < len(NOMBRES):
+        # Primer arranque: se crean los estados que falten
+        ids = tuple(catalogos.estados_pedido.id(n) for n in NOMBRES)
+    if ids != _ids:
+        with _lock:
+            _tabla, _ids = _construir(ids), ids
+    return _tabla
+
+
+def buscar(origen_id, destino_id):
+    """Transicion permitida o None."""
+    t = tabla()
+    if origen_id in _ids:
+        return t.get((origen_id, destino_id))
+    return t.get((OTRO, destino_id))
+
+
+def permitida(origen_id, destino_id):
+    return origen_id == destino_id or buscar(origen_id, destino_id) is not None
+
+
+def es_final(estado_id):
+    return catalogos.estados_pedido.nombre(estado_id) in FINALES
+
+
+# ---------- API ----------
+def transicionar(pedidos, destino):
+    """
+    Lleva uno o varios pedidos (instancia, lista o queryset) al estado
+    `destino` (nombre). Todo o nada: si alguno no puede pasar se lanza
+    TransicionInvalida sin tocar ninguno. Los que ya están en `destino`
+    se ignoran. Devuelve los pedidos movidos, con el estado actualizado.
+    """
+    movidos, _ = _transicionar(pedidos, destino, parcial=False)
+    return movidos
+
+
+def transicionar_parcial(pedidos, destino):
+    """
+    Igual que transicionar() pero cada pedido que falle (transición no
+    permitida, stock, crédito) se reporta sin revertir a los demás.
+    Devuelve (movidos, errores) con errores = {pedido_id: mensaje}.
+    """
+    return _transicionar(pedidos, destino, parcial=True)
+
+
+@transaction.atomic
+def _transicionar(pedidos, destino, parcial):
+    if isinstance(pedidos, Pedido):
+        pedidos = [pedidos]
+    if isinstance(pedidos, QuerySet):
+        dados, filtro = {}, pedidos.values("pk")
+    else:
+        dados = {p.pk: p for p in pedidos}
+        filtro = list(dados)
+
+    tabla()
+    destino_id = catalogos.estados_pedido.id(destino)
+    # Se relee el estado con bloqueo: la instancia recibida puede estar vieja
+    actuales = list(Pedido.objects.select_for_update()
+                    .filter(pk__in=filtro).order_by("pk"))
+
+    candidatos, errores = [], {}
+    for pedido in actuales:
+        if pedido.estado_id == destino_id:
+            continue
+        t = buscar(pedido.estado_id, destino_id)
+        if t is None:
+            errores[pedido.pk] = (f"No se puede pasar de "
+                                  f"{pedido.nombre_estado} a {destino}.")
+        else:
+            candidatos.append((pedido, t))
+    if errores and not parcial:
+        raise TransicionInvalida(errores)
+    if not candidatos:
+        return [], errores
+
+    lineas = _lineas(candidatos)
+    if parcial:
+        movidos = _aplicar_parcial(candidatos, lineas, errores)
+    else:
+        _aplicar_stock(candidatos, lineas)
+        _aplicar_credito(candidatos, errores)
+        if errores:
+            raise TransicionInvalida(errores)
+        movidos = candidatos
+    if not movidos:
+        return [], errores
+
+    _guardar_estado(movidos, destino_id)
+    _registrar_ventas(movidos)
+    _actualizar_cocina(movidos, destino)
+    for pedido, t in movidos:
+        _notificar(pedido, t)
+        original = dados.get(pedido.pk)
+        if original is not None and original is not pedido:
+            for campo in ("estado_id", "cancelado", "fecha_cancelacion",
+                          "fecha_estado", "version"):
+                setattr(original, campo, getattr(pedido, campo))
+            original.marcar_estado_guardado()
+    return [pedido for pedido, _ in movidos], errores
+
+
+# ---------- Efectos ----------
+def _lineas(movidos):
+    """{pedido_id: [(variante_id, cantidad), ...]} en una consulta."""
+    por_pedido = defaultdict(list)
+    ids = [p.pk for p, t in movidos
+           if t.efectos & {RESERVAR, CONSUMIR, LIBERAR}]
+    if ids:
+        for pedido_id, variante_id, cantidad in DetallePedido.objects.filter(
+                pedido_id__in=ids, variante__isnull=False).values_list(
+                "pedido_id", "variante_id", "cantidad"):
+            por_pedido[pedido_id].append((variante_id, cantidad))
+    return por_pedido
+
+
+def _aplicar_stock(movidos, lineas):
+    """Suma las líneas de todos los pedidos: una operación por efecto."""
+    for efecto, operacion in EFECTOS_STOCK:
+        agregadas = [(vid, cantidad, p.pk) for p, t in movidos
+                     if efecto in t.efectos for vid, cantidad in lineas[p.pk]]
+        if agregadas:
+            operacion(agregadas)
+
+
+def _aplicar_credito(movidos, errores):
+    for pedido, t in movidos:
+        if not _usa_credito(pedido, t):
+            continue
+        credito = pedido.credito_activo()
+        if not credito:
+            errores[pedido.pk] = "El cliente no tiene un crédito activo aprobado."
+            continue
+        try:
+            credito.consumir(pedido.total, detalle=f"Pedido #{pedido.id}",
+                             pedido=pedido)
+        except ValueError as e:
+            errores[pedido.pk] = str(e)
+
+
+def _usa_credito(pedido, t):
+    return CREDITO in t.efectos and pedido.es_credito and pedido.cliente_id
+
+
+def _aplicar_parcial(candidatos, lineas, errores):
+    """
+    El lote sin crédito se aplica agregado en un savepoint. Si falta stock,
+    los pedidos que no tocan las variantes faltantes se reintentan juntos y
+    el resto (más los de crédito, que no tienen operación inversa) se
+    aplica de a uno en su propio savepoint.
+    """
+    individuales = [(p, t) for p, t in candidatos if _usa_credito(p, t)]
+    lote = [(p, t) for p, t in candidatos if not _usa_credito(p, t)]
+
+    aplicados = []
+    while lote:
+        try:
+            with transaction.atomic():
+                _aplicar_stock(lote, lineas)
+            aplicados += lote
+            break
+        except StockInsuficiente as e:
+            sospechosos = [(p, t) for p, t in lote
+                           if any(vid in e.faltantes for vid, _ in lineas[p.pk])]
+            if not sospechosos:  # cambió el stock entre intentos
+                sospechosos = lote
+            individuales += sospechosos
+            lote = [m for m in lote if m not in sospechosos]
+
+    for pedido, t in sorted(individuales, key=lambda m: m[0].pk):
+        fallo = {}
+        try:
+            with transaction.atomic():
+                _aplicar_stock([(pedido, t)], lineas)
+                _aplicar_credito([(pedido, t)], fallo)
+                if fallo:
+                    raise TransicionInvalida(fallo)
+        except TransicionInvalida:
+            errores.update(fallo)
+        except StockInsuficiente as e:
+            errores[pedido.pk] = e.message
+        else:
+            aplicados.append((pedido, t))
+    return sorted(aplicados, key=lambda m: m[0].pk)
+
+
+def _registrar_ventas(movidos):
+    ventas.registrar(p for p, t in movidos if VENTA in t.efectos)
+    ventas.anular(p for p, t in movidos if ANULAR_VENTA in t.efectos)
+
+
+def _actualizar_cocina(movidos, destino):
+    ids = [p.pk for p, _ in movidos]
+    if destino == CANCELADO:
+        cocina.retirar(pedido_ids=ids)
+    elif destino in (LISTO, ENTREGADO):
+        cocina.cerrar(ids)
+    else:
+        cocina.planificar(pedido_ids=ids)
+
+
+def _guardar_estado(movidos, destino_id):
+    # update() no toca auto_now: el feed de sincronización lo necesita
+    ahora = timezone.now()
+    campos = {"estado_id": destino_id, "actualizado": ahora, "fecha_estado": ahora}
+    if any(CANCELAR in t.efectos for _, t in movidos):
+        campos.update(cancelado=True, fecha_cancelacion=ahora)
+    Pedido.objects.filter(pk__in=[p.pk for p, _ in movidos]).update(
+        version=siguiente_version(), **campos)
+    for pedido, _ in movidos:
+        for campo, valor in campos.items():
+            setattr(pedido, campo, valor)
+        pedido.version += 1  # releídos con select_for_update
+
+
+def _notificar(pedido, t):
+    # update() no dispara post_save: se avisa a cocina y clientes aquí
+    tipo = eventos.PEDIDO_CANCELADO if CANCELAR in t.efectos else eventos.ESTADO_CAMBIADO
+    eventos.publicar(tipo, pedido.id, estado=t.destino)
+    seguimiento.guardar_al_confirmar(pedido.id, pedido.cliente_id, t.destino)
+    pedido.marcar_estado_guardado()
@@ -0,0 +1,164 @@
+"""
+Bus de eventos de pedidos para las pantallas de cocina.
+
+Las rutas de escritura (señales de Pedido/DetallePedido, servicios en
+bloque, acciones del admin) llaman a `publicar()`; el stream SSE se
+suscribe con `bus().suscribir(desde=seq)`. Cada evento lleva un `seq`
+creciente para que el cliente enlace el snapshot con los deltas.
+
+El backend se elige con settings.PEDIDOS_EVENTOS["BACKEND"]:
+- BusMemoria: un solo proceso (desarrollo / un worker).
+- BusRedis: canal pub/sub compartido entre workers.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Tipos de evento
+PEDIDO_CREADO = "pedido_creado"
+LINEA_AGREGADA = "linea_agregada"
+ESTADO_CAMBIADO = "estado_cambiado"
+PEDIDO_CANCELADO = "pedido_cancelado"
+TICKETS_PLANIFICADOS = "tickets_planificados"
+
+
+# ---------- Backend en memoria ----------
+class BusMemoria:
+    def __init__(self, historial=500, cola=1000):
+        self._seq = itertools.count(1)
+        self._ultimo = 0
+        self._historial = deque(maxlen=historial)
+        self._tam_cola = cola
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def ultimo_seq(self):
+        return self._ultimo
+
+    def publicar(self, evento):
+        # Se llama desde hilos síncronos; cada suscriptor vive en su loop
+        with self._lock:
+            evento = {"seq": next(self._seq), **evento}
+            self._ultimo = evento["seq"]
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores)
+        for loop, cola in suscriptores:
+            loop.call_soon_threadsafe(self._entregar, cola, evento)
+        return evento
+
+    @staticmethod
+    def _entregar(cola, evento):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se le pide volver a cargar el snapshot
+            cola.resync = True
+
+    async def suscribir(self, desde=None):
+        cola = asyncio.Queue(maxsize=self._tam_cola)
+        cola.resync = False
+        suscriptor = (asyncio.get_running_loop(), cola)
+        with self._lock:
+            pendientes = [e for e in self._historial
+                          if desde is not None and e["seq"] > desde]
+            if desde is not None and (
+                    desde > self._ultimo  # el proceso se reinició
+                    or (self._historial and self._historial[0]["seq"] > desde + 1)):
+                cola.resync = True  # el historial ya no cubre el hueco
+            self._suscriptores.add(suscriptor)
+        try:
+            for evento in pendientes:
+                yield evento
+            while True:
+                if cola.resync:
+                    cola.resync = False
+                    yield {"seq": self._ultimo, "tipo": "resync"}
+                evento = await cola.get()
+                if pendientes and evento["seq"] <= pendientes[-1]["seq"]:
+                    continue
+                yield evento
+        finally:
+            with self._lock:
+                self._suscriptores.discard(suscriptor)
+
+
+# ---------- Backend Redis ----------
+class BusRedis:
+    """Publica en un canal Redis; `seq` sale de un INCR compartido."""
+
+    def __init__(self, url="redis://localhost:6379/0", canal="pedidos:eventos",
+                 historial=500):
+        import redis
+        import redis.asyncio as aioredis
+
+        self._url = url
+        self._canal = canal
+        self._historial = historial
+        self._redis = redis.Redis.from_url(url)
+        self._aioredis = aioredis
+
+    def ultimo_seq(self):
+        return int(self._redis.get(f"{self._canal}:seq") or 0)
+
+    def publicar(self, evento):
+        evento = {"seq": self._redis.incr(f"{self._canal}:seq"), **evento}
+        datos = json.dumps(evento, cls=DjangoJSONEncoder)
+        pipe = self._redis.pipeline()
+        pipe.rpush(f"{self._canal}:historial", datos)
+        pipe.ltrim(f"{self._canal}:historial", -self._historial, -1)
+        pipe.publish(self._canal, datos)
+        pipe.execute()
+        return evento
+
+    async def suscribir(self, desde=None):
+        cliente = self._aioredis.from_url(self._url)
+        pubsub = cliente.pubsub()
+        await pubsub.subscribe(self._canal)
+        ultimo = desde or 0
+        try:
+            if desde is not None:
+                for crudo in await cliente.lrange(f"{self._canal}:historial", 0, -1):
+                    evento = json.loads(crudo)
+                    if evento["seq"] > ultimo:
+                        ultimo = evento["seq"]
+                        yield evento
+            async for mensaje in pubsub.listen():
+                if mensaje["type"] != "message":
+                    continue
+                evento = json.loads(mensaje["data"])
+                if evento["seq"] > ultimo:
+                    ultimo = evento["seq"]
+                    yield evento
+        finally:
+            await pubsub.unsubscribe(self._canal)
+            await cliente.aclose()
+
+
+# ---------- API ----------
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def bus():
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                config = getattr(settings, "PEDIDOS_EVENTOS", {})
+                clase = import_string(config.get(
+                    "BACKEND", "apps.pedidos.eventos.BusMemoria"))
+                _bus = clase(**config.get("OPTIONS", {}))
+    return _bus
+
+
+def publicar(tipo_evento, pedido_id, **datos):
+    """Publica al confirmar la transacción (nunca eventos revertidos)."""
+    evento = {"tipo": tipo_evento, "pedido": pedido_id, "datos": datos}
+    transaction.on_commit(lambda: bus().publicar(evento))
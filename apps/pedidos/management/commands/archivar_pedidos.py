@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.pedidos import archivo
+
+
+class Command(BaseCommand):
+    help = ("Mueve los pedidos entregados/cancelados más antiguos que --dias "
+            "a las tablas de archivo, por lotes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=archivo.DIAS)
+        parser.add_argument("--lote", type=int, default=archivo.LOTE)
+
+    def handle(self, *args, **opts):
+        if opts["dias"] < 1:
+            raise CommandError("--dias debe ser al menos 1.")
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser al menos 1.")
+
+        antes_de = timezone.now() - timedelta(days=opts["dias"])
+        total = archivo.archivar(antes_de, lote=opts["lote"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} pedidos archivados (anteriores a {antes_de:%Y-%m-%d %H:%M})."))
@@ -0,0 +1,150 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from apps.pedidos import bench
+from apps.pedidos.models import Pedido
+
+
+class Command(BaseCommand):
+    help = ("Siembra una base aparte (bench_*) y mide latencia p50/p95/p99, "
+            "consultas y memoria por paso del ciclo de vida de un pedido.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ciclos", type=int, default=200)
+        parser.add_argument("--calentamiento", type=int, default=5)
+        parser.add_argument("--ciclos-memoria", type=int, default=20,
+                            help="Ciclos extra con tracemalloc (no cuentan latencia)")
+        parser.add_argument("--variantes", type=int, default=300)
+        parser.add_argument("--pedidos", type=int, default=20000)
+        parser.add_argument("--clientes", type=int, default=500)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--salida", help="Archivo JSON con los resultados")
+        parser.add_argument("--comparar", help="JSON de una corrida anterior")
+        parser.add_argument("--tolerancia", type=float, default=0.25,
+                            help="Crecimiento de p95 aceptado al comparar (0.25 = 25%%)")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Reusar la base bench_* (y sus datos) entre corridas")
+
+    def handle(self, *args, **opts):
+        if opts["ciclos"] < 1:
+            raise CommandError("--ciclos debe ser al menos 1.")
+        base = None
+        if opts["comparar"]:
+            try:
+                base = json.loads(Path(opts["comparar"]).read_text())["pasos"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"No se pudo leer --comparar: {e}")
+
+        setup_test_environment()
+        nombre_real = connection.settings_dict["NAME"]
+        connection.settings_dict["TEST"]["NAME"] = self._nombre_bench(nombre_real)
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=opts["keepdb"])
+        try:
+            resultado = self._correr(opts)
+        finally:
+            connection.creation.destroy_test_db(
+                nombre_real, verbosity=0, keepdb=opts["keepdb"])
+            teardown_test_environment()
+
+        self._imprimir(resultado["pasos"])
+        if opts["salida"]:
+            Path(opts["salida"]).write_text(
+                json.dumps(resultado, indent=2, ensure_ascii=False))
+            self.stdout.write(f"Resultados en {opts['salida']}")
+        if base is not None:
+            self._comparar(resultado["pasos"], base, opts["tolerancia"])
+
+    @staticmethod
+    def _nombre_bench(nombre):
+        # Nunca la base real: bench_<nombre> (SQLite: archivo hermano)
+        if connection.vendor == "sqlite":
+            ruta = Path(nombre)
+            return str(ruta.with_name(f"bench_{ruta.name}"))
+        return f"bench_{nombre}"
+
+    def _correr(self, opts):
+        if opts["keepdb"] and Pedido.objects.exists():
+            self.stdout.write("Reusando los datos sembrados (--keepdb).")
+            datos = None
+        else:
+            inicio = time.perf_counter()
+            datos = bench.sembrar(
+                variantes=opts["variantes"], pedidos=opts["pedidos"],
+                clientes=opts["clientes"], semilla=opts["semilla"])
+            self.stdout.write(
+                f"Sembrado en {time.perf_counter() - inicio:.1f} s: {datos}")
+
+        escenario = bench.Escenario(semilla=opts["semilla"])
+        try:
+            for _ in range(opts["calentamiento"]):
+                escenario.ciclo(medir=False)
+            for _ in range(opts["ciclos"]):
+                escenario.ciclo()
+            if opts["ciclos_memoria"]:
+                tracemalloc.start()
+                try:
+                    for _ in range(opts["ciclos_memoria"]):
+                        escenario.ciclo(memoria=True)
+                finally:
+                    tracemalloc.stop()
+        except bench.ErrorEscenario as e:
+            raise CommandError(f"El escenario falló: {e}")
+
+        return {
+            "version": 1,
+            "commit": self._commit(),
+            "fecha": timezone.now().isoformat(),
+            "entorno": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "motor": connection.vendor,
+            },
+            "parametros": {k: opts[k] for k in (
+                "ciclos", "calentamiento", "ciclos_memoria", "variantes",
+                "pedidos", "clientes", "semilla")},
+            "datos": datos,
+            "pasos": {nombre: bench.resumen(paso)
+                      for nombre, paso in escenario.pasos.items()},
+        }
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _imprimir(self, pasos):
+        self.stdout.write(
+            f"{'paso':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'consultas':>11}{'mem KB':>9}")
+        for nombre, r in pasos.items():
+            memoria = "-" if r["memoria_kb"] is None else f"{r['memoria_kb']:.1f}"
+            self.stdout.write(
+                f"{nombre:<18}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+                f"{r['p99_ms']:>9.2f}{r['consultas']:>11}{memoria:>9}")
+
+    def _comparar(self, pasos, base, tolerancia):
+        regresiones = []
+        for nombre, campo, antes, ahora, regresion in bench.comparar(
+                pasos, base, tolerancia):
+            marca = self.style.ERROR("REGRESIÓN") if regresion else ""
+            self.stdout.write(f"{nombre:<18}{campo:<10}{antes:>10} → {ahora:<10} {marca}")
+            if regresion:
+                regresiones.append(f"{nombre}.{campo}")
+        if regresiones:
+            raise CommandError("Regresiones: " + ", ".join(regresiones))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones."))
@@ -0,0 +1,80 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.inventario.models import Producto, ProductoVariante
+from apps.pedidos.models import Pedido, DetallePedido, EstadoPedido, MetodoPago
+from apps.pedidos.serializers import PedidoSerializer, PedidoLecturaSerializer
+from apps.usuarios.models import Usuario
+
+
+def _con_prefetch(pedido, lineas):
+    # Igual que deja Prefetch("detalles"): un queryset ya evaluado
+    qs = DetallePedido.objects.none()
+    qs._result_cache = lineas
+    qs._prefetch_done = True
+    pedido._prefetched_objects_cache = {"detalles": qs}
+    return pedido
+
+
+def pedidos_en_memoria(cantidad, lineas):
+    """Grafo Pedido → detalles → variante → producto sin tocar la base."""
+    estado = EstadoPedido(id=1, nombre="Pendiente", descripcion="")
+    metodo = MetodoPago(id=1, nombre="Efectivo", descripcion="")
+    cliente = Usuario(id=1, username="cliente")
+    mesero = Usuario(id=2, username="mesero")
+    producto = Producto(id=1, nombre="Latte", imagen="productos/latte.jpg")
+    variantes = [
+        ProductoVariante(id=i, producto=producto, nombre_variante=f"V{i}",
+                         precio=Decimal("8000.00"))
+        for i in range(1, lineas + 1)
+    ]
+    ahora = timezone.now()
+    pedidos = []
+    for i in range(1, cantidad + 1):
+        pedido = Pedido(id=i, cliente=cliente, empleado=mesero, estado=estado,
+                        metodo_pago=metodo, mesa=i % 20, notas="",
+                        total=Decimal("8000.00") * lineas, tipo="interno")
+        pedido.fecha_pedido = ahora
+        detalles = [
+            DetallePedido(id=i * 100 + j, pedido_id=i, variante=v, cantidad=1,
+                          precio_unitario=v.precio, subtotal=v.precio)
+            for j, v in enumerate(variantes)
+        ]
+        pedidos.append(_con_prefetch(pedido, detalles))
+    return pedidos
+
+
+class Command(BaseCommand):
+    help = "Mide el costo por pedido de serializar listados (DRF vs lectura rápida)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=200)
+        parser.add_argument("--lineas", type=int, default=4)
+        parser.add_argument("--repeticiones", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        pedidos = pedidos_en_memoria(opts["pedidos"], opts["lineas"])
+        casos = [
+            ("PedidoSerializer", lambda: PedidoSerializer(pedidos, many=True).data),
+            ("PedidoLecturaSerializer",
+             lambda: PedidoLecturaSerializer(pedidos, many=True).data),
+        ]
+        resultados = {}
+        for nombre, serializar in casos:
+            serializar()  # calentamiento
+            mejor = min(self._medir(serializar) for _ in range(opts["repeticiones"]))
+            resultados[nombre] = mejor / len(pedidos) * 1e6
+            self.stdout.write(f"{nombre:<26} {resultados[nombre]:8.1f} µs/pedido")
+
+        antes, despues = resultados.values()
+        self.stdout.write(self.style.SUCCESS(
+            f"{opts['lineas']} líneas por pedido: {antes / despues:.1f}x más rápido"))
+
+    @staticmethod
+    def _medir(funcion):
+        inicio = time.perf_counter()
+        funcion()
+        return time.perf_counter() - inicio
@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.pedidos import ventas
+from apps.pedidos.models import Pedido, PedidoArchivado
+
+
+class Command(BaseCommand):
+    help = "Recalcula VentaDiaria para un rango de fechas, por tramos de días."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", type=date.fromisoformat,
+                            help="YYYY-MM-DD (por defecto, el primer pedido)")
+        parser.add_argument("--hasta", type=date.fromisoformat,
+                            help="YYYY-MM-DD (por defecto, hoy)")
+        parser.add_argument("--dias-por-tramo", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        hasta = opts["hasta"] or timezone.localdate()
+        desde = opts["desde"]
+        if desde is None:
+            primeros = [
+                modelo.objects.order_by("fecha_pedido").values_list(
+                    "fecha_pedido", flat=True).first()
+                for modelo in (Pedido, PedidoArchivado)]
+            primeros = [f for f in primeros if f is not None]
+            if not primeros:
+                self.stdout.write("No hay pedidos.")
+                return
+            desde = timezone.localdate(min(primeros))
+        if desde > hasta:
+            raise CommandError("--desde debe ser anterior a --hasta.")
+        if opts["dias_por_tramo"] < 1:
+            raise CommandError("--dias-por-tramo debe ser al menos 1.")
+
+        total = 0
+        # Cada tramo en su propia transacción: no bloquea todo el histórico
+        for inicio, fin in ventas.tramos(desde, hasta, opts["dias_por_tramo"]):
+            filas = ventas.reconstruir(inicio, fin)
+            total += filas
+            self.stdout.write(f"{inicio} → {fin}: {filas} filas")
+        self.stdout.write(self.style.SUCCESS(
+            f"VentaDiaria reconstruida ({total} filas)."))
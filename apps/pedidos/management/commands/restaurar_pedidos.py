@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.pedidos import archivo
+
+
+class Command(BaseCommand):
+    help = "Devuelve pedidos archivados a las tablas vivas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="+", type=int)
+
+    def handle(self, *args, **opts):
+        total = archivo.restaurar(opts["ids"])
+        self.stdout.write(self.style.SUCCESS(f"{total} pedidos restaurados."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0010_alter_detallepedido_pedido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha_pedido', '-id'], name='pedido_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', '-fecha_pedido', '-id'], name='pedido_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_alter_producto_imagen_and_more'),
+        ('pedidos', '0011_pedido_indices_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('interno', 'Interno'), ('externo', 'Externo')], max_length=20)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('metodo_pago', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pedidos.metodopago')),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ventas_diarias', to='inventario.productovariante')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['variante', 'fecha'], name='venta_diaria_variante_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'variante', 'metodo_pago', 'tipo'), name='venta_diaria_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0013_pedido_estado_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_productovariante_tiempo_preparacion_and_more'),
+        ('pedidos', '0014_pedido_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstacionCocina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('por_defecto', models.BooleanField(default=False)),
+                ('activo', models.BooleanField(default=True)),
+                ('cocineros', models.ManyToManyField(blank=True, limit_choices_to={'rol': 'COCINERO'}, related_name='estaciones_cocina', to=settings.AUTH_USER_MODEL)),
+                ('subcategorias', models.ManyToManyField(blank=True, related_name='estaciones', to='inventario.subcategoria')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TicketCocina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('preparando', 'Preparando'), ('listo', 'Listo')], default='pendiente', max_length=20)),
+                ('duracion', models.PositiveIntegerField(help_text='Segundos estimados')),
+                ('inicio_estimado', models.DateTimeField()),
+                ('fin_estimado', models.DateTimeField()),
+                ('inicio_real', models.DateTimeField(blank=True, null=True)),
+                ('fin_real', models.DateTimeField(blank=True, null=True)),
+                ('cocinero', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets_cocina', to=settings.AUTH_USER_MODEL)),
+                ('detalle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ticket', to='pedidos.detallepedido')),
+                ('estacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='pedidos.estacioncocina')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='pedidos.pedido')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estacion', 'estado', 'inicio_estimado'], name='ticket_estacion_cola_idx'), models.Index(fields=['cocinero', 'estado', 'fin_estimado'], name='ticket_cocinero_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_productovariante_tiempo_preparacion_and_more'),
+        ('pedidos', '0015_estacioncocina_ticketcocina'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_pedido', models.DateTimeField()),
+                ('tipo', models.CharField(choices=[('interno', 'Interno'), ('externo', 'Externo')], default='interno', max_length=20)),
+                ('mesa', models.PositiveIntegerField(blank=True, null=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('notas', models.TextField(blank=True, null=True)),
+                ('cancelado', models.BooleanField(default=False)),
+                ('fecha_cancelacion', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0, editable=False)),
+                ('fecha_archivo', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_archivados', to=settings.AUTH_USER_MODEL)),
+                ('empleado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_archivados_creados', to=settings.AUTH_USER_MODEL)),
+                ('estado', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='pedidos.estadopedido')),
+                ('metodo_pago', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='pedidos.metodopago')),
+            ],
+            options={
+                'verbose_name': 'Pedido archivado',
+                'verbose_name_plural': 'Pedidos archivados',
+            },
+        ),
+        migrations.CreateModel(
+            name='DetallePedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('variante', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventario.productovariante')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='pedidos.pedidoarchivado')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['cliente', '-fecha_pedido', '-id'], name='archivo_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['fecha_pedido'], name='archivo_fecha_idx'),
+        ),
+    ]
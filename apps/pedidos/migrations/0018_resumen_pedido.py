@@ -0,0 +1,97 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+LOTE = 1000
+LARGO_RESUMEN = 120
+
+
+def _resumir(lineas):
+    # Copia de models.resumir_items al momento de la migración
+    partes = []
+    for cantidad, producto, variante in lineas:
+        nombre = " ".join(n for n in (producto, variante) if n)
+        partes.append(f"{nombre} x{cantidad}" if cantidad > 1 else nombre)
+    texto = ", ".join(partes)
+    if len(texto) > LARGO_RESUMEN:
+        texto = texto[:LARGO_RESUMEN - 1].rstrip(", ") + "…"
+    return texto
+
+
+def _poblar(modelo, detalle):
+    ids = list(modelo.objects.order_by("pk").values_list("pk", flat=True))
+    for inicio in range(0, len(ids), LOTE):
+        pedidos = list(modelo.objects.filter(pk__in=ids[inicio:inicio + LOTE]))
+        lineas = {}
+        for pedido_id, cantidad, producto, variante in (
+                detalle.objects.filter(pedido_id__in=[p.pk for p in pedidos])
+                .order_by("pk").values_list(
+                    "pedido_id", "cantidad",
+                    "variante__producto__nombre", "variante__nombre_variante")):
+            lineas.setdefault(pedido_id, []).append((cantidad, producto, variante))
+        for pedido in pedidos:
+            propias = lineas.get(pedido.pk, [])
+            pedido.num_lineas = len(propias)
+            pedido.num_unidades = sum(c for c, _, _ in propias)
+            pedido.resumen_items = _resumir(propias)
+            pedido.fecha_estado = pedido.fecha_cancelacion or pedido.fecha_pedido
+        modelo.objects.bulk_update(
+            pedidos, ["num_lineas", "num_unidades", "resumen_items", "fecha_estado"])
+
+
+def poblar_resumen(apps, schema_editor):
+    _poblar(apps.get_model("pedidos", "Pedido"),
+            apps.get_model("pedidos", "DetallePedido"))
+    _poblar(apps.get_model("pedidos", "PedidoArchivado"),
+            apps.get_model("pedidos", "DetallePedidoArchivado"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0017_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha_estado',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='num_lineas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='num_unidades',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='resumen_items',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='fecha_estado',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='num_lineas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='num_unidades',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedidoarchivado',
+            name='resumen_items',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0018_resumen_pedido'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='detallepedidoarchivado',
+            name='uuid_cliente',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pedidoarchivado',
+            name='uuid_cliente',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,33 @@
 from django.db import models, transaction
+from django.db.models import Sum
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from apps.core import catalogos
+from apps.core.concurrencia import VersionadoMixin, reintentar
+from apps.inventario import stock
+
+# Estados en los que las líneas del pedido mantienen stock bloqueado.
+ESTADOS_RESERVAN = ["Pendiente", "En cocina", "Listo"]
+ESTADOS_FINALES = ["Entregado", "Cancelado"]
+
+# Columnas de resumen que se recalculan con las líneas (ver actualizar_total)
+CAMPOS_RESUMEN = ["num_lineas", "num_unidades", "resumen_items"]
+LARGO_RESUMEN = 120
+
+
+def resumir_items(lineas):
+    """
+    [(cantidad, producto, variante), ...] → "Latte Grande x2, Croissant",
+    recortado a LARGO_RESUMEN con "…".
+    """
+    partes = []
+    for cantidad, producto, variante in lineas:
+        nombre = " ".join(n for n in (producto, variante) if n)
+        partes.append(f"{nombre} x{cantidad}" if cantidad > 1 else nombre)
+    texto = ", ".join(partes)
+    if len(texto) > LARGO_RESUMEN:
+        texto = texto[:LARGO_RESUMEN - 1].rstrip(", ") + "…"
+    return texto
 
 
 # ---------- Estado ----------
@@ -25,7 +52,7 @@ class MetodoPago(models.Model):
 
 
 # ---------- Pedido ----------
-class Pedido(models.Model):
+class Pedido(VersionadoMixin, models.Model):
     TIPO_CHOICES = [("interno", "Interno"), ("externo", "Externo")]
 
     cliente = models.ForeignKey(
@@ -55,66 +82,136 @@ class Pedido(models.Model):
     notas = models.TextField(blank=True, null=True)
     cancelado = models.BooleanField(default=False)
     fecha_cancelacion = models.DateTimeField(null=True, blank=True)
+    # Concurrencia optimista (ver apps.core.concurrencia)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Sincronización de tablets (ver sincronizacion.py)
+    uuid_cliente = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False)
+    actualizado = models.DateTimeField(auto_now=True)
+    # Resumen para listados sin detalle (?vista=resumen)
+    num_lineas = models.PositiveIntegerField(default=0, editable=False)
+    num_unidades = models.PositiveIntegerField(default=0, editable=False)
+    resumen_items = models.CharField(
+        max_length=255, blank=True, default="", editable=False)
+    fecha_estado = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Feed de cambios por token (actualizado, id)
+            models.Index(fields=["actualizado", "id"],
+                         name="pedido_actualizado_idx"),
+            # Paginación por cursor (-fecha_pedido, -id)
+            models.Index(fields=["-fecha_pedido", "-id"],
+                         name="pedido_fecha_id_idx"),
+            models.Index(fields=["cliente", "-fecha_pedido", "-id"],
+                         name="pedido_cliente_fecha_idx"),
+            # Panel de cocina: estado IN (...) + rango del día
+            models.Index(fields=["estado", "fecha_pedido"],
+                         name="pedido_estado_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.fecha_pedido.strftime('%Y-%m-%d %H:%M')}"
 
-    def calcular_total(self):
-        return sum(detalle.subtotal for detalle in self.detalles.all())
+    # ---------- SEGUIMIENTO DE ESTADO (para señales) ----------
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._estado_guardado = instance.__dict__.get("estado_id")
+        instance._credito_guardado = instance._campos_credito()
+        return instance
 
-    # ---------- LÓGICA DE ESTADOS Y STOCK ----------
-    @transaction.atomic
-    def confirmar(self):
-        if self.cancelado:
-            raise ValidationError("Pedido ya cancelado.")
+    # ---------- CATÁLOGOS (sin consultas, ver apps.core.catalogos) ----------
+    @property
+    def nombre_estado(self):
+        return catalogos.estados_pedido.nombre(self.estado_id)
 
-        for detalle in self.detalles.all():
-            detalle.variante.bloquear(detalle.cantidad)
+    @property
+    def es_credito(self):
+        nombre = catalogos.metodos_pago.nombre(self.metodo_pago_id) or ""
+        return nombre.lower() == "credito"
 
-        self.estado, _ = EstadoPedido.objects.get_or_create(nombre="Pendiente")
-        self.save(update_fields=['estado'])
+    def credito_activo(self):
+        from apps.finanzas.models import Credito
+        return Credito.objects.filter(
+            cliente_id=self.cliente_id,
+            estado_id__in=catalogos.estados_credito.ids(["Activo"]),
+        ).first()
 
-    @transaction.atomic
-    def entregar(self):
-        if self.cancelado:
-            raise ValidationError("Pedido ya cancelado.")
+    def estado_cambiado(self):
+        return getattr(self, "_estado_guardado", None) != self.estado_id
 
-        for detalle in self.detalles.all():
-            detalle.variante.desbloquear(detalle.cantidad)
-            detalle.variante.descontar(detalle.cantidad)
+    def marcar_estado_guardado(self):
+        self._estado_guardado = self.estado_id
 
-        if self.metodo_pago.nombre.lower() == "credito" and self.cliente:
-            credito = self.cliente.creditos.filter(
-                estado__nombre="Activo").first()
-            if not credito:
-                raise ValidationError(
-                    "El cliente no tiene un crédito activo aprobado.")
-            credito.consumir(
-                self.total, detalle=f"Pedido #{self.id}", pedido=self)
+    def _campos_credito(self):
+        d = self.__dict__
+        return (d.get("total"), d.get("cliente_id"), d.get("metodo_pago_id"))
 
-        self.estado, _ = EstadoPedido.objects.get_or_create(nombre="Entregado")
-        self.save(update_fields=['estado'])
+    def credito_cambiado(self):
+        """¿Cambió algo que afecte la validación de crédito desde la BD?"""
+        return getattr(self, "_credito_guardado", None) != self._campos_credito()
 
-    @transaction.atomic
-    def cancelar(self):
-        if self.cancelado:
-            raise ValidationError("Pedido ya cancelado.")
+    def marcar_credito_guardado(self):
+        self._credito_guardado = self._campos_credito()
 
-        for detalle in self.detalles.all():
-            detalle.variante.desbloquear(detalle.cantidad)
+    def calcular_total(self):
+        """Suma de subtotales por agregado en BD."""
+        return self.detalles.aggregate(total=Sum("subtotal"))["total"] or 0
+
+    def recalcular_total(self):
+        """Como calcular_total, y lo asigna (no guarda el pedido)."""
+        self.total = self.calcular_total()
+        return self.total
+
+    def recalcular_resumen(self):
+        """Total y columnas de resumen con una sola consulta (no guarda)."""
+        lineas = list(self.detalles.order_by("pk").values_list(
+            "cantidad", "subtotal",
+            "variante__producto__nombre", "variante__nombre_variante"))
+        self.total = sum((subtotal for _, subtotal, _, _ in lineas), 0)
+        self.num_lineas = len(lineas)
+        self.num_unidades = sum(cantidad for cantidad, _, _, _ in lineas)
+        self.resumen_items = resumir_items(
+            (cantidad, producto, variante)
+            for cantidad, _, producto, variante in lineas)
+
+    def actualizar_total(self):
+        """
+        Recalcula y guarda el total y el resumen de líneas. Si otro proceso
+        guardó el pedido entre medio, relee la versión y vuelve a calcular.
+        """
+        def guardar():
+            self.recalcular_resumen()
+            self.save(update_fields=["total", *CAMPOS_RESUMEN])
+        reintentar(guardar, recargar=lambda: self.refresh_from_db(fields=["version"]))
+
+    # ---------- LÓGICA DE ESTADOS (ver estados.py) ----------
+    def transicionar(self, destino):
+        from . import estados
+        estados.transicionar(self, destino)
+
+    def confirmar(self):
+        self.transicionar("Pendiente")
 
-        self.cancelado = True
-        self.fecha_cancelacion = timezone.now()
-        self.estado, _ = EstadoPedido.objects.get_or_create(nombre="Cancelado")
-        self.save(update_fields=['cancelado', 'fecha_cancelacion', 'estado'])
+    def entregar(self):
+        self.transicionar("Entregado")
+
+    def cancelar(self):
+        self.transicionar("Cancelado")
 
     @transaction.atomic
     def save(self, *args, **kwargs):
+        extra = {"actualizado"}  # auto_now solo se escribe si está en update_fields
+        if self.estado_cambiado():
+            self.fecha_estado = timezone.now()
+            extra.add("fecha_estado")
+        if kwargs.get("update_fields"):
+            kwargs["update_fields"] = {*kwargs["update_fields"], *extra}
+        # El total lo mantienen las líneas (DetallePedido.save/delete →
+        # actualizar_total), no cada guardado del pedido
         super().save(*args, **kwargs)
-        total_calculado = self.calcular_total()
-        if self.total != total_calculado:
-            self.total = total_calculado
-            super().save(update_fields=['total'])
+        self.marcar_credito_guardado()
 
 
 # ---------- Detalle ----------
@@ -134,6 +231,11 @@ class DetallePedido(models.Model):
     precio_unitario = models.DecimalField(
         max_digits=10, decimal_places=2, default=0)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Costo de la variante al registrar la venta (ver ventas.py)
+    costo_unitario = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    uuid_cliente = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False)
 
     def __str__(self):
         return f"{self.cantidad} x {self.variante} (Pedido #{self.pedido.id})"
@@ -158,18 +260,180 @@ class DetallePedido(models.Model):
 
         self.subtotal = self.calcular_subtotal()
 
-        if self.pedido.estado.nombre == "Entregado":
-            self.variante.desbloquear(self.cantidad)
-            self.variante.descontar(self.cantidad)
-
-        estados_bloquean = ["Pendiente", "En cocina", "Listo"]
-        if self.pedido.estado.nombre in estados_bloquean:
-            self.variante.bloquear(self.cantidad)
+        estado = self.pedido.nombre_estado
+        linea = [(self.variante_id, self.cantidad, self.pedido_id)]
+        if estado == "Entregado" and self._state.adding:
+            stock.consumir(linea)
+        elif estado in ESTADOS_RESERVAN:
+            if not self._state.adding:
+                # Se reemplaza la reserva anterior de esta línea
+                stock.liberar(DetallePedido.objects.filter(
+                    pk=self.pk).values_list("variante_id", "cantidad", "pedido_id"))
+            stock.reservar(linea)
 
         super().save(*args, **kwargs)
-        self.pedido.save()
+        self.pedido.actualizar_total()
 
     @transaction.atomic
     def delete(self, *args, **kwargs):
+        if self.pedido.nombre_estado in ESTADOS_RESERVAN:
+            stock.liberar([(self.variante_id, self.cantidad, self.pedido_id)])
         super().delete(*args, **kwargs)
-        self.pedido.save()
+        self.pedido.actualizar_total()
+
+
+# ---------- Ventas diarias (rollup, ver ventas.py) ----------
+class VentaDiaria(models.Model):
+    """
+    Acumulado de pedidos entregados por día × variante × método de pago ×
+    tipo. Se mantiene al entregar/anular (estados.py) y se puede
+    reconstruir con `manage.py reconstruir_ventas`.
+    """
+    fecha = models.DateField()
+    variante = models.ForeignKey(
+        "inventario.ProductoVariante",
+        on_delete=models.PROTECT,
+        related_name="ventas_diarias",
+    )
+    metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.PROTECT)
+    tipo = models.CharField(max_length=20, choices=Pedido.TIPO_CHOICES)
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "variante", "metodo_pago", "tipo"],
+                name="venta_diaria_unica"),
+        ]
+        indexes = [
+            models.Index(fields=["variante", "fecha"],
+                         name="venta_diaria_variante_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.variante_id} x {self.unidades}"
+
+
+# ---------- Cocina (planificador, ver cocina.py) ----------
+class EstacionCocina(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    subcategorias = models.ManyToManyField(
+        "inventario.SubCategoria", blank=True, related_name="estaciones")
+    cocineros = models.ManyToManyField(
+        "usuarios.Usuario", blank=True, related_name="estaciones_cocina",
+        limit_choices_to={'rol': 'COCINERO'})
+    # Recibe las líneas cuya subcategoría no tiene estación
+    por_defecto = models.BooleanField(default=False)
+    activo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.nombre
+
+
+class TicketCocina(models.Model):
+    PENDIENTE = "pendiente"
+    PREPARANDO = "preparando"
+    LISTO = "listo"
+    ESTADO_CHOICES = [(PENDIENTE, "Pendiente"), (PREPARANDO, "Preparando"),
+                      (LISTO, "Listo")]
+    ABIERTOS = [PENDIENTE, PREPARANDO]
+
+    detalle = models.OneToOneField(
+        DetallePedido, on_delete=models.CASCADE, related_name="ticket")
+    pedido = models.ForeignKey(
+        Pedido, on_delete=models.CASCADE, related_name="tickets")
+    estacion = models.ForeignKey(
+        EstacionCocina, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="tickets")
+    cocinero = models.ForeignKey(
+        "usuarios.Usuario", on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="tickets_cocina")
+    estado = models.CharField(
+        max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+    duracion = models.PositiveIntegerField(help_text="Segundos estimados")
+    inicio_estimado = models.DateTimeField()
+    fin_estimado = models.DateTimeField()
+    inicio_real = models.DateTimeField(null=True, blank=True)
+    fin_real = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Cola por estación y "libre_en" por cocinero
+            models.Index(fields=["estacion", "estado", "inicio_estimado"],
+                         name="ticket_estacion_cola_idx"),
+            models.Index(fields=["cocinero", "estado", "fin_estimado"],
+                         name="ticket_cocinero_cola_idx"),
+        ]
+
+    def __str__(self):
+        return f"Ticket #{self.id} - Pedido #{self.pedido_id} ({self.estado})"
+
+
+# ---------- Archivo (pedidos cerrados antiguos, ver archivo.py) ----------
+class PedidoArchivado(models.Model):
+    """Copia de un Pedido cerrado; conserva el id original."""
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(
+        "usuarios.Usuario", on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="pedidos_archivados")
+    empleado = models.ForeignKey(
+        "usuarios.Usuario", on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="pedidos_archivados_creados")
+    fecha_pedido = models.DateTimeField()
+    estado = models.ForeignKey(
+        EstadoPedido, on_delete=models.PROTECT, related_name="+")
+    tipo = models.CharField(
+        max_length=20, choices=Pedido.TIPO_CHOICES, default="interno")
+    mesa = models.PositiveIntegerField(null=True, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    metodo_pago = models.ForeignKey(
+        MetodoPago, on_delete=models.PROTECT, related_name="+")
+    notas = models.TextField(blank=True, null=True)
+    cancelado = models.BooleanField(default=False)
+    fecha_cancelacion = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    uuid_cliente = models.UUIDField(null=True, blank=True, editable=False, db_index=True)
+    num_lineas = models.PositiveIntegerField(default=0, editable=False)
+    num_unidades = models.PositiveIntegerField(default=0, editable=False)
+    resumen_items = models.CharField(
+        max_length=255, blank=True, default="", editable=False)
+    fecha_estado = models.DateTimeField(null=True, blank=True, editable=False)
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Pedido archivado"
+        verbose_name_plural = "Pedidos archivados"
+        indexes = [
+            models.Index(fields=["cliente", "-fecha_pedido", "-id"],
+                         name="archivo_cliente_fecha_idx"),
+            models.Index(fields=["fecha_pedido"],
+                         name="archivo_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.id} (archivado) - {self.fecha_pedido.strftime('%Y-%m-%d %H:%M')}"
+
+    @property
+    def nombre_estado(self):
+        return catalogos.estados_pedido.nombre(self.estado_id)
+
+
+class DetallePedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    pedido = models.ForeignKey(
+        PedidoArchivado, on_delete=models.CASCADE, related_name="detalles")
+    variante = models.ForeignKey(
+        "inventario.ProductoVariante", on_delete=models.PROTECT,
+        null=True, blank=True, related_name="+")
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    costo_unitario = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    uuid_cliente = models.UUIDField(null=True, blank=True, editable=False, db_index=True)
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.variante} (Pedido #{self.pedido_id}, archivado)"
@@ -0,0 +1,102 @@
+"""
+Más vendidos por ventana móvil (7/30/90 días), para ProductoViewSet.mas_vendidos.
+
+El índice del día vive en la caché de Django: por ventana, {producto_id:
+[unidades, ingresos]}. Se arma con una consulta sobre VentaDiaria y
+después se mantiene incremental: ventas.registrar() le suma (o resta, al
+anular) las líneas entregadas al confirmar la transacción. Al cambiar el
+día se rearma, y también cada REFRESCO para corregir lo que se haya
+perdido entre procesos (get/set no es atómico).
+
+Los datos de cada producto salen del documento del menú (inventario.menu),
+que ya filtra lo que no tiene stock: con caché caliente la vista no hace
+consultas.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import VentaDiaria
+
+VENTANAS = (7, 30, 90)
+VENTANA = 30
+REFRESCO = 15 * 60
+ORDENES = {"unidades": 0, "ingresos": 1}
+
+CERO = Decimal("0")
+
+
+def _clave(hoy):
+    return f"populares:{hoy.isoformat()}"
+
+
+def _ventanas(hoy, fecha):
+    """Ventanas que incluyen `fecha` (la de hoy cuenta como día 1)."""
+    dias = (hoy - fecha).days
+    return [v for v in VENTANAS if 0 <= dias < v]
+
+
+# ---------- Armado ----------
+def armar(hoy):
+    indice = {v: defaultdict(lambda: [0, CERO]) for v in VENTANAS}
+    for fecha, producto_id, unidades, ingresos in (
+            VentaDiaria.objects.filter(
+                fecha__gt=hoy - timedelta(days=max(VENTANAS)), fecha__lte=hoy)
+            .values_list("fecha", "variante__producto_id")
+            .annotate(Sum("unidades"), Sum("ingresos")).order_by()):
+        for v in _ventanas(hoy, fecha):
+            total = indice[v][producto_id]
+            total[0] += unidades
+            total[1] += ingresos
+    return {v: dict(totales) for v, totales in indice.items()}
+
+
+def indice(hoy=None):
+    hoy = hoy or timezone.localdate()
+    actual = cache.get(_clave(hoy))
+    if actual is None:
+        actual = armar(hoy)
+        cache.set(_clave(hoy), actual, REFRESCO)
+    return actual
+
+
+def invalidar():
+    cache.delete(_clave(timezone.localdate()))
+
+
+# ---------- Incremental ----------
+def acumular(deltas):
+    """
+    deltas = {(fecha, producto_id): [unidades, ingresos]}; se aplican al
+    índice del día cuando confirma la transacción en curso.
+    """
+    if deltas:
+        transaction.on_commit(lambda: _sumar(deltas))
+
+
+def _sumar(deltas):
+    hoy = timezone.localdate()
+    actual = cache.get(_clave(hoy))
+    if actual is None:
+        return  # se arma completo en la próxima lectura
+    for (fecha, producto_id), (unidades, ingresos) in deltas.items():
+        for v in _ventanas(hoy, fecha):
+            total = actual[v].setdefault(producto_id, [0, CERO])
+            total[0] += unidades
+            total[1] += ingresos
+    cache.set(_clave(hoy), actual, REFRESCO)
+
+
+# ---------- Consulta ----------
+def ranking(ventana=VENTANA, orden="unidades"):
+    """[(producto_id, unidades, ingresos), ...] de mayor a menor."""
+    i = ORDENES[orden]
+    totales = indice()[ventana]
+    return sorted(
+        ((pid, u, ing) for pid, (u, ing) in totales.items() if u > 0),
+        key=lambda fila: (-fila[1 + i], fila[0]))
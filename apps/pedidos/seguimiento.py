@@ -0,0 +1,111 @@
+"""
+Versión del estado de cada pedido, guardada en la caché de Django para
+que PedidoEstadoView responda (200/304/long-poll) sin leer la tabla Pedido.
+
+Se actualiza al confirmar la transacción en cada cambio de estado. Con
+varios procesos la caché debe ser compartida (Redis/Memcached). La espera
+del long-poll es asíncrona (solo con ASGI, ver views.pedido_estado): se
+despierta al instante en el mismo proceso y, entre procesos, consultando
+la caché cada INTERVALO_SONDEO segundos.
+"""
+import asyncio
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+
+TTL = 60 * 60 * 24
+INTERVALO_SONDEO = 1.0
+
+# (loop, asyncio.Event) de cada petición en espera
+_esperando = set()
+_lock = threading.Lock()
+
+
+def _clave(pedido_id):
+    return f"pedidos:estado:{pedido_id}"
+
+
+def etag(entrada):
+    return f'"{entrada["pedido"]}-{entrada["version"]}"'
+
+
+def coincide(entrada, if_none_match):
+    """¿El If-None-Match del cliente incluye la versión actual? (comparación débil)"""
+    etags = parse_etags(if_none_match or "")
+    actual = etag(entrada)
+    return "*" in etags or any(e.removeprefix("W/") == actual for e in etags)
+
+
+def obtener(pedido_id):
+    return cache.get(_clave(pedido_id))
+
+
+async def aobtener(pedido_id):
+    return await cache.aget(_clave(pedido_id))
+
+
+def guardar(pedido_id, cliente_id, estado):
+    """Registra el estado con una versión nueva y despierta a los que esperan."""
+    entrada = {
+        "pedido": pedido_id,
+        "cliente": cliente_id,
+        "estado": estado,
+        "version": time.time_ns(),
+    }
+    cache.set(_clave(pedido_id), entrada, TTL)
+    _despertar()
+    return entrada
+
+
+def _despertar():
+    with _lock:
+        esperando = list(_esperando)
+    for loop, evento in esperando:
+        try:
+            loop.call_soon_threadsafe(evento.set)
+        except RuntimeError:  # loop ya cerrado
+            pass
+
+
+def sembrar(pedido_id, cliente_id, estado):
+    """Carga inicial tras un fallo de caché; no pisa una versión más nueva."""
+    cache.add(_clave(pedido_id), {
+        "pedido": pedido_id,
+        "cliente": cliente_id,
+        "estado": estado,
+        "version": time.time_ns(),
+    }, TTL)
+    return obtener(pedido_id)
+
+
+def guardar_al_confirmar(pedido_id, cliente_id, estado):
+    transaction.on_commit(lambda: guardar(pedido_id, cliente_id, estado))
+
+
+async def esperar_cambio(pedido_id, version, timeout):
+    """Espera, sin ocupar un hilo, a que cambie la versión o pase `timeout`."""
+    loop = asyncio.get_running_loop()
+    evento = asyncio.Event()
+    propio = (loop, evento)
+    with _lock:
+        _esperando.add(propio)
+    try:
+        limite = loop.time() + timeout
+        while True:
+            evento.clear()
+            entrada = await aobtener(pedido_id)
+            if entrada is None or entrada["version"] != version:
+                return entrada
+            restante = limite - loop.time()
+            if restante <= 0:
+                return entrada
+            try:
+                await asyncio.wait_for(evento.wait(), min(restante, INTERVALO_SONDEO))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        with _lock:
+            _esperando.discard(propio)
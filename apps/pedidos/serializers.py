@@ -1,7 +1,12 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
-from .models import Pedido, DetallePedido, EstadoPedido, MetodoPago
+from apps.core.concurrencia import VersionSerializerMixin
+from .models import (
+    Pedido, DetallePedido, EstadoPedido, MetodoPago, EstacionCocina, TicketCocina)
 from apps.inventario.models import ProductoVariante
+from . import estados, sincronizacion
 
 
 # ===========================
@@ -83,10 +88,124 @@ class DetallePedidoSerializer(serializers.ModelSerializer):
         return value
 
 
+# ===========================
+#   DETALLES EN BLOQUE
+# ===========================
+class LineaBulkSerializer(serializers.Serializer):
+    # La variante se valida en el servicio con una sola consulta
+    variante_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1)
+
+
+class DetallePedidoBulkSerializer(serializers.Serializer):
+    detalles = LineaBulkSerializer(many=True, allow_empty=False)
+
+
+# ===========================
+#   TRANSICIONES EN LOTE
+# ===========================
+class TransicionLoteSerializer(serializers.Serializer):
+    pedidos = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=500)
+    estado = serializers.ChoiceField(choices=estados.NOMBRES)
+
+
+# ===========================
+#   SINCRONIZACIÓN DE TABLETS
+# ===========================
+class OperacionSyncSerializer(serializers.Serializer):
+    REQUERIDOS = {
+        sincronizacion.CREAR_PEDIDO: ["metodo_pago"],
+        sincronizacion.AGREGAR_LINEA: ["variante", "cantidad"],
+        sincronizacion.CAMBIAR_ESTADO: ["estado"],
+    }
+
+    accion = serializers.ChoiceField(choices=sincronizacion.ACCIONES)
+    uuid = serializers.UUIDField()
+    en = serializers.DateTimeField()
+    # Pedido de la operación: su uuid si se creó en la tablet, o su id
+    pedido_uuid = serializers.UUIDField(required=False)
+    pedido_id = serializers.IntegerField(required=False)
+    # crear_pedido
+    metodo_pago = serializers.IntegerField(required=False)
+    cliente = serializers.IntegerField(required=False, allow_null=True)
+    mesa = serializers.IntegerField(required=False, allow_null=True, min_value=0)
+    tipo = serializers.ChoiceField(choices=Pedido.TIPO_CHOICES, required=False)
+    notas = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    # agregar_linea
+    variante = serializers.IntegerField(required=False)
+    cantidad = serializers.IntegerField(required=False, min_value=1)
+    # cambiar_estado
+    estado = serializers.ChoiceField(choices=estados.NOMBRES, required=False)
+    version = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        faltan = [c for c in self.REQUERIDOS[data["accion"]] if data.get(c) is None]
+        if data["accion"] != sincronizacion.CREAR_PEDIDO and not (
+                data.get("pedido_uuid") or data.get("pedido_id")):
+            faltan.append("pedido_uuid")
+        if faltan:
+            raise serializers.ValidationError(
+                {campo: "Este campo es obligatorio." for campo in faltan})
+        return data
+
+
+class SincronizacionSerializer(serializers.Serializer):
+    token = serializers.CharField(required=False, allow_blank=True)
+    operaciones = OperacionSyncSerializer(
+        many=True, required=False, max_length=500)
+
+    def validate_token(self, value):
+        if not value:
+            return None
+        try:
+            return sincronizacion.leer_token(value)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
+    def validate_operaciones(self, value):
+        uuids = [op["uuid"] for op in value]
+        if len(set(uuids)) != len(uuids):
+            raise serializers.ValidationError("Hay uuid repetidos en el lote.")
+        return value
+
+
+# ===========================
+#   COCINA (ESTACIONES Y TICKETS)
+# ===========================
+class EstacionCocinaSerializer(serializers.ModelSerializer):
+    abiertos = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = EstacionCocina
+        fields = ["id", "nombre", "cocineros", "subcategorias",
+                  "por_defecto", "abiertos"]
+
+
+class TicketCocinaSerializer(serializers.ModelSerializer):
+    mesa = serializers.IntegerField(source="pedido.mesa", read_only=True)
+    producto = serializers.CharField(source="detalle.variante", read_only=True)
+    cantidad = serializers.IntegerField(source="detalle.cantidad", read_only=True)
+    cocinero_nombre = serializers.CharField(
+        source="cocinero.username", read_only=True, default=None)
+
+    class Meta:
+        model = TicketCocina
+        fields = ["id", "pedido", "mesa", "detalle", "producto", "cantidad",
+                  "estacion", "cocinero", "cocinero_nombre", "estado",
+                  "duracion", "inicio_estimado", "fin_estimado"]
+        read_only_fields = fields
+
+
+class TicketEstadoSerializer(serializers.Serializer):
+    estado = serializers.ChoiceField(
+        choices=[TicketCocina.PREPARANDO, TicketCocina.LISTO])
+
+
 # ===========================
 #   PEDIDO
 # ===========================
-class PedidoSerializer(serializers.ModelSerializer):
+class PedidoSerializer(VersionSerializerMixin, serializers.ModelSerializer):
     # Nombres de cliente y empleado
     cliente_nombre = serializers.CharField(
         source="cliente.username", read_only=True)
@@ -133,6 +252,11 @@ class PedidoSerializer(serializers.ModelSerializer):
             "total",
             "detalles",
             "tipo",
+            "version",
+            "num_lineas",
+            "num_unidades",
+            "resumen_items",
+            "fecha_estado",
         ]
         read_only_fields = ["fecha_pedido", "total"]
 
@@ -153,11 +277,17 @@ class PedidoSerializer(serializers.ModelSerializer):
 
         return data
 
-    # Evitar cambiar estado finalizado
-    def validate_estado(self, value):
-        if self.instance and self.instance.estado.nombre in ["Entregado", "Cancelado"]:
+    # Solo transiciones permitidas (ver estados.py). El campo escribible
+    # es estado_id, así que el validador lleva ese nombre.
+    def validate_estado_id(self, value):
+        if self.instance is None:
+            return value
+        if estados.es_final(self.instance.estado_id):
             raise serializers.ValidationError(
                 "No se puede cambiar el estado de un pedido finalizado.")
+        if not estados.permitida(self.instance.estado_id, value.pk):
+            raise serializers.ValidationError(
+                f"No se puede pasar de {self.instance.nombre_estado} a {value.nombre}.")
         return value
 
     # Crear pedido
@@ -170,3 +300,109 @@ class PedidoSerializer(serializers.ModelSerializer):
             validated_data.setdefault("empleado", request.user)
 
         return super().create(validated_data)
+
+
+# ===========================
+#   LECTURA RÁPIDA (LISTADOS)
+# ===========================
+CENTAVOS = Decimal("0.01")
+
+
+class PedidoLecturaSerializer:
+    """
+    Solo lectura: mismo JSON que PedidoSerializer(many=True) pero armado
+    con accesos directos a los atributos, sin la maquinaria de campos de DRF.
+    Las vistas de listas lo usan en GET (ver LecturaRapidaMixin). Espera el
+    queryset con select_related de estado/metodo_pago/cliente/empleado y
+    prefetch de detalles → variante → producto. Con context["resumen"] se
+    omiten los detalles (basta con las columnas de resumen del pedido).
+    """
+    _fecha = serializers.DateTimeField()
+
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        request = self.context.get("request")
+        self._absoluta = (request.build_absolute_uri if request is not None
+                          else None)
+        self._urls = {}
+        if self.many:
+            return [self._pedido(p) for p in self.instance]
+        return self._pedido(self.instance)
+
+    def _pedido(self, p):
+        datos = {"id": p.id, "cliente": p.cliente_id}
+        # Igual que DRF: sin relación, el campo "*_nombre" se omite
+        if p.cliente is not None:
+            datos["cliente_nombre"] = p.cliente.username
+        datos["empleado"] = p.empleado_id
+        if p.empleado is not None:
+            datos["empleado_nombre"] = p.empleado.username
+        datos["mesa"] = p.mesa
+        datos["notas"] = p.notas
+        datos["fecha_pedido"] = self._fecha.to_representation(p.fecha_pedido)
+        datos["estado"] = self._catalogo(p.estado)
+        datos["metodo_pago"] = self._catalogo(p.metodo_pago)
+        datos["total"] = self._decimal(p.total)
+        if not self.context.get("resumen"):
+            datos["detalles"] = [self._detalle(d) for d in p.detalles.all()]
+        datos["tipo"] = p.tipo
+        datos["version"] = p.version
+        datos["num_lineas"] = p.num_lineas
+        datos["num_unidades"] = p.num_unidades
+        datos["resumen_items"] = p.resumen_items
+        datos["fecha_estado"] = (self._fecha.to_representation(p.fecha_estado)
+                                 if p.fecha_estado else None)
+        return datos
+
+    def _detalle(self, d):
+        return {
+            "id": d.id,
+            "pedido": d.pedido_id,
+            "variante": self._variante(d.variante) if d.variante_id else None,
+            "cantidad": d.cantidad,
+            "precio_unitario": self._decimal(d.precio_unitario),
+            "subtotal": self._decimal(d.subtotal),
+        }
+
+    def _variante(self, v):
+        producto = v.producto
+        return {
+            "id": v.id,
+            "producto_nombre": producto.nombre,
+            "nombre_variante": v.nombre_variante,
+            "nombre_completo": f"{producto.nombre} - {v.nombre_variante}",
+            # PedidoSerializer omite imagen_variante (source="imagen"
+            # no existe en el modelo); se mantiene la misma forma.
+            "imagen_producto": self._imagen(producto.imagen),
+        }
+
+    @staticmethod
+    def _catalogo(obj):
+        return {"id": obj.id, "nombre": obj.nombre, "descripcion": obj.descripcion}
+
+    @staticmethod
+    def _decimal(valor):
+        if valor is None:
+            return ""
+        if not isinstance(valor, Decimal):
+            valor = Decimal(str(valor))
+        return f"{valor.quantize(CENTAVOS, rounding=ROUND_HALF_UP):f}"
+
+    def _imagen(self, archivo):
+        if not archivo:
+            return None
+        nombre = archivo.name
+        if nombre not in self._urls:
+            try:
+                url = archivo.url
+            except AttributeError:
+                url = None
+            if url is not None and self._absoluta is not None:
+                url = self._absoluta(url)
+            self._urls[nombre] = url
+        return self._urls[nombre]
@@ -0,0 +1,74 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from apps.inventario import stock
+from apps.inventario.models import ProductoVariante
+from .models import DetallePedido, ESTADOS_RESERVAN, ESTADOS_FINALES
+from . import cocina, eventos
+
+
+# ================================
+# LÍNEAS EN BLOQUE
+# ================================
+
+@transaction.atomic
+def agregar_detalles(pedido, lineas):
+    """
+    Agrega varias líneas a un pedido con un número acotado de consultas:
+    una carga de variantes, un bulk_create, una reserva de stock y un
+    recálculo del total por agregado.
+
+    `lineas` = [{"variante_id": 3, "cantidad": 2}, ...] (opcional
+    "uuid_cliente" para las que vienen de una tablet, ver sincronizacion.py)
+    Devuelve la lista de DetallePedido creados (con `variante` cargada).
+    """
+    if pedido.nombre_estado in ESTADOS_FINALES:
+        raise ValidationError(
+            "No se puede agregar productos a un pedido finalizado.")
+    if not lineas:
+        raise ValidationError("Debe enviar al menos una línea.")
+
+    ids = {linea["variante_id"] for linea in lineas}
+    variantes = ProductoVariante.objects.select_related(
+        "producto").in_bulk(ids)
+
+    invalidas = sorted(
+        vid for vid in ids
+        if vid not in variantes or not variantes[vid].activo
+    )
+    if invalidas:
+        raise ValidationError(
+            f"Variantes inexistentes o inactivas: {invalidas}.")
+
+    detalles = []
+    for linea in lineas:
+        cantidad = linea["cantidad"]
+        if cantidad < 1:
+            raise ValidationError("La cantidad debe ser al menos 1.")
+        variante = variantes[linea["variante_id"]]
+        detalles.append(DetallePedido(
+            pedido=pedido,
+            variante=variante,
+            cantidad=cantidad,
+            precio_unitario=variante.precio,
+            subtotal=cantidad * variante.precio,
+            uuid_cliente=linea.get("uuid_cliente"),
+        ))
+
+    if pedido.nombre_estado in ESTADOS_RESERVAN:
+        stock.reservar((d.variante_id, d.cantidad, pedido.pk) for d in detalles)
+
+    detalles = DetallePedido.objects.bulk_create(detalles)
+
+    # Un solo recálculo del total; save() valida el crédito y la versión
+    pedido.actualizar_total()
+
+    # bulk_create no dispara post_save
+    cocina.planificar(detalle_ids=[d.pk for d in detalles])
+    for d in detalles:
+        eventos.publicar(
+            eventos.LINEA_AGREGADA, pedido.id,
+            detalle=d.id, variante=d.variante_id,
+            nombre=str(d.variante), cantidad=d.cantidad,
+        )
+    return detalles
@@ -1,20 +1,77 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, pre_delete
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
-from .models import Pedido
+from apps.finanzas import elegibilidad
+from .models import Pedido, DetallePedido
+from . import cocina, eventos, seguimiento
+
+# Campos que pueden invalidar la validación de crédito
+CAMPOS_CREDITO = {"total", "cliente", "cliente_id", "metodo_pago", "metodo_pago_id"}
 
 
 @receiver(pre_save, sender=Pedido)
-def validar_credito(sender, instance, **kwargs):
-    if instance.metodo_pago and instance.metodo_pago.nombre.lower() == "credito":
-        if not instance.cliente:
+def validar_credito(sender, instance, update_fields=None, **kwargs):
+    # Cambios de estado, notas, mesa...: no hay nada de crédito que revisar
+    if update_fields is not None and not CAMPOS_CREDITO & set(update_fields):
+        return
+    if instance.pk and not instance.credito_cambiado():
+        return
+    if instance.es_credito:
+        if not instance.cliente_id:
             raise ValidationError(
                 "El pedido con crédito debe tener un cliente asignado.")
-        credito = instance.cliente.creditos.filter(
-            estado__nombre="Activo").first()
+        credito = elegibilidad.credito_elegible(instance.cliente_id)
         if not credito:
             raise ValidationError(
                 "El cliente no tiene un crédito activo aprobado.")
         if instance.total > credito.saldo:
             raise ValidationError(
                 "El total del pedido supera el saldo disponible del crédito.")
+
+
+# ---------- Eventos para cocina ----------
+@receiver(post_save, sender=Pedido)
+def publicar_evento_pedido(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar(
+            eventos.PEDIDO_CREADO, instance.id,
+            estado=instance.nombre_estado,
+            mesa=instance.mesa,
+            tipo=instance.tipo,
+            notas=instance.notas,
+            fecha_pedido=instance.fecha_pedido.isoformat(),
+        )
+    elif instance.estado_cambiado():
+        tipo = eventos.PEDIDO_CANCELADO if instance.cancelado else eventos.ESTADO_CAMBIADO
+        eventos.publicar(tipo, instance.id, estado=instance.nombre_estado)
+    else:
+        return
+    seguimiento.guardar_al_confirmar(
+        instance.id, instance.cliente_id, instance.nombre_estado)
+    instance.marcar_estado_guardado()
+
+
+@receiver(post_save, sender=DetallePedido)
+def publicar_evento_detalle(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar(
+            eventos.LINEA_AGREGADA, instance.pedido_id,
+            detalle=instance.id,
+            variante=instance.variante_id,
+            nombre=str(instance.variante),
+            cantidad=instance.cantidad,
+        )
+
+
+# ---------- Tickets de cocina (ver cocina.py) ----------
+@receiver(post_save, sender=DetallePedido)
+def planificar_detalle(sender, instance, created, **kwargs):
+    if created:
+        cocina.planificar(detalle_ids=[instance.pk])
+    else:
+        cocina.actualizar_lineas([instance.pk])
+
+
+@receiver(pre_delete, sender=DetallePedido)
+def retirar_ticket_detalle(sender, instance, **kwargs):
+    cocina.retirar(detalle_ids=[instance.pk])
@@ -0,0 +1,284 @@
+"""
+Sincronización de las tablets de meseros (trabajo sin conexión).
+
+Sin red, la tablet guarda las operaciones con un `uuid` propio y la hora
+`en` que ocurrieron; al reconectar las manda en un solo POST junto con el
+`token` de su última sincronización:
+
+- aplicar(): ordena las operaciones por `en` y las aplica en una sola
+  transacción, cada una en su savepoint. Las que chocan (stock, pedido
+  finalizado, versión vieja, transición no permitida) vuelven como
+  conflicto sin deshacer las demás. Reenviar el mismo lote es seguro: los
+  uuid ya aplicados vuelven como "duplicado".
+- cambios(): pedidos modificados desde el token (mismo JSON que
+  PedidoLecturaSerializer) y el token siguiente.
+
+El token es un cursor sobre (actualizado, id). Si no quedan más cambios
+se devuelve `ahora - MARGEN`: lo que otra transacción escribió antes pero
+confirmó después de la lectura llega en la siguiente sincronización, y la
+tablet descarta los repetidos por `version`.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+
+from apps.core import catalogos, fechas
+from apps.core.concurrencia import ConflictoVersion
+from apps.core.paginacion import codificar_cursor, decodificar_cursor, despues_de
+from apps.inventario.stock import StockInsuficiente
+from .models import DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado
+from . import estados, services
+
+# Acciones
+CREAR_PEDIDO = "crear_pedido"
+AGREGAR_LINEA = "agregar_linea"
+CAMBIAR_ESTADO = "cambiar_estado"
+ACCIONES = [CREAR_PEDIDO, AGREGAR_LINEA, CAMBIAR_ESTADO]
+
+# Resultados
+APLICADO = "aplicado"
+DUPLICADO = "duplicado"
+CONFLICTO = "conflicto"
+
+# Motivos de conflicto
+STOCK = "stock"
+FINALIZADO = "finalizado"
+VERSION = "version"
+TRANSICION = "transicion"
+NO_ENCONTRADO = "no_encontrado"
+INVALIDO = "invalido"
+
+ORDEN = ("actualizado", "id")
+MARGEN = timedelta(seconds=5)
+LIMITE = 500
+
+
+class Conflicto(Exception):
+    def __init__(self, motivo, mensaje, **extra):
+        self.motivo = motivo
+        self.mensaje = mensaje
+        self.extra = extra
+        super().__init__(mensaje)
+
+
+class _Lote:
+    """Estado de una sincronización: pedidos ya cargados y los que se tocaron."""
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self.ahora = timezone.now()
+        self.pedidos = {}
+        self.tocados = set()
+
+    def pedido(self, op):
+        if op.get("pedido_uuid"):
+            clave = {"uuid_cliente": op["pedido_uuid"]}
+        else:
+            clave = {"pk": op["pedido_id"]}
+        llave = tuple(clave.items())
+        if llave not in self.pedidos:
+            pedido = Pedido.objects.filter(**clave).first()
+            if pedido is None:
+                raise Conflicto(NO_ENCONTRADO, "El pedido no existe.")
+            self.pedidos[llave] = pedido
+        return self.pedidos[llave]
+
+
+def _resultado(op, resultado, **datos):
+    return {"uuid": op["uuid"], "accion": op["accion"],
+            "resultado": resultado, **datos}
+
+
+def _no_finalizado(pedido):
+    if estados.es_final(pedido.estado_id):
+        raise Conflicto(FINALIZADO, f"El pedido #{pedido.pk} ya está "
+                                    f"{pedido.nombre_estado.lower()}.",
+                        pedido=pedido.pk)
+
+
+# ---------- Operaciones ----------
+def _pedido_existente(uuid):
+    """pk del pedido con ese uuid, también si ya pasó al archivo."""
+    for modelo in (Pedido, PedidoArchivado):
+        pk = modelo.objects.filter(uuid_cliente=uuid).values_list("pk", flat=True).first()
+        if pk:
+            return pk
+    return None
+
+
+def _crear_pedido(ops, lote):
+    op, = ops
+    existente = _pedido_existente(op["uuid"])
+    if existente:
+        return [_resultado(op, DUPLICADO, pedido=existente)]
+    if catalogos.metodos_pago.nombre(op["metodo_pago"]) is None:
+        raise Conflicto(INVALIDO, "Método de pago inexistente.")
+    cliente = op.get("cliente")
+    if cliente and not get_user_model().objects.filter(pk=cliente).exists():
+        raise Conflicto(INVALIDO, "Cliente inexistente.")
+
+    try:
+        with transaction.atomic():
+            pedido = Pedido.objects.create(
+                uuid_cliente=op["uuid"],
+                cliente_id=cliente,
+                empleado=lote.usuario,
+                estado_id=catalogos.estados_pedido.id(estados.PENDIENTE),
+                metodo_pago_id=op["metodo_pago"],
+                mesa=op.get("mesa"),
+                tipo=op.get("tipo", "interno"),
+                notas=op.get("notas"),
+            )
+    except IntegrityError:
+        # Otro envío del mismo lote lo creó entre la consulta y el INSERT
+        existente = _pedido_existente(op["uuid"])
+        if existente is None:
+            raise
+        return [_resultado(op, DUPLICADO, pedido=existente)]
+    # fecha_pedido es auto_now_add: se usa la hora de la tablet (nunca futura)
+    pedido.fecha_pedido = min(op["en"], lote.ahora)
+    Pedido.objects.filter(pk=pedido.pk).update(fecha_pedido=pedido.fecha_pedido)
+    lote.pedidos[(("uuid_cliente", op["uuid"]),)] = pedido
+    lote.tocados.add(pedido.pk)
+    return [_resultado(op, APLICADO, pedido=pedido.pk)]
+
+
+def _agregar_lineas(ops, lote):
+    """Líneas consecutivas del mismo pedido: un solo agregar_detalles."""
+    uuids = [op["uuid"] for op in ops]
+    existentes = {
+        uuid: pk
+        for modelo in (DetallePedidoArchivado, DetallePedido)
+        for uuid, pk in modelo.objects.filter(uuid_cliente__in=uuids)
+        .values_list("uuid_cliente", "pk")}
+    nuevas = [op for op in ops if op["uuid"] not in existentes]
+    resultados = {op["uuid"]: _resultado(op, DUPLICADO, detalle=existentes[op["uuid"]])
+                  for op in ops if op["uuid"] in existentes}
+    if nuevas:
+        pedido = lote.pedido(nuevas[0])
+        _no_finalizado(pedido)
+        detalles = services.agregar_detalles(pedido, [
+            {"variante_id": op["variante"], "cantidad": op["cantidad"],
+             "uuid_cliente": op["uuid"]}
+            for op in nuevas])
+        for op, detalle in zip(nuevas, detalles):
+            resultados[op["uuid"]] = _resultado(
+                op, APLICADO, pedido=pedido.pk, detalle=detalle.pk)
+        lote.tocados.add(pedido.pk)
+    return [resultados[op["uuid"]] for op in ops]
+
+
+def _cambiar_estado(ops, lote):
+    op, = ops
+    pedido = lote.pedido(op)
+    if pedido.estado_id == catalogos.estados_pedido.id(op["estado"]):
+        return [_resultado(op, DUPLICADO, pedido=pedido.pk)]
+    _no_finalizado(pedido)
+    # La versión que vio la tablet solo vale si este lote no tocó el pedido
+    version = op.get("version")
+    if version is not None and pedido.pk not in lote.tocados \
+            and version != pedido.version:
+        raise Conflicto(VERSION, f"El pedido #{pedido.pk} cambió en el servidor.",
+                        pedido=pedido.pk)
+    estados.transicionar(pedido, op["estado"])
+    lote.tocados.add(pedido.pk)
+    return [_resultado(op, APLICADO, pedido=pedido.pk)]
+
+
+APLICAR = {
+    CREAR_PEDIDO: _crear_pedido,
+    AGREGAR_LINEA: _agregar_lineas,
+    CAMBIAR_ESTADO: _cambiar_estado,
+}
+
+
+def _en_savepoint(funcion, ops, lote):
+    try:
+        with transaction.atomic():
+            return funcion(ops, lote)
+    except Conflicto:
+        raise
+    except StockInsuficiente as e:
+        raise Conflicto(STOCK, e.message, faltantes=e.faltantes)
+    except estados.TransicionInvalida as e:
+        raise Conflicto(TRANSICION, " ".join(e.messages))
+    except ConflictoVersion as e:
+        raise Conflicto(VERSION, str(e))
+    except ValidationError as e:
+        raise Conflicto(INVALIDO, " ".join(e.messages))
+
+
+def _grupos(ops):
+    def clave(op):
+        if op["accion"] == AGREGAR_LINEA:
+            return (AGREGAR_LINEA, op.get("pedido_uuid"), op.get("pedido_id"))
+        return id(op)
+    for _, grupo in groupby(ops, key=clave):
+        yield list(grupo)
+
+
+# ---------- API ----------
+@transaction.atomic
+def aplicar(operaciones, usuario):
+    """Un resultado por operación, en el orden en que se aplicaron."""
+    lote = _Lote(usuario)
+    resultados = []
+    for grupo in _grupos(sorted(operaciones, key=itemgetter("en"))):
+        funcion = APLICAR[grupo[0]["accion"]]
+        if len(grupo) > 1:
+            try:
+                resultados += _en_savepoint(funcion, grupo, lote)
+                continue
+            except Conflicto:
+                # Se reintenta de a una para ver cuál choca. Tras el
+                # rollback los pedidos cargados pueden estar adelantados.
+                lote.pedidos.clear()
+        for op in grupo:
+            try:
+                resultados += _en_savepoint(funcion, [op], lote)
+            except Conflicto as e:
+                lote.pedidos.clear()
+                resultados.append(_resultado(
+                    op, CONFLICTO, motivo=e.motivo, mensaje=e.mensaje, **e.extra))
+    return resultados
+
+
+def leer_token(token):
+    try:
+        return decodificar_cursor(token, Pedido, ORDEN)
+    except NotFound:
+        raise ValidationError("Token de sincronización inválido.")
+
+
+def cambios(desde=None, limite=LIMITE):
+    """
+    (pedidos, token, mas): los pedidos modificados después de `desde`
+    (valores de leer_token) o, sin token, los del día.
+    """
+    ahora = timezone.now()
+    qs = Pedido.objects.all()
+    if desde:
+        qs = qs.filter(despues_de(ORDEN, desde))
+    else:
+        qs = qs.filter(**fechas.filtro_dia("fecha_pedido"))
+    pedidos = list(
+        qs.select_related("cliente", "empleado", "estado", "metodo_pago")
+        .prefetch_related(Prefetch(
+            "detalles",
+            queryset=DetallePedido.objects.select_related(
+                "variante", "variante__producto")))
+        .order_by(*ORDEN)[:limite + 1])
+    mas = len(pedidos) > limite
+    pedidos = pedidos[:limite]
+    if mas:
+        siguiente = [pedidos[-1].actualizado, pedidos[-1].id]
+    else:
+        siguiente = [ahora - MARGEN, 0]
+    return pedidos, codificar_cursor(siguiente), mas
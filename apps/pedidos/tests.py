@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import asyncio
+import io
+from datetime import date, timedelta
+import json
+import uuid
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.core import catalogos, fechas
+from apps.finanzas import elegibilidad
+from apps.finanzas.models import AuditoriaCredito, Credito, MovimientoCredito
+from apps.inventario.tests import en_hilos
+from apps.inventario.models import Categoria, SubCategoria, Producto, ProductoVariante
+from apps.inventario.stock import StockInsuficiente
+from .models import (
+    Pedido, DetallePedido, EstadoPedido, MetodoPago, VentaDiaria,
+    EstacionCocina, TicketCocina, PedidoArchivado, DetallePedidoArchivado,
+    LARGO_RESUMEN, resumir_items,
+)
+from .eventos import BusMemoria
+from .serializers import PedidoSerializer, PedidoLecturaSerializer
+from .views import PedidoListCreateView, PedidosCocinaListView
+from . import (
+    eventos, seguimiento, estados, services, cocina, archivo, sincronizacion, bench,
+    populares)
+
+
+class PedidoBaseMixin:
+    def setUp(self):
+        catalogos.invalidar_todos()
+        User = get_user_model()
+        self.mesero = User.objects.create_user(
+            "mesero", "mesero@test.com", password="pass1234", rol="MESERO")
+        self.cliente = User.objects.create_user(
+            "cliente", "cliente@test.com", password="pass1234")
+        self.pendiente = EstadoPedido.objects.create(nombre="Pendiente")
+        self.efectivo = MetodoPago.objects.create(nombre="Efectivo")
+
+        categoria = Categoria.objects.create(nombre="Bebidas")
+        sub = SubCategoria.objects.create(categoria=categoria, nombre="Café")
+        producto = Producto.objects.create(nombre="Latte", subcategoria=sub)
+        self.latte = ProductoVariante.objects.create(
+            producto=producto, nombre_variante="Grande", sku="LAT-G",
+            precio=8000, stock=10)
+        self.croissant = ProductoVariante.objects.create(
+            producto=producto, nombre_variante="Croissant", sku="CRO",
+            precio=5000, stock=3)
+
+    def crear_pedido(self, **kwargs):
+        datos = {
+            "cliente": self.cliente,
+            "empleado": self.mesero,
+            "estado": self.pendiente,
+            "metodo_pago": self.efectivo,
+        }
+        datos.update(kwargs)
+        return Pedido.objects.create(**datos)
+
+    def stock_de(self, variante):
+        variante.refresh_from_db()
+        return variante.stock, variante.stock_bloqueado
+
+
+class PedidoBaseTestCase(PedidoBaseMixin, TestCase):
+    pass
+
+
+class CicloStockPedidoTests(PedidoBaseTestCase):
+    def test_linea_en_pedido_pendiente_reserva_stock(self):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=2)
+        self.assertEqual(self.stock_de(self.latte), (10, 2))
+
+    def test_entregar_consume_lo_reservado(self):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=2)
+        DetallePedido.objects.create(pedido=pedido, variante=self.croissant, cantidad=1)
+        pedido.entregar()
+        self.assertEqual(self.stock_de(self.latte), (8, 0))
+        self.assertEqual(self.stock_de(self.croissant), (2, 0))
+
+    def test_cancelar_libera_reserva(self):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.croissant, cantidad=3)
+        pedido.cancelar()
+        self.assertEqual(self.stock_de(self.croissant), (3, 0))
+        self.assertTrue(pedido.cancelado)
+
+    def test_confirmar_no_duplica_reserva_de_pedido_pendiente(self):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=2)
+        pedido.confirmar()
+        self.assertEqual(self.stock_de(self.latte), (10, 2))
+
+    def test_linea_sin_stock_falla(self):
+        pedido = self.crear_pedido()
+        with self.assertRaises(StockInsuficiente):
+            DetallePedido.objects.create(
+                pedido=pedido, variante=self.croissant, cantidad=4)
+        self.assertEqual(self.stock_de(self.croissant), (3, 0))
+
+    def test_guardar_pedido_no_recorre_las_lineas(self):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=2)
+        pedido.refresh_from_db()
+        pedido.notas = "sin azúcar"
+        with CaptureQueriesContext(connection) as ctx:
+            pedido.save()
+        self.assertFalse([q for q in ctx if "pedidos_detallepedido" in q["sql"]])
+        self.assertEqual(pedido.total, 16000)
+        self.assertEqual(pedido.calcular_total(), 16000)
+
+
+class DetallesBulkTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mesero)
+        self.pedido = self.crear_pedido()
+        self.url = reverse("pedido-detalles-bulk", args=[self.pedido.id])
+
+    def test_crea_lineas_reserva_y_recalcula_total(self):
+        lineas = [{"variante_id": self.latte.id, "cantidad": 2},
+                  {"variante_id": self.croissant.id, "cantidad": 1},
+                  {"variante_id": self.latte.id, "cantidad": 1}]
+        resp = self.client.post(self.url, {"detalles": lineas}, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        self.assertEqual(len(resp.data["detalles"]), 3)
+
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, 8000 * 3 + 5000)
+        self.assertEqual(self.stock_de(self.latte), (10, 3))
+        self.assertEqual(self.stock_de(self.croissant), (3, 1))
+
+    def test_consultas_no_crecen_con_las_lineas(self):
+        lineas = [{"variante_id": self.latte.id, "cantidad": 1}] * 2
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.post(self.url, {"detalles": lineas}, format="json")
+        lineas = [{"variante_id": self.latte.id, "cantidad": 1},
+                  {"variante_id": self.croissant.id, "cantidad": 1}] * 3
+        with CaptureQueriesContext(connection) as muchas:
+            self.client.post(self.url, {"detalles": lineas}, format="json")
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_stock_insuficiente_no_crea_nada(self):
+        lineas = [{"variante_id": self.latte.id, "cantidad": 1},
+                  {"variante_id": self.croissant.id, "cantidad": 5}]
+        resp = self.client.post(self.url, {"detalles": lineas}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(self.croissant.id, resp.data["faltantes"])
+        self.assertFalse(self.pedido.detalles.exists())
+        self.assertEqual(self.stock_de(self.latte), (10, 0))
+
+
+class EventosCocinaTests(PedidoBaseTestCase):
+    def test_bus_memoria_repite_desde_seq(self):
+        bus = BusMemoria(historial=10)
+        for i in range(3):
+            bus.publicar({"tipo": eventos.ESTADO_CAMBIADO, "pedido": i, "datos": {}})
+
+        async def leer():
+            suscripcion = bus.suscribir(desde=1)
+            recibidos = [await anext(suscripcion), await anext(suscripcion)]
+            await suscripcion.aclose()
+            return recibidos
+
+        recibidos = async_to_sync(leer)()
+        self.assertEqual([e["seq"] for e in recibidos], [2, 3])
+
+    def test_escrituras_publican_eventos_al_confirmar(self):
+        bus = BusMemoria()
+        with patch.object(eventos, "_bus", bus):
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido = self.crear_pedido()
+                DetallePedido.objects.create(
+                    pedido=pedido, variante=self.latte, cantidad=1)
+            with self.captureOnCommitCallbacks(execute=True):
+                pedido.cancelar()
+        tipos = [e["tipo"] for e in bus._historial]
+        self.assertEqual(tipos, [eventos.PEDIDO_CREADO, eventos.LINEA_AGREGADA,
+                                 eventos.PEDIDO_CANCELADO])
+
+
+class PedidoEstadoTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente)
+        self.pedido = self.crear_pedido()
+        self.url = reverse("pedido-estado", args=[self.pedido.id])
+
+    def test_etag_y_304_sin_leer_pedido(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["estado"], "Pendiente")
+        etag = resp["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(any("pedidos_pedido" in q["sql"] for q in ctx.captured_queries))
+
+    def test_cambio_de_estado_cambia_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.cancelar()
+        resp = self.client.get(self.url, {"wait": 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["estado"], "Cancelado")
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_etag_debil_y_lista(self):
+        etag = self.client.get(self.url)["ETag"]
+        for cabecera in (f"W/{etag}", f'"otro", {etag}', "*"):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=cabecera)
+            self.assertEqual(resp.status_code, 304, cabecera)
+
+    def test_wsgi_ignora_wait(self):
+        etag = self.client.get(self.url)["ETag"]
+        with patch.object(seguimiento, "esperar_cambio") as esperar:
+            resp = self.client.get(self.url, {"wait": 30}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        esperar.assert_not_called()
+
+    def cabeceras_jwt(self, **extra):
+        return {"Authorization": f"Bearer {AccessToken.for_user(self.cliente)}", **extra}
+
+    async def test_long_poll_asgi_vence_con_304(self):
+        etag = (await self.async_client.get(self.url, headers=self.cabeceras_jwt()))["ETag"]
+        with patch.object(seguimiento, "INTERVALO_SONDEO", 0.05):
+            resp = await self.async_client.get(
+                self.url, {"wait": 1}, headers=self.cabeceras_jwt(**{"If-None-Match": etag}))
+        self.assertEqual(resp.status_code, 304)
+
+    async def test_long_poll_asgi_despierta_con_el_cambio(self):
+        etag = (await self.async_client.get(self.url, headers=self.cabeceras_jwt()))["ETag"]
+        pedido = asyncio.ensure_future(self.async_client.get(
+            self.url, {"wait": 10}, headers=self.cabeceras_jwt(**{"If-None-Match": etag})))
+        await asyncio.sleep(0.1)
+        self.assertFalse(pedido.done())
+        seguimiento.guardar(self.pedido.id, self.cliente.id, "Cancelado")
+        resp = await asyncio.wait_for(pedido, 2)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["estado"], "Cancelado")
+
+    def test_pedido_de_otro_cliente(self):
+        self.client.force_authenticate(self.mesero)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CatalogosTests(PedidoBaseMixin, TransactionTestCase):
+    TABLAS_CATALOGO = ("pedidos_estadopedido", "pedidos_metodopago",
+                       "finanzas_estadocredito", "finanzas_tipomovimiento")
+
+    def ciclo(self):
+        pedido = self.crear_pedido(estado=catalogos.estados_pedido.obtener("Pendiente"))
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=1)
+        pedido.confirmar()
+        pedido.entregar()
+        otro = self.crear_pedido(estado=catalogos.estados_pedido.obtener("Pendiente"))
+        otro.cancelar()
+
+    def test_ciclo_estable_sin_consultas_de_catalogo(self):
+        self.ciclo()  # crea Entregado/Cancelado
+        self.ciclo()  # recarga tras la invalidación
+        with CaptureQueriesContext(connection) as ctx:
+            self.ciclo()
+        consultas = [q["sql"] for q in ctx.captured_queries
+                     if any(t in q["sql"] for t in self.TABLAS_CATALOGO)]
+        self.assertEqual(consultas, [])
+
+    def test_escritura_invalida_la_cache(self):
+        self.assertEqual(catalogos.estados_pedido.nombre(self.pendiente.id), "Pendiente")
+        EstadoPedido.objects.filter(pk=self.pendiente.pk).update(nombre="Por hacer")
+        EstadoPedido.objects.get(pk=self.pendiente.pk).save()
+        self.assertEqual(catalogos.estados_pedido.nombre(self.pendiente.id), "Por hacer")
+
+
+class PaginacionCursorTests(PedidoBaseTestCase):
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        pedidos = [self.crear_pedido() for _ in range(5)]
+        # Empates de fecha: el id desempata
+        Pedido.objects.filter(pk__in=[p.pk for p in pedidos[:3]]).update(
+            fecha_pedido=pedidos[0].fecha_pedido)
+
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        url = reverse("mis-pedidos-todos") + "?page_size=2"
+        vistos = []
+        while url:
+            resp = client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertLessEqual(len(resp.data["results"]), 2)
+            vistos += [p["id"] for p in resp.data["results"]]
+            url = resp.data["next"]
+
+        esperado = list(Pedido.objects.order_by(
+            "-fecha_pedido", "-id").values_list("id", flat=True))
+        self.assertEqual(vistos, esperado)
+
+    def test_cursor_invalido(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        resp = client.get(reverse("mis-pedidos-todos"), {"cursor": "xxx"})
+        self.assertEqual(resp.status_code, 404)
+
+
+class LecturaRapidaTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.latte.producto.imagen = "productos/latte.jpg"
+        self.latte.producto.save()
+        con_lineas = self.crear_pedido(mesa=4, notas="sin azúcar")
+        DetallePedido.objects.create(pedido=con_lineas, variante=self.latte, cantidad=2)
+        DetallePedido.objects.create(pedido=con_lineas, variante=self.croissant, cantidad=1)
+        self.crear_pedido(empleado=None, tipo="externo")
+        # Línea cuya variante ya no existe (variante es nullable)
+        sin_variante = DetallePedido.objects.create(
+            pedido=con_lineas, variante=self.latte, cantidad=1)
+        DetallePedido.objects.filter(pk=sin_variante.pk).update(variante=None)
+
+    def test_mismo_json_que_pedido_serializer(self):
+        request = APIRequestFactory().get("/")
+        contexto = {"request": request}
+        pedidos = (Pedido.objects.select_related(
+            "cliente", "empleado", "estado", "metodo_pago")
+            .prefetch_related("detalles__variante__producto").order_by("id"))
+        esperado = PedidoSerializer(pedidos, many=True, context=contexto).data
+        rapido = PedidoLecturaSerializer(pedidos, many=True, context=contexto).data
+        self.assertEqual(json.loads(json.dumps(rapido)),
+                         json.loads(json.dumps(esperado)))
+
+    def test_listados_get_usan_lectura_rapida(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        with patch.object(PedidoSerializer, "to_representation") as lento:
+            resp = client.get(reverse("mis-pedidos-todos"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data["results"]), 2)
+        lento.assert_not_called()
+
+    def test_linea_sin_variante(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        resp = client.get(reverse("mis-pedidos-todos"))
+        self.assertEqual(resp.status_code, 200)
+        variantes = [d["variante"] for p in resp.data["results"] for d in p["detalles"]]
+        self.assertIn(None, variantes)
+
+
+class MaquinaEstadosTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pedidos = []
+        for _ in range(3):
+            pedido = self.crear_pedido()
+            DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=2)
+            self.pedidos.append(pedido)
+
+    def test_tabla_por_ids(self):
+        pendiente = catalogos.estados_pedido.id(estados.PENDIENTE)
+        entregado = catalogos.estados_pedido.id(estados.ENTREGADO)
+        t = estados.tabla()[(pendiente, entregado)]
+        self.assertIn(estados.CONSUMIR, t.efectos)
+        self.assertIsNone(estados.buscar(entregado, pendiente))
+
+    def test_lote_aplica_stock_en_una_operacion(self):
+        with CaptureQueriesContext(connection) as ctx:
+            movidos = estados.transicionar(self.pedidos, estados.ENTREGADO)
+        self.assertEqual(len(movidos), 3)
+        self.assertEqual(self.stock_de(self.latte), (4, 0))
+        updates = [q for q in ctx.captured_queries
+                   if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 4)  # variantes + pedidos + costo de las líneas + ventas
+        self.assertEqual(self.pedidos[0].nombre_estado, estados.ENTREGADO)
+
+    def test_lote_con_transicion_invalida_no_toca_nada(self):
+        self.pedidos[0].cancelar()
+        with self.assertRaises(estados.TransicionInvalida) as ctx:
+            estados.transicionar(self.pedidos, estados.LISTO)
+        self.assertEqual(list(ctx.exception.errores), [self.pedidos[0].id])
+        self.assertEqual(Pedido.objects.filter(
+            estado__nombre=estados.LISTO).count(), 0)
+
+    def test_endpoint_transiciones(self):
+        client = APIClient()
+        client.force_authenticate(self.mesero)
+        url = reverse("pedido-transiciones")
+        ids = [p.id for p in self.pedidos]
+
+        resp = client.post(url, {"pedidos": ids, "estado": "En cocina"}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(sorted(resp.data["movidos"]), ids)
+
+        client.post(url, {"pedidos": ids[:1], "estado": "Cancelado"}, format="json")
+        resp = client.post(url, {"pedidos": ids, "estado": "Listo"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(ids[0], resp.data["errores"])
+        self.assertEqual(self.stock_de(self.latte), (10, 4))
+
+    def test_endpoint_transiciones_no_para_clientes(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        ids = [p.id for p in self.pedidos]
+        resp = client.post(reverse("pedido-transiciones"),
+                           {"pedidos": ids, "estado": "Cancelado"}, format="json")
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(Pedido.objects.filter(
+            estado__nombre=estados.CANCELADO).exists())
+
+    def test_patch_estado_pasa_por_la_maquina(self):
+        client = APIClient()
+        client.force_authenticate(self.mesero)
+        url = reverse("pedido-detail", args=[self.pedidos[0].id])
+        entregado = catalogos.estados_pedido.id(estados.ENTREGADO)
+        resp = client.patch(url, {"estado_id": entregado}, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(self.stock_de(self.latte), (8, 4))
+
+        pendiente = catalogos.estados_pedido.id(estados.PENDIENTE)
+        resp = client.patch(url, {"estado_id": pendiente}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class AccionesAdminMasivasTests(PedidoBaseMixin, TransactionTestCase):
+    # TransactionTestCase: con la transacción del TestCase abierta el
+    # catálogo no cachea (ver catalogos._escritura_pendiente)
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        admin_user = User.objects.create_superuser("admin", "admin@test.com", "pass1234")
+        self.client.force_login(admin_user)
+        self.url = reverse("admin:pedidos_pedido_changelist")
+
+    def crear_pedidos(self, n, variante=None):
+        pedidos = []
+        for _ in range(n):
+            pedido = self.crear_pedido()
+            DetallePedido.objects.create(
+                pedido=pedido, variante=variante or self.latte, cantidad=1)
+            pedidos.append(pedido)
+        return pedidos
+
+    def accion(self, nombre, pedidos, follow=False):
+        return self.client.post(self.url, {
+            "action": nombre,
+            "_selected_action": [p.id for p in pedidos],
+        }, follow=follow)
+
+    def test_entregar_en_consultas_constantes(self):
+        self.accion("marcar_entregado", self.crear_pedidos(1))  # calentamiento
+        pocos = self.crear_pedidos(2)
+        with CaptureQueriesContext(connection) as ctx_pocos:
+            self.accion("marcar_entregado", pocos)
+        muchos = self.crear_pedidos(6)
+        with CaptureQueriesContext(connection) as ctx_muchos:
+            self.accion("marcar_entregado", muchos)
+        self.assertEqual(len(ctx_pocos), len(ctx_muchos))
+        self.assertEqual(self.stock_de(self.latte), (1, 0))
+
+    def test_fallos_por_pedido_no_revierten_el_resto(self):
+        con_latte = self.crear_pedidos(2)
+        con_croissant = self.crear_pedidos(1, variante=self.croissant)
+        entregado = self.crear_pedidos(1)
+        entregado[0].entregar()
+        # Merma: ya no hay croissants para entregar
+        self.croissant.__class__.objects.filter(pk=self.croissant.pk).update(stock=0)
+
+        resp = self.accion("marcar_entregado", con_latte + con_croissant + entregado,
+                           follow=True)
+        mensajes = [str(m) for m in resp.context["messages"]]
+
+        self.assertEqual(Pedido.objects.filter(
+            pk__in=[p.id for p in con_latte],
+            estado__nombre="Entregado").count(), 2)
+        self.assertEqual(Pedido.objects.get(pk=con_croissant[0].id).nombre_estado,
+                         "Pendiente")
+        self.assertTrue(any(f"Pedido {con_croissant[0].id}" in m for m in mensajes))
+        self.assertIn("Se entregaron 2 pedidos.", mensajes)
+        self.assertEqual(self.stock_de(self.latte), (7, 0))
+
+
+class VentasDiariasTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        ProductoVariante.objects.filter(pk=self.latte.pk).update(costo=3000)
+
+    def entregar(self, variante, cantidad):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=variante, cantidad=cantidad)
+        pedido.entregar()
+        return pedido
+
+    def fila(self, variante):
+        return VentaDiaria.objects.get(variante=variante)
+
+    def test_entregas_acumulan_y_anulacion_resta(self):
+        primero = self.entregar(self.latte, 2)
+        self.entregar(self.latte, 1)
+        fila = self.fila(self.latte)
+        self.assertEqual((fila.unidades, fila.ingresos, fila.costo), (3, 24000, 9000))
+
+        primero.cancelar()
+        fila = self.fila(self.latte)
+        self.assertEqual((fila.unidades, fila.ingresos), (1, 8000))
+
+    def test_anular_resta_el_costo_que_se_sumo(self):
+        pedido = self.entregar(self.latte, 2)
+        self.assertEqual(pedido.detalles.get().costo_unitario, 3000)
+        ProductoVariante.objects.filter(pk=self.latte.pk).update(costo=3500)
+
+        pedido.cancelar()
+        fila = self.fila(self.latte)
+        self.assertEqual((fila.unidades, fila.ingresos, fila.costo), (0, 0, 0))
+
+    def test_reconstruir_coincide_con_incremental(self):
+        self.entregar(self.latte, 2)
+        self.entregar(self.croissant, 1)
+        self.crear_pedido().cancelar()
+        incremental = sorted(VentaDiaria.objects.values_list(
+            "fecha", "variante", "metodo_pago", "tipo", "unidades", "ingresos", "costo"))
+
+        VentaDiaria.objects.all().delete()
+        call_command("reconstruir_ventas", stdout=io.StringIO())
+        reconstruido = sorted(VentaDiaria.objects.values_list(
+            "fecha", "variante", "metodo_pago", "tipo", "unidades", "ingresos", "costo"))
+        self.assertEqual(incremental, reconstruido)
+
+    def test_mas_vendidos_y_reporte_leen_el_rollup(self):
+        self.entregar(self.croissant, 1)
+        # Solo existe en el rollup: los reportes no miran DetallePedido
+        VentaDiaria.objects.filter(variante=self.croissant).update(unidades=50)
+
+        resp = APIClient().get(reverse("productos-mas-vendidos"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data[0]["id"], self.croissant.producto_id)
+        stock_vivo = {v["id"]: v["stock"] for v in resp.data[0]["variantes"]}
+        self.assertEqual(stock_vivo[self.croissant.pk],
+                         ProductoVariante.objects.get(pk=self.croissant.pk).stock_disponible)
+
+        admin_user = get_user_model().objects.create_superuser(
+            "admin", "admin@test.com", "pass1234")
+        client = APIClient()
+        client.force_authenticate(admin_user)
+        resp = client.get(reverse("reporte-ventas"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["por_dia"][0]["unidades"], 50)
+        self.assertEqual(resp.data["por_metodo_pago"][0]["metodo"], "Efectivo")
+
+
+class MasVendidosTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        otro = Producto.objects.create(
+            nombre="Medialuna", subcategoria=self.latte.producto.subcategoria)
+        self.medialuna = ProductoVariante.objects.create(
+            producto=otro, nombre_variante="Simple", sku="MED", precio=3000, stock=20)
+        self.url = reverse("productos-mas-vendidos")
+
+    def entregar(self, variante, cantidad):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=variante, cantidad=cantidad)
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.entregar()
+        return pedido
+
+    def ids(self, **params):
+        resp = APIClient().get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        return [p["id"] for p in resp.data]
+
+    def test_ventanas_y_orden(self):
+        self.entregar(self.medialuna, 3)
+        self.entregar(self.latte, 1)
+        viejo = VentaDiaria.objects.get(variante=self.latte)
+        VentaDiaria.objects.create(
+            fecha=timezone.localdate() - timedelta(days=20), variante=self.latte,
+            metodo_pago=viejo.metodo_pago, tipo=viejo.tipo, unidades=10, ingresos=80000)
+
+        latte, medialuna = self.latte.producto_id, self.medialuna.producto_id
+        self.assertEqual(self.ids(ventana=7), [medialuna, latte])
+        self.assertEqual(self.ids(ventana=30), [latte, medialuna])
+        self.assertEqual(self.ids(ventana=7, orden="ingresos"), [medialuna, latte])
+        self.assertEqual(self.ids(ventana=30, limite=1), [latte])
+        self.assertEqual(APIClient().get(self.url, {"ventana": 5}).status_code, 400)
+
+    def test_entrega_suma_al_indice_y_lectura_solo_lee_el_stock(self):
+        self.entregar(self.latte, 1)
+        self.ids()
+        with CaptureQueriesContext(connection) as ctx:
+            self.ids()
+        self.assertEqual(len(ctx), 1)  # stock vivo de las variantes del top
+
+        pedido = self.entregar(self.medialuna, 4)
+        self.assertEqual(populares.ranking(7)[0][:2], (self.medialuna.producto_id, 4))
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.cancelar()
+        self.assertEqual(self.ids(), [self.latte.producto_id])
+
+
+class IndicesDelDiaTests(PedidoBaseTestCase):
+    """Las consultas "pedidos de hoy" usan un rango sargable sobre un índice."""
+
+    def assertUsaIndice(self, vista, usuario, indice):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("EXPLAIN solo se verifica en SQLite/PostgreSQL")
+        vista.request = APIRequestFactory().get("/")
+        vista.request.user = usuario
+        queryset = vista.get_queryset()
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                # Con tablas diminutas el planner prefiere Seq Scan
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(indice, plan)
+        self.assertNotRegex(plan, r"(?m)SCAN pedidos_pedido$|Seq Scan on pedidos_pedido")
+
+    def test_rango_del_dia_en_hora_local(self):
+        inicio, fin = fechas.rango_dia(date(2025, 3, 1))
+        self.assertEqual(inicio.isoformat(), "2025-03-01T00:00:00-05:00")
+        self.assertEqual((fin - inicio).total_seconds(), 86400)
+
+    def test_cocina_usa_indice(self):
+        self.assertUsaIndice(PedidosCocinaListView(), self.mesero,
+                             "pedido_estado_fecha_idx")
+
+    def test_pedidos_del_dia_usan_indice(self):
+        self.assertUsaIndice(PedidoListCreateView(), self.mesero,
+                             "pedido_fecha_id_idx")
+        self.assertUsaIndice(PedidoListCreateView(), self.cliente,
+                             "pedido_cliente_fecha_idx")
+
+
+class ElegibilidadCreditoTests(PedidoBaseMixin, TransactionTestCase):
+    # TransactionTestCase: dentro de una transacción abierta tras escribir
+    # un crédito no se cachea (ver elegibilidad._escritura_pendiente)
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.metodo_credito = MetodoPago.objects.create(nombre="credito")
+        self.credito = Credito.objects.create(
+            cliente=self.cliente, limite=50000,
+            estado=catalogos.estados_credito.obtener("Activo"))
+
+    def consultas_credito(self, ctx):
+        return [q["sql"] for q in ctx.captured_queries
+                if "finanzas_credito" in q["sql"]]
+
+    def test_guardados_sin_cambios_de_credito_no_consultan(self):
+        pedido = self.crear_pedido(metodo_pago=self.metodo_credito)
+        pedido = Pedido.objects.get(pk=pedido.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            pedido.notas = "sin azúcar"
+            pedido.save()
+            pedido.save(update_fields=["notas"])
+        self.assertEqual(self.consultas_credito(ctx), [])
+
+    def test_segunda_consulta_sale_de_cache(self):
+        elegibilidad.credito_elegible(self.cliente.id)
+        with CaptureQueriesContext(connection) as ctx:
+            e = elegibilidad.credito_elegible(self.cliente.id)
+        self.assertEqual(self.consultas_credito(ctx), [])
+        self.assertEqual(e.saldo, 50000)
+
+    def test_movimiento_invalida_la_cache(self):
+        elegibilidad.credito_elegible(self.cliente.id)
+        self.credito.consumir(20000, detalle="prueba")
+        self.assertEqual(elegibilidad.credito_elegible(self.cliente.id).saldo, 30000)
+
+    def test_cambio_de_estado_omite_la_validacion(self):
+        pedido = self.crear_pedido(metodo_pago=self.metodo_credito)
+        self.credito.estado = catalogos.estados_credito.obtener("Suspendido")
+        self.credito.save()
+        pedido.estado = catalogos.estados_pedido.obtener("En cocina")
+        pedido.save(update_fields=["estado"])  # no toca el crédito
+
+        pedido.total = 1000
+        with self.assertRaisesMessage(ValidationError, "crédito activo"):
+            pedido.save(update_fields=["total"])
+
+
+class IdempotenciaTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mesero)
+        self.url = reverse("pedido-list-create")
+        self.datos = {"cliente": self.cliente.id, "estado_id": self.pendiente.id,
+                      "metodo_pago_id": self.efectivo.id, "mesa": 4}
+
+    def post(self, datos=None, clave="tablet-1-0001"):
+        return self.client.post(self.url, datos or self.datos, format="json",
+                                HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_repite_la_respuesta_sin_crear_otro_pedido(self):
+        primera = self.post()
+        segunda = self.post()
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.data["id"], primera.data["id"])
+        self.assertEqual(segunda["Idempotent-Replayed"], "true")
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_sin_clave_o_con_otra_clave_se_ejecuta(self):
+        self.client.post(self.url, self.datos, format="json")
+        self.post(clave="a")
+        self.post(clave="b")
+        self.assertEqual(Pedido.objects.count(), 3)
+
+    def test_misma_clave_otro_cuerpo(self):
+        self.post()
+        resp = self.post({**self.datos, "mesa": 9})
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_reintento_en_curso_no_se_ejecuta(self):
+        internas = []
+        original = PedidoListCreateView.perform_create
+
+        def con_reintento(vista, serializer):
+            internas.append(self.post())
+            original(vista, serializer)
+
+        with patch.object(PedidoListCreateView, "perform_create", con_reintento):
+            primera = self.post()
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual(internas[0].status_code, 409)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_error_de_validacion_libera_la_clave(self):
+        self.assertEqual(self.post({**self.datos, "metodo_pago_id": 999}).status_code, 400)
+        self.assertEqual(self.post().status_code, 201)
+
+    def test_abono_mesero_no_se_duplica(self):
+        credito = Credito.objects.create(
+            cliente=self.cliente, limite=50000,
+            estado=catalogos.estados_credito.obtener("Activo"))
+        credito.consumir(20000, detalle="consumo")
+        url = reverse("mesero-registrar-abono")
+        datos = {"credito_id": credito.id, "monto": 5000}
+        for _ in range(2):
+            resp = self.client.post(url, datos, format="json",
+                                    HTTP_IDEMPOTENCY_KEY="abono-1")
+            self.assertEqual(resp.status_code, 201)
+        credito.refresh_from_db()
+        self.assertEqual(credito.saldo, 35000)
+        self.assertEqual(credito.movimientos.count(), 2)
+
+
+class ConcurrenciaPedidoTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mesero)
+        self.pedido = self.crear_pedido(mesa=2)
+        self.url = reverse("pedido-detail", args=[self.pedido.id])
+
+    def test_version_vieja_responde_409_con_el_pedido_actual(self):
+        leida = self.client.get(self.url).data["version"]
+        self.assertEqual(self.client.patch(
+            self.url, {"notas": "sin hielo", "version": leida},
+            format="json").status_code, 200)
+
+        resp = self.client.patch(self.url, {"mesa": 7, "version": leida},
+                                 format="json")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.data["actual"]["notas"], "sin hielo")
+        self.assertEqual(resp.data["actual"]["version"], leida + 1)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.mesa, 2)
+
+    def test_transicion_sube_la_version(self):
+        version = self.pedido.version
+        estados.transicionar(self.pedido, estados.EN_COCINA)
+        self.assertEqual(self.pedido.version, version + 1)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.version, version + 1)
+
+    def test_linea_con_pedido_viejo_no_pisa_el_estado(self):
+        viejo = Pedido.objects.get(pk=self.pedido.pk)
+        estados.transicionar(self.pedido, estados.EN_COCINA)
+        DetallePedido.objects.create(pedido=viejo, variante=self.latte, cantidad=2)
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.nombre_estado, estados.EN_COCINA)
+        self.assertEqual(self.pedido.total, 16000)
+
+
+class ConcurrenciaHilosPedidoTests(PedidoBaseMixin, TransactionTestCase):
+    """Hilos reales contra una BD en archivo (ver DATABASES["TEST"])."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Requiere una BD compartida entre conexiones.")
+        super().setUp()
+        self.pedido = self.crear_pedido()
+
+    def test_lineas_simultaneas_suman_el_total_completo(self):
+        def agregar(i):
+            pedido = Pedido.objects.get(pk=self.pedido.pk)
+            DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=1)
+
+        resultados, errores = en_hilos(8, agregar)
+        self.assertEqual(errores, [])
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.detalles.count(), 8)
+        self.assertEqual(self.pedido.total, 8 * 8000)
+        self.assertEqual(self.stock_de(self.latte), (10, 8))
+
+
+class PlanificadorCocinaTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.ana = User.objects.create_user(
+            "ana", "ana@test.com", password="pass1234", rol="COCINERO")
+        self.beto = User.objects.create_user(
+            "beto", "beto@test.com", password="pass1234", rol="COCINERO")
+        self.barra = EstacionCocina.objects.create(nombre="Barra")
+        self.barra.subcategorias.add(self.latte.producto.subcategoria)
+        self.barra.cocineros.add(self.ana, self.beto)
+        ProductoVariante.objects.filter(pk=self.latte.pk).update(tiempo_preparacion=4)
+        ProductoVariante.objects.filter(pk=self.croissant.pk).update(tiempo_preparacion=3)
+        self.ahora = timezone.now()
+
+    def en(self, minutos):
+        return self.ahora + timedelta(minutes=minutos)
+
+    def agregar(self, pedido, lineas, minutos=0):
+        with patch("apps.pedidos.cocina.timezone.now", return_value=self.en(minutos)):
+            services.agregar_detalles(pedido, [
+                {"variante_id": v.id, "cantidad": c} for v, c in lineas])
+
+    def cola(self):
+        return [(t.pedido_id, t.cocinero_id, t.inicio_estimado, t.fin_estimado)
+                for t in cocina.cola(self.barra.id)]
+
+    def test_reparte_primero_lo_mas_largo_al_cocinero_libre(self):
+        pedido = self.crear_pedido()
+        self.agregar(pedido, [(self.croissant, 1), (self.latte, 2), (self.latte, 1)])
+        self.assertEqual(self.cola(), [
+            (pedido.id, self.ana.id, self.en(0), self.en(8)),
+            (pedido.id, self.beto.id, self.en(0), self.en(4)),
+            (pedido.id, self.beto.id, self.en(4), self.en(7)),
+        ])
+
+    def test_pedido_nuevo_va_al_final_sin_mover_los_anteriores(self):
+        primero, segundo = self.crear_pedido(), self.crear_pedido()
+        self.agregar(primero, [(self.latte, 2), (self.latte, 1)])
+        antes = self.cola()
+        self.agregar(segundo, [(self.croissant, 1)], minutos=1)
+        despues = self.cola()
+        self.assertEqual([t for t in despues if t[0] == primero.id], antes)
+        self.assertIn((segundo.id, self.beto.id, self.en(4), self.en(7)), despues)
+
+    def test_completar_antes_adelanta_solo_esa_cola(self):
+        pedido = self.crear_pedido()
+        self.agregar(pedido, [(self.croissant, 1), (self.latte, 2), (self.latte, 1)])
+        ticket = TicketCocina.objects.get(cocinero=self.beto, fin_estimado=self.en(4))
+        with patch("apps.pedidos.cocina.timezone.now", return_value=self.en(2)):
+            cocina.completar(ticket)
+        self.assertEqual(self.cola(), [
+            (pedido.id, self.ana.id, self.en(0), self.en(8)),
+            (pedido.id, self.beto.id, self.en(2), self.en(5)),
+        ])
+
+    def test_cancelar_retira_los_tickets_y_listo_los_cierra(self):
+        cancelado, listo = self.crear_pedido(), self.crear_pedido()
+        self.agregar(cancelado, [(self.latte, 1)])
+        self.agregar(listo, [(self.croissant, 1)])
+        estados.transicionar(cancelado, estados.CANCELADO)
+        self.assertFalse(TicketCocina.objects.filter(pedido=cancelado).exists())
+        estados.transicionar(listo, estados.LISTO)
+        self.assertEqual(self.cola(), [])
+        self.assertEqual(TicketCocina.objects.get(pedido=listo).estado, TicketCocina.LISTO)
+
+    def test_api_cola_y_tomar_ticket(self):
+        pedido = self.crear_pedido(mesa=3)
+        self.agregar(pedido, [(self.latte, 1)])
+        client = APIClient()
+        client.force_authenticate(self.beto)
+        resp = client.get(reverse("cocina-cola", args=[self.barra.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data[0]["mesa"], 3)
+        self.assertEqual(resp.data[0]["cocinero"], self.ana.id)
+
+        url = reverse("cocina-ticket", args=[resp.data[0]["id"]])
+        resp = client.patch(url, {"estado": "preparando"}, format="json")
+        self.assertEqual(resp.data["cocinero"], self.beto.id)
+        resp = client.patch(url, {"estado": "listo"}, format="json")
+        self.assertTrue(resp.data["pedido_listo"])
+
+    def test_api_ticket_solo_cocina_o_admin(self):
+        pedido = self.crear_pedido()
+        self.agregar(pedido, [(self.latte, 1)])
+        url = reverse("cocina-ticket", args=[TicketCocina.objects.get().id])
+        client = APIClient()
+        for usuario in (self.cliente, self.mesero):
+            client.force_authenticate(usuario)
+            resp = client.patch(url, {"estado": "preparando"}, format="json")
+            self.assertEqual(resp.status_code, 403)
+        self.assertEqual(TicketCocina.objects.get().estado, TicketCocina.PENDIENTE)
+
+    def test_ticket_desactualizado_no_se_avanza_dos_veces(self):
+        pedido = self.crear_pedido()
+        self.agregar(pedido, [(self.latte, 1)])
+        # Dos requests leyeron el ticket pendiente antes de que el otro escribiera
+        primero, segundo = TicketCocina.objects.get(), TicketCocina.objects.get()
+        cocina.iniciar(primero, self.beto)
+        with self.assertRaises(ValidationError):
+            cocina.iniciar(segundo, self.ana)
+        self.assertEqual(TicketCocina.objects.get().cocinero, self.beto)
+
+        primero, segundo = TicketCocina.objects.get(), TicketCocina.objects.get()
+        cocina.completar(primero)
+        fin = TicketCocina.objects.get().fin_real
+        with self.assertRaises(ValidationError):
+            cocina.completar(segundo)
+        self.assertEqual(TicketCocina.objects.get().fin_real, fin)
+
+    def test_lineas_ya_planificadas_por_otro_no_se_publican(self):
+        pedido = self.crear_pedido()
+        self.agregar(pedido, [(self.latte, 1), (self.croissant, 1)])
+        TicketCocina.objects.all().delete()
+        bulk_create = TicketCocina.objects.bulk_create
+
+        def con_competidor(tickets, **kwargs):
+            # Otra transacción inserta el ticket de la primera línea antes
+            otro = tickets[0]
+            TicketCocina.objects.create(
+                detalle_id=otro.detalle_id, pedido_id=otro.pedido_id,
+                estacion_id=otro.estacion_id, duracion=otro.duracion,
+                inicio_estimado=self.en(-10), fin_estimado=self.en(-5))
+            return bulk_create(tickets, **kwargs)
+
+        with patch.object(TicketCocina.objects, "bulk_create", side_effect=con_competidor), \
+                patch.object(cocina.eventos, "publicar") as publicar:
+            creados = cocina.planificar(pedido_ids=[pedido.id])
+        self.assertEqual(len(creados), 1)
+        self.assertIsNotNone(creados[0].pk)
+        self.assertEqual(TicketCocina.objects.count(), 2)
+        publicar.assert_called_once()
+        self.assertEqual(publicar.call_args.kwargs["fin_estimado"],
+                         creados[0].fin_estimado.isoformat())
+
+    def test_sin_estaciones_no_hay_tickets(self):
+        self.barra.delete()
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=1)
+        self.assertFalse(TicketCocina.objects.exists())
+
+
+class ArchivoPedidosTests(PedidoBaseTestCase):
+    def pedido_de_hace(self, dias, entregar=True):
+        pedido = self.crear_pedido()
+        DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=1)
+        if entregar:
+            pedido.entregar()
+        Pedido.objects.filter(pk=pedido.pk).update(
+            fecha_pedido=timezone.now() - timedelta(days=dias))
+        return Pedido.objects.get(pk=pedido.pk)
+
+    def archivar(self, **opts):
+        call_command("archivar_pedidos", *[f"--{k}={v}" for k, v in opts.items()],
+                     stdout=io.StringIO())
+
+    def test_archiva_solo_cerrados_antiguos_por_lotes(self):
+        viejos = [self.pedido_de_hace(40) for _ in range(3)]
+        abierto = self.pedido_de_hace(40, entregar=False)
+        reciente = self.pedido_de_hace(2)
+        credito = Credito.objects.create(
+            cliente=self.cliente, limite=50000,
+            estado=catalogos.estados_credito.obtener("Activo"))
+        credito.consumir(8000, pedido=viejos[0])
+
+        self.archivar(dias=21, lote=2)
+
+        self.assertEqual(sorted(PedidoArchivado.objects.values_list("id", flat=True)),
+                         [p.pk for p in viejos])
+        self.assertEqual(set(Pedido.objects.values_list("id", flat=True)),
+                         {abierto.pk, reciente.pk})
+        self.assertEqual(DetallePedidoArchivado.objects.count(), 3)
+        self.assertFalse(DetallePedido.objects.filter(
+            pedido_id__in=[p.pk for p in viejos]).exists())
+        archivado = PedidoArchivado.objects.get(pk=viejos[0].pk)
+        self.assertEqual(archivado.fecha_pedido, viejos[0].fecha_pedido)
+        self.assertEqual(archivado.total, viejos[0].total)
+        movimiento = MovimientoCredito.objects.get()
+        self.assertEqual((movimiento.pedido_id, movimiento.pedido_archivado_id),
+                         (None, viejos[0].pk))
+        self.assertEqual(AuditoriaCredito.objects.get().pedido_archivado_id,
+                         viejos[0].pk)
+
+    def test_restaurar_devuelve_pedido_lineas_y_enlaces(self):
+        pedido = self.pedido_de_hace(40)
+        linea = pedido.detalles.get()
+        credito = Credito.objects.create(
+            cliente=self.cliente, limite=50000,
+            estado=catalogos.estados_credito.obtener("Activo"))
+        credito.consumir(8000, pedido=pedido)
+        self.archivar(dias=21)
+        stock = self.stock_de(self.latte)
+
+        call_command("restaurar_pedidos", str(pedido.pk), stdout=io.StringIO())
+
+        restaurado = Pedido.objects.get(pk=pedido.pk)
+        self.assertEqual(restaurado.fecha_pedido, pedido.fecha_pedido)
+        self.assertEqual(restaurado.estado_id, pedido.estado_id)
+        self.assertEqual(list(restaurado.detalles.values_list("id", "cantidad")),
+                         [(linea.pk, 1)])
+        self.assertEqual(MovimientoCredito.objects.get().pedido_id, pedido.pk)
+        self.assertFalse(PedidoArchivado.objects.exists())
+        self.assertFalse(DetallePedidoArchivado.objects.exists())
+        self.assertEqual(self.stock_de(self.latte), stock)
+
+    def test_historial_recorre_vivos_y_archivados(self):
+        for dias in (50, 30, 10, 1):
+            self.pedido_de_hace(dias)
+        self.pedido_de_hace(45, entregar=False)
+        self.archivar(dias=21)
+        self.assertEqual(PedidoArchivado.objects.count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+        url = reverse("mis-pedidos-todos") + "?page_size=2"
+        vistos = []
+        while url:
+            resp = client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            vistos += [(p["id"], p["detalles"][0]["cantidad"])
+                       for p in resp.data["results"]]
+            url = resp.data["next"]
+
+        fechas_por_id = dict(Pedido.objects.values_list("id", "fecha_pedido"))
+        fechas_por_id.update(PedidoArchivado.objects.values_list("id", "fecha_pedido"))
+        esperado = sorted(fechas_por_id, key=lambda i: (fechas_por_id[i], i),
+                          reverse=True)
+        self.assertEqual([i for i, _ in vistos], esperado)
+
+    def test_reconstruir_ventas_incluye_archivo(self):
+        self.pedido_de_hace(40)
+        self.pedido_de_hace(1)
+        self.archivar(dias=21)
+        VentaDiaria.objects.all().delete()
+        call_command("reconstruir_ventas", stdout=io.StringIO())
+        self.assertEqual(
+            sum(VentaDiaria.objects.values_list("unidades", flat=True)), 2)
+
+
+class SincronizacionTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mesero)
+        self.url = reverse("sincronizar")
+        self.hace_10 = timezone.now() - timedelta(minutes=10)
+
+    def sincronizar(self, operaciones=(), token=None):
+        datos = {"operaciones": list(operaciones)}
+        if token:
+            datos["token"] = token
+        resp = self.client.post(self.url, datos, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data
+
+    def op(self, accion, minuto, **datos):
+        return {"accion": accion, "uuid": str(uuid.uuid4()),
+                "en": (self.hace_10 + timedelta(minutes=minuto)).isoformat(),
+                **datos}
+
+    def lote_offline(self):
+        crear = self.op("crear_pedido", 0, metodo_pago=self.efectivo.pk, mesa=4)
+        return crear, [
+            crear,
+            self.op("agregar_linea", 1, pedido_uuid=crear["uuid"],
+                    variante=self.latte.pk, cantidad=2),
+            self.op("agregar_linea", 2, pedido_uuid=crear["uuid"],
+                    variante=self.croissant.pk, cantidad=1),
+            # Desordenada a propósito: se aplica por `en`
+            self.op("cambiar_estado", 3, pedido_uuid=crear["uuid"],
+                    estado="Entregado"),
+        ][::-1]
+
+    def test_lote_offline_crea_lineas_y_entrega(self):
+        crear, operaciones = self.lote_offline()
+        datos = self.sincronizar(operaciones)
+
+        self.assertEqual([r["resultado"] for r in datos["resultados"]],
+                         ["aplicado"] * 4)
+        pedido = Pedido.objects.get(uuid_cliente=crear["uuid"])
+        self.assertEqual(pedido.fecha_pedido, self.hace_10)
+        self.assertEqual(pedido.nombre_estado, "Entregado")
+        self.assertEqual((pedido.total, pedido.empleado), (21000, self.mesero))
+        self.assertEqual(self.stock_de(self.latte), (8, 0))
+        cambio, = datos["cambios"]
+        self.assertEqual((cambio["id"], str(cambio["uuid"])), (pedido.pk, crear["uuid"]))
+        self.assertEqual(len(cambio["detalles"]), 2)
+        self.assertTrue(datos["token"])
+
+    def test_reenviar_el_lote_no_duplica(self):
+        _, operaciones = self.lote_offline()
+        self.sincronizar(operaciones)
+        datos = self.sincronizar(operaciones)
+        self.assertEqual([r["resultado"] for r in datos["resultados"]],
+                         ["duplicado"] * 4)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(DetallePedido.objects.count(), 2)
+        self.assertEqual(self.stock_de(self.latte), (8, 0))
+
+    def test_reenviar_un_pedido_archivado_no_lo_recrea(self):
+        crear, operaciones = self.lote_offline()
+        self.sincronizar(operaciones)
+        archivo.archivar(antes_de=timezone.now())
+        pedido = PedidoArchivado.objects.get(uuid_cliente=crear["uuid"])
+
+        datos = self.sincronizar(operaciones[1:])
+        self.assertEqual([r["resultado"] for r in datos["resultados"]],
+                         ["duplicado"] * 3)
+        resultado, = [r for r in datos["resultados"] if str(r["uuid"]) == crear["uuid"]]
+        self.assertEqual(resultado["pedido"], pedido.pk)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(DetallePedido.objects.exists())
+
+    def test_reenvio_simultaneo_es_duplicado(self):
+        crear = self.op("crear_pedido", 0, metodo_pago=self.efectivo.pk, mesa=4)
+        self.sincronizar([crear])
+        pedido = Pedido.objects.get()
+        # El otro envío todavía no lo veía al consultar
+        with patch("apps.pedidos.sincronizacion._pedido_existente",
+                   side_effect=[None, pedido.pk]):
+            datos = self.sincronizar([crear])
+        resultado, = datos["resultados"]
+        self.assertEqual((resultado["resultado"], resultado["pedido"]),
+                         ("duplicado", pedido.pk))
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_conflictos_no_deshacen_el_resto(self):
+        cancelado = self.crear_pedido()
+        cancelado.cancelar()
+        viejo = self.crear_pedido()
+        version_vista = viejo.version
+        viejo.notas = "cambiado en el servidor"
+        viejo.save()
+
+        pedido = self.crear_pedido()
+        latte = self.op("agregar_linea", 0, pedido_id=pedido.pk,
+                        variante=self.latte.pk, cantidad=1)
+        sin_stock = self.op("agregar_linea", 1, pedido_id=pedido.pk,
+                            variante=self.croissant.pk, cantidad=5)
+        datos = self.sincronizar([
+            latte, sin_stock,
+            self.op("agregar_linea", 2, pedido_id=cancelado.pk,
+                    variante=self.latte.pk, cantidad=1),
+            self.op("cambiar_estado", 3, pedido_id=viejo.pk,
+                    estado="Cancelado", version=version_vista),
+            self.op("cambiar_estado", 4, pedido_uuid=str(uuid.uuid4()),
+                    estado="Listo"),
+        ])
+
+        resultados = [(r["resultado"], r.get("motivo")) for r in datos["resultados"]]
+        self.assertEqual(resultados, [
+            ("aplicado", None), ("conflicto", "stock"), ("conflicto", "finalizado"),
+            ("conflicto", "version"), ("conflicto", "no_encontrado")])
+        self.assertIn(self.croissant.pk, datos["resultados"][1]["faltantes"])
+        self.assertEqual(list(pedido.detalles.values_list("variante", flat=True)),
+                         [self.latte.pk])
+        self.assertEqual(self.stock_de(self.latte), (10, 1))
+        viejo.refresh_from_db()
+        self.assertEqual(viejo.nombre_estado, "Pendiente")
+
+    def test_feed_desde_el_token(self):
+        anterior = self.crear_pedido()
+        datos = self.sincronizar()
+        self.assertEqual([c["id"] for c in datos["cambios"]], [anterior.pk])
+        Pedido.objects.filter(pk=anterior.pk).update(
+            actualizado=timezone.now() - timedelta(hours=1))
+
+        nuevo = self.crear_pedido()
+        datos = self.sincronizar(token=datos["token"])
+        self.assertEqual([c["id"] for c in datos["cambios"]], [nuevo.pk])
+
+        anterior.cancelar()  # update() por queryset también cuenta
+        datos = self.sincronizar(token=datos["token"])
+        self.assertIn(anterior.pk, [c["id"] for c in datos["cambios"]])
+
+    def test_feed_por_paginas_y_token_invalido(self):
+        pedidos = [self.crear_pedido() for _ in range(3)]
+        vistos, token, mas = [], None, True
+        while mas:
+            cambios, token, mas = sincronizacion.cambios(
+                sincronizacion.leer_token(token) if token else None, limite=2)
+            vistos += [p.pk for p in cambios]
+            if not mas:
+                break
+        self.assertEqual(vistos, [p.pk for p in pedidos])
+
+        resp = self.client.post(self.url, {"token": "xxx"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_solo_meseros(self):
+        self.client.force_authenticate(self.cliente)
+        resp = self.client.post(self.url, {}, format="json")
+        self.assertEqual(resp.status_code, 403)
+
+
+class BenchTests(TestCase):
+    def setUp(self):
+        catalogos.invalidar_todos()
+
+    def test_escenario_corre_sobre_datos_sembrados(self):
+        datos = bench.sembrar(variantes=9, pedidos=30, hoy=3, clientes=6,
+                              reservas=10)
+        self.assertEqual((datos["pedidos"], datos["variantes"]), (33, 9))
+
+        escenario = bench.Escenario()
+        escenario.ciclo()
+        escenario.ciclo()
+        for paso in escenario.pasos.values():
+            self.assertEqual(len(paso.latencias), 2, paso.nombre)
+        r = bench.resumen(escenario.pasos["entregar_credito"])
+        self.assertGreater(r["consultas"], 0)
+        self.assertGreaterEqual(Pedido.objects.filter(
+            estado__nombre="Entregado", metodo_pago__nombre="credito",
+            fecha_pedido__date=timezone.localdate()).count(), 2)
+
+    def test_percentiles_y_comparacion(self):
+        self.assertEqual(bench.percentil(list(range(1, 101)), 95), 95)
+        self.assertEqual(bench.percentil([5], 99), 5)
+        base = {"menu": {"p95_ms": 10.0, "consultas": 4}}
+        filas = bench.comparar({"menu": {"p95_ms": 12.0, "consultas": 5}}, base, 0.25)
+        self.assertEqual([f[-1] for f in filas], [False, True])
+
+
+class ResumenPedidoTests(PedidoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pedido = self.crear_pedido()
+        self.linea = DetallePedido.objects.create(
+            pedido=self.pedido, variante=self.latte, cantidad=2)
+        DetallePedido.objects.create(
+            pedido=self.pedido, variante=self.croissant, cantidad=1)
+
+    def test_resumen_sigue_a_las_lineas(self):
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.num_lineas, self.pedido.num_unidades), (2, 3))
+        self.assertEqual(self.pedido.resumen_items,
+                         "Latte Grande x2, Latte Croissant")
+        self.linea.delete()
+        self.pedido.refresh_from_db()
+        self.assertEqual((self.pedido.num_lineas, self.pedido.num_unidades), (1, 1))
+        self.assertEqual(self.pedido.resumen_items, "Latte Croissant")
+
+    def test_resumen_largo_se_recorta(self):
+        texto = resumir_items([(1, "Producto muy largo", str(i)) for i in range(20)])
+        self.assertLessEqual(len(texto), LARGO_RESUMEN)
+        self.assertTrue(texto.endswith("…"))
+
+    def test_fecha_estado_cambia_con_la_transicion(self):
+        Pedido.objects.filter(pk=self.pedido.pk).update(
+            fecha_estado=timezone.now() - timedelta(days=1))
+        antes = timezone.now()
+        estados.transicionar(Pedido.objects.get(pk=self.pedido.pk), estados.EN_COCINA)
+        self.pedido.refresh_from_db()
+        self.assertGreaterEqual(self.pedido.fecha_estado, antes)
+
+    def test_vista_resumen_no_trae_detalles(self):
+        for _ in range(3):
+            pedido = self.crear_pedido()
+            DetallePedido.objects.create(pedido=pedido, variante=self.latte, cantidad=1)
+        client = APIClient()
+        client.force_authenticate(self.mesero)
+        url = reverse("pedido-list-create")
+        with CaptureQueriesContext(connection) as completo:
+            resp = client.get(url)
+        with CaptureQueriesContext(connection) as resumen:
+            corto = client.get(url, {"vista": "resumen"})
+        self.assertEqual(corto.status_code, 200)
+        self.assertLess(len(resumen), len(completo))
+        fila = next(p for p in corto.data["results"] if p["id"] == self.pedido.pk)
+        self.assertNotIn("detalles", fila)
+        self.assertIn("detalles", resp.data["results"][0])
+        self.assertEqual((fila["num_lineas"], fila["num_unidades"]), (2, 3))
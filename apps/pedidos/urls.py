@@ -14,12 +14,19 @@ urlpatterns = [
     # Pedidos
     path("pedidos/", PedidoListCreateView.as_view(), name="pedido-list-create"),
     path("pedidos/<int:pk>/", PedidoDetailView.as_view(), name="pedido-detail"),
+    path("pedidos/transiciones/", PedidoTransicionesView.as_view(),
+         name="pedido-transiciones"),
+
+    # Sincronización de tablets
+    path("sincronizar/", SincronizacionView.as_view(), name="sincronizar"),
 
     # Detalles
     path("detalles/", DetallePedidoListCreateView.as_view(),
          name="detalle-list-create"),
     path("detalles/<int:pk>/", DetallePedidoDetailView.as_view(),
          name="detalle-detail"),
+    path("pedidos/<int:pk>/detalles/bulk/", DetallePedidoBulkCreateView.as_view(),
+         name="pedido-detalles-bulk"),
 
     # Variantes disponibles
     path("variantes-disponibles/", VariantesDisponiblesListView.as_view(),
@@ -27,6 +34,16 @@ urlpatterns = [
 
     # Pedidos en cocina
     path("pedidos/cocina/", PedidosCocinaListView.as_view(), name="pedidos-cocina"),
+    path("pedidos/cocina/eventos/", pedidos_cocina_eventos,
+         name="pedidos-cocina-eventos"),
+
+    # Colas de cocina por estación
+    path("cocina/estaciones/", EstacionesCocinaView.as_view(),
+         name="cocina-estaciones"),
+    path("cocina/estaciones/<int:pk>/cola/", ColaEstacionView.as_view(),
+         name="cocina-cola"),
+    path("cocina/tickets/<int:pk>/", TicketCocinaEstadoView.as_view(),
+         name="cocina-ticket"),
 
     # Mis pedidos últimos 15 días
     path("mis-pedidos/ultimos-15-dias/",
@@ -38,5 +55,8 @@ urlpatterns = [
 
     # Estado en tiempo real
     path("pedidos/estado/<int:pk>/",
-         PedidoEstadoView.as_view(), name="pedido-estado"),
+         pedido_estado, name="pedido-estado"),
+
+    # Reportes
+    path("reportes/ventas/", ReporteVentasView.as_view(), name="reporte-ventas"),
 ]
@@ -0,0 +1,166 @@
+"""
+Rollup de ventas por día (VentaDiaria).
+
+- registrar(): suma (o resta, al anular una entrega) las líneas de un
+  lote de pedidos con un número fijo de consultas, sin importar cuántos
+  pedidos o filas del rollup toque.
+- reconstruir(): recalcula un rango de fechas desde DetallePedido (y su
+  archivo), por tramos de días, para corregir o poblar el histórico.
+- Cada registro se suma también al índice de más vendidos (populares.py).
+
+La fecha es el día local (TIME_ZONE) de `fecha_pedido`; el costo es el
+`costo` de la variante al registrar la venta, guardado en la línea
+(`costo_unitario`) para que anular reste lo mismo que se sumó aunque el
+costo cambie en el medio.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from apps.core import catalogos, fechas
+from apps.inventario.models import ProductoVariante
+from .models import DetallePedido, DetallePedidoArchivado, VentaDiaria
+from . import populares
+
+CERO = Decimal("0")
+
+# Líneas registradas antes de guardar el costo: el de la variante
+COSTO = Coalesce("costo_unitario", "variante__costo")
+
+
+def _clave(fecha, variante_id, metodo_pago_id, tipo):
+    return (fecha, variante_id, metodo_pago_id, tipo)
+
+
+# ---------- Incremental ----------
+def registrar(pedidos, signo=1):
+    """Acumula en VentaDiaria las líneas de `pedidos` (signo=-1 para anular)."""
+    pedidos = {p.pk: p for p in pedidos}
+    if not pedidos:
+        return
+
+    lineas = DetallePedido.objects.filter(
+        pedido_id__in=list(pedidos), variante__isnull=False)
+    if signo > 0:
+        _fijar_costo(lineas)
+    deltas = defaultdict(lambda: [0, CERO, CERO])
+    por_producto = defaultdict(lambda: [0, CERO])
+    for pedido_id, variante_id, producto_id, cantidad, subtotal, costo in (
+            lineas.values_list("pedido_id", "variante_id", "variante__producto_id",
+                               "cantidad", "subtotal", COSTO)):
+        p = pedidos[pedido_id]
+        fecha = timezone.localdate(p.fecha_pedido)
+        delta = deltas[_clave(fecha, variante_id, p.metodo_pago_id, p.tipo)]
+        delta[0] += signo * cantidad
+        delta[1] += signo * subtotal
+        delta[2] += signo * cantidad * costo
+        producto = por_producto[(fecha, producto_id)]
+        producto[0] += signo * cantidad
+        producto[1] += signo * subtotal
+    if deltas:
+        with transaction.atomic():
+            _acumular(deltas)
+            populares.acumular(dict(por_producto))
+
+
+def _fijar_costo(lineas):
+    """Guarda en las líneas que todavía no lo tienen el costo actual de su variante."""
+    lineas.filter(costo_unitario__isnull=True).update(costo_unitario=Subquery(
+        ProductoVariante.objects.filter(pk=OuterRef("variante_id")).values("costo")[:1]))
+
+
+def _acumular(deltas):
+    # 1) Asegura las filas (sin pisar las existentes), 2) las bloquea,
+    # 3) escribe los nuevos acumulados en un solo UPDATE.
+    VentaDiaria.objects.bulk_create(
+        [VentaDiaria(fecha=f, variante_id=v, metodo_pago_id=m, tipo=t)
+         for f, v, m, t in deltas],
+        ignore_conflicts=True,
+    )
+    filas = [
+        fila for fila in VentaDiaria.objects.select_for_update().filter(
+            fecha__in={k[0] for k in deltas},
+            variante_id__in={k[1] for k in deltas},
+        )
+        if _clave(fila.fecha, fila.variante_id, fila.metodo_pago_id,
+                  fila.tipo) in deltas
+    ]
+    for fila in filas:
+        unidades, ingresos, costo = deltas[_clave(
+            fila.fecha, fila.variante_id, fila.metodo_pago_id, fila.tipo)]
+        fila.unidades += unidades
+        fila.ingresos += ingresos
+        fila.costo += costo
+    VentaDiaria.objects.bulk_update(filas, ["unidades", "ingresos", "costo"])
+
+
+def anular(pedidos):
+    registrar(pedidos, signo=-1)
+
+
+# ---------- Reconstrucción ----------
+def tramos(desde, hasta, dias):
+    """Parte [desde, hasta] en tramos de `dias` días."""
+    actual = desde
+    while actual <= hasta:
+        fin = min(actual + timedelta(days=dias - 1), hasta)
+        yield actual, fin
+        actual = fin + timedelta(days=1)
+
+
+def _agregado(modelo, inicio, fin):
+    return (
+        modelo.objects.filter(
+            pedido__fecha_pedido__gte=inicio,
+            pedido__fecha_pedido__lt=fin,
+            pedido__estado_id__in=catalogos.estados_pedido.ids(["Entregado"]),
+            variante__isnull=False,
+        )
+        .annotate(fecha=TruncDate("pedido__fecha_pedido"))
+        .values("fecha", "variante_id", "pedido__metodo_pago_id", "pedido__tipo")
+        .annotate(
+            unidades=Sum("cantidad"),
+            ingresos=Sum("subtotal"),
+            costo=Sum(ExpressionWrapper(
+                F("cantidad") * COSTO,
+                output_field=DecimalField(max_digits=12, decimal_places=2))),
+        )
+        .order_by()
+    )
+
+
+@transaction.atomic
+def reconstruir(desde, hasta):
+    """Borra y recalcula VentaDiaria entre `desde` y `hasta` (inclusive)."""
+    inicio, fin = fechas.rango_dias(desde, hasta)
+    VentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+
+    # Pedidos vivos y archivados (ver archivo.py)
+    acumulado = defaultdict(lambda: [0, CERO, CERO])
+    for modelo in (DetallePedido, DetallePedidoArchivado):
+        for f in _agregado(modelo, inicio, fin):
+            fila = acumulado[_clave(f["fecha"], f["variante_id"],
+                                    f["pedido__metodo_pago_id"], f["pedido__tipo"])]
+            fila[0] += f["unidades"]
+            fila[1] += f["ingresos"]
+            fila[2] += f["costo"] or CERO
+    transaction.on_commit(populares.invalidar)
+    nuevas = VentaDiaria.objects.bulk_create([
+        VentaDiaria(
+            fecha=fecha,
+            variante_id=variante_id,
+            metodo_pago_id=metodo_pago_id,
+            tipo=tipo,
+            unidades=unidades,
+            ingresos=ingresos,
+            costo=costo,
+        )
+        for (fecha, variante_id, metodo_pago_id, tipo), (unidades, ingresos, costo)
+        in acumulado.items()
+    ], batch_size=500)
+    return len(nuevas)
@@ -2,20 +2,49 @@ from rest_framework import generics, permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework import status
 from django.utils.timezone import localdate
 from django.core.exceptions import ValidationError
-from .models import Pedido, DetallePedido, EstadoPedido, MetodoPago
+from .models import (
+    Pedido, DetallePedido, EstadoPedido, MetodoPago, VentaDiaria,
+    EstacionCocina, TicketCocina,
+)
 from .serializers import (
     PedidoSerializer,
+    PedidoLecturaSerializer,
     DetallePedidoSerializer,
+    DetallePedidoBulkSerializer,
+    TransicionLoteSerializer,
+    SincronizacionSerializer,
+    EstacionCocinaSerializer,
+    TicketCocinaSerializer,
+    TicketEstadoSerializer,
     EstadoSerializer,
     MetodoPagoSerializer,
 )
 from apps.inventario.models import ProductoVariante
+from apps.inventario.stock import StockInsuficiente
 from apps.inventario.serializers import ProductoVarianteSerializer
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Prefetch
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+import asyncio
+import json
+from apps.core import catalogos, fechas
+from apps.usuarios.permissions import EsAdmin, EsCocinero, EsMesero
+from apps.core.paginacion import PedidoCursorPagination
+from apps.core.idempotencia import idempotente
+from apps.core.concurrencia import ConflictoVersionMixin
+from . import services, eventos, seguimiento, estados, cocina, archivo, sincronizacion
 
 
 # ================================
@@ -46,18 +75,54 @@ class MetodoPagoDetailView(generics.RetrieveUpdateDestroyAPIView):
 # LISTAR Y CREAR PEDIDOS
 # ================================
 
-class PedidoListCreateView(generics.ListCreateAPIView):
+class LecturaRapidaMixin:
+    """
+    En GET de listas serializa con PedidoLecturaSerializer. Con
+    ?vista=resumen no se traen los detalles: cada pedido lleva solo sus
+    columnas de resumen (num_lineas, num_unidades, resumen_items).
+    """
+
+    def es_resumen(self):
+        return self.request.query_params.get("vista") == "resumen"
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.es_resumen():
+            return queryset
+        # archivo.historial() devuelve [vivos, archivados]
+        if isinstance(queryset, list):
+            return [qs.prefetch_related(None) for qs in queryset]
+        return queryset.prefetch_related(None)
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        contexto["resumen"] = self.es_resumen()
+        return contexto
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == "GET" and kwargs.get("many"):
+            kwargs.setdefault("context", self.get_serializer_context())
+            return PedidoLecturaSerializer(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+
+class PedidoListCreateView(LecturaRapidaMixin, generics.ListCreateAPIView):
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PedidoCursorPagination
+
+    @idempotente
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
 
     def get_queryset(self):
-        hoy = localdate()
+        hoy = fechas.filtro_dia("fecha_pedido")
         user = self.request.user
 
         if user.rol in ["MESERO", "COCINERO"]:
             # Mesero ve todos los del día
             return (
-                Pedido.objects.filter(fecha_pedido__date=hoy)
+                Pedido.objects.filter(**hoy)
                 .select_related("cliente", "empleado", "estado", "metodo_pago")
                 .prefetch_related(
                     Prefetch(
@@ -67,14 +132,14 @@ class PedidoListCreateView(generics.ListCreateAPIView):
                         ),
                     )
                 )
-                .order_by("-id")
+                .order_by("-fecha_pedido", "-id")
             )
         else:
             # Cliente (o cualquier otro rol) solo ve los suyos
             return (
                 Pedido.objects.filter(
-                    fecha_pedido__date=hoy,
-                    cliente=user
+                    cliente=user,
+                    **hoy
                 )
                 .select_related("cliente", "empleado", "estado", "metodo_pago")
                 .prefetch_related(
@@ -85,7 +150,7 @@ class PedidoListCreateView(generics.ListCreateAPIView):
                         ),
                     )
                 )
-                .order_by("-id")
+                .order_by("-fecha_pedido", "-id")
             )
 
     def perform_create(self, serializer):
@@ -97,7 +162,7 @@ class PedidoListCreateView(generics.ListCreateAPIView):
 # DETALLE, EDITAR Y ELIMINAR PEDIDO
 # ================================
 
-class PedidoDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PedidoDetailView(ConflictoVersionMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = (
         Pedido.objects.all()
         .select_related("cliente", "empleado", "estado", "metodo_pago")
@@ -118,23 +183,20 @@ class PedidoDetailView(generics.RetrieveUpdateDestroyAPIView):
         context["request"] = self.request
         return context
 
+    @transaction.atomic
     def perform_update(self, serializer):
         pedido = serializer.instance
 
-        if pedido.estado.nombre in ["Entregado", "Cancelado"]:
+        if estados.es_final(pedido.estado_id):
             raise ValidationError("No se puede editar un pedido finalizado.")
 
-        old_estado = pedido.estado.nombre
-        new_estado_obj = serializer.validated_data.get("estado", pedido.estado)
+        # El estado no se escribe directo: pasa por la máquina de estados
+        destino = serializer.validated_data.pop("estado", None)
 
         super().perform_update(serializer)
 
-        new_estado = new_estado_obj.nombre
-
-        if old_estado != "Entregado" and new_estado == "Entregado":
-            pedido.entregar()
-        elif old_estado != "Cancelado" and new_estado == "Cancelado":
-            pedido.cancelar()
+        if destino is not None and destino.pk != pedido.estado_id:
+            estados.transicionar(pedido, destino.nombre)
 
 
 # ================================
@@ -142,18 +204,146 @@ class PedidoDetailView(generics.RetrieveUpdateDestroyAPIView):
 # ================================
 
 class PedidoEstadoView(APIView):
+    """
+    Estado del pedido con ETag por versión (ver seguimiento.py).
+    If-None-Match con la versión actual → 304 sin leer la tabla Pedido.
+    El long-poll (?wait=N) lo resuelve pedido_estado antes de llegar acá.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
-        try:
-            pedido = Pedido.objects.get(pk=pk, cliente=request.user)
-            return Response({
-                "id": pedido.id,
-                "estado": pedido.estado.nombre
-            })
-        except Pedido.DoesNotExist:
+        entrada = seguimiento.obtener(pk)
+        if entrada is None:
+            try:
+                pedido = Pedido.objects.get(pk=pk)
+            except Pedido.DoesNotExist:
+                return Response({"error": "Pedido no encontrado"}, status=404)
+            entrada = seguimiento.sembrar(
+                pedido.id, pedido.cliente_id, pedido.nombre_estado)
+
+        if entrada["cliente"] != request.user.id:
             return Response({"error": "Pedido no encontrado"}, status=404)
 
+        if seguimiento.coincide(entrada, request.headers.get("If-None-Match")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                "id": entrada["pedido"],
+                "estado": entrada["estado"]
+            })
+        response["ETag"] = seguimiento.etag(entrada)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+ESPERA_MAXIMA = 30
+_pedido_estado = PedidoEstadoView.as_view()
+
+
+def _segundos_espera(request):
+    try:
+        espera = int(request.GET.get("wait", 0))
+    except ValueError:
+        return 0
+    return max(0, min(espera, ESPERA_MAXIMA))
+
+
+@csrf_exempt
+async def pedido_estado(request, pk):
+    """
+    PedidoEstadoView con long-poll: ?wait=N (máx. ESPERA_MAXIMA s) junto
+    con If-None-Match espera a que el estado cambie o venza el tiempo y
+    después responde como siempre (200 o 304).
+    Solo con ASGI, donde la espera no ocupa un hilo; con WSGI cada espera
+    tomaría un worker, así que `wait` se ignora y se responde al instante.
+    """
+    espera = _segundos_espera(request)
+    if_none_match = request.headers.get("If-None-Match")
+    if espera and if_none_match and isinstance(request, ASGIRequest):
+        usuario = await _usuario_jwt(request)
+        entrada = await seguimiento.aobtener(pk)
+        if (usuario is not None and entrada is not None
+                and entrada["cliente"] == usuario.id
+                and seguimiento.coincide(entrada, if_none_match)):
+            await seguimiento.esperar_cambio(pk, entrada["version"], espera)
+    return await sync_to_async(_pedido_estado)(request, pk=pk)
+
+
+# ================================
+# TRANSICIONES EN LOTE
+# ================================
+
+class PedidoTransicionesView(APIView):
+    """
+    Mueve varios pedidos al mismo estado en una petición (cola de cocina).
+    Body: { "pedidos": [12, 13, 15], "estado": "Listo" }
+    Todo o nada: si alguno no puede pasar, responde 400 con `errores`.
+    """
+    permission_classes = [IsAuthenticated, EsMesero | EsCocinero | EsAdmin]
+
+    def post(self, request):
+        serializer = TransicionLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["pedidos"]
+        destino = serializer.validated_data["estado"]
+
+        faltantes = set(ids) - set(
+            Pedido.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        if faltantes:
+            return Response({"error": "Pedidos no encontrados",
+                             "pedidos": sorted(faltantes)}, status=404)
+
+        try:
+            movidos = estados.transicionar(
+                Pedido.objects.filter(pk__in=ids), destino)
+        except estados.TransicionInvalida as e:
+            return Response({"error": "Transición no permitida",
+                             "errores": e.errores},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except StockInsuficiente as e:
+            return Response({"error": e.message, "faltantes": e.faltantes},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"estado": destino,
+                         "movidos": [p.id for p in movidos]})
+
+
+# ================================
+# SINCRONIZACIÓN DE TABLETS (sin conexión)
+# ================================
+
+class SincronizacionView(APIView):
+    """
+    Aplica lo que la tablet hizo sin conexión y devuelve lo que cambió.
+    Body: { "token": "...", "operaciones": [
+        {"accion": "crear_pedido", "uuid": "...", "en": "...", "metodo_pago": 1, "mesa": 4},
+        {"accion": "agregar_linea", "uuid": "...", "en": "...", "pedido_uuid": "...",
+         "variante": 3, "cantidad": 2},
+        {"accion": "cambiar_estado", "uuid": "...", "en": "...", "pedido_id": 12,
+         "estado": "Entregado", "version": 4}] }
+    Responde { "resultados": [...], "cambios": [...], "token": "...", "mas": false }.
+    Con "mas": true la tablet repite con el token nuevo y sin operaciones.
+    """
+    permission_classes = [IsAuthenticated, EsMesero | EsAdmin]
+
+    def post(self, request):
+        serializer = SincronizacionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        resultados = sincronizacion.aplicar(
+            datos.get("operaciones", []), request.user)
+        pedidos, token, mas = sincronizacion.cambios(datos.get("token"))
+        lectura = PedidoLecturaSerializer(
+            pedidos, many=True, context={"request": request}).data
+        return Response({
+            "resultados": resultados,
+            "cambios": [{**d, "uuid": p.uuid_cliente}
+                        for p, d in zip(pedidos, lectura)],
+            "token": token,
+            "mas": mas,
+        })
+
 
 # ================================
 # DETALLES DE PEDIDO
@@ -164,6 +354,10 @@ class DetallePedidoListCreateView(generics.ListCreateAPIView):
     queryset = DetallePedido.objects.all().select_related("pedido", "variante")
     permission_classes = [IsAuthenticated]
 
+    @idempotente
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         user = self.request.user
         pedido_id = self.request.data.get("pedido_id")
@@ -171,18 +365,15 @@ class DetallePedidoListCreateView(generics.ListCreateAPIView):
 
         if not pedido_id:
             pedido = Pedido.objects.filter(
-                cliente=user, estado__nombre="Pendiente"
+                cliente=user,
+                estado_id__in=catalogos.estados_pedido.ids(["Pendiente"])
             ).first()
 
             if not pedido:
-                estado_pendiente, _ = EstadoPedido.objects.get_or_create(
-                    nombre="Pendiente"
-                )
-                metodo_efectivo, _ = MetodoPago.objects.get_or_create(
-                    nombre="Efectivo en tienda",
-                    defaults={
-                        "descripcion": "Pago en efectivo al reclamar en tienda"
-                    },
+                estado_pendiente = catalogos.estados_pedido.obtener("Pendiente")
+                metodo_efectivo = catalogos.metodos_pago.obtener(
+                    "Efectivo en tienda",
+                    descripcion="Pago en efectivo al reclamar en tienda",
                 )
                 pedido = Pedido.objects.create(
                     cliente=user,
@@ -194,13 +385,48 @@ class DetallePedidoListCreateView(generics.ListCreateAPIView):
         else:
             pedido = Pedido.objects.get(id=pedido_id)
 
-        if pedido.estado.nombre in ["Entregado", "Cancelado"]:
+        if estados.es_final(pedido.estado_id):
             raise ValidationError(
                 "No se puede agregar productos a un pedido finalizado.")
 
         serializer.save(pedido=pedido)
 
 
+class DetallePedidoBulkCreateView(APIView):
+    """
+    Agrega todas las líneas de una mesa en una sola petición.
+    Body: { "detalles": [{"variante_id": 3, "cantidad": 2}, ...] }
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotente
+    def post(self, request, pk):
+        serializer = DetallePedidoBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            pedido = Pedido.objects.get(pk=pk)
+        except Pedido.DoesNotExist:
+            return Response({"error": "Pedido no encontrado"}, status=404)
+
+        try:
+            detalles = services.agregar_detalles(
+                pedido, serializer.validated_data["detalles"])
+        except StockInsuficiente as e:
+            return Response({"error": e.message, "faltantes": e.faltantes},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({"error": " ".join(e.messages)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "pedido": pedido.id,
+            "total": pedido.total,
+            "detalles": DetallePedidoSerializer(
+                detalles, many=True, context={"request": request}).data,
+        }, status=status.HTTP_201_CREATED)
+
+
 class DetallePedidoDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = DetallePedido.objects.all().select_related("pedido", "variante")
     serializer_class = DetallePedidoSerializer
@@ -208,12 +434,12 @@ class DetallePedidoDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_update(self, serializer):
         detalle = serializer.instance
-        if detalle.pedido.estado.nombre in ["Entregado", "Cancelado"]:
+        if estados.es_final(detalle.pedido.estado_id):
             raise ValidationError("No se puede editar un detalle finalizado.")
         super().perform_update(serializer)
 
     def perform_destroy(self, instance):
-        if instance.pedido.estado.nombre in ["Entregado", "Cancelado"]:
+        if estados.es_final(instance.pedido.estado_id):
             raise ValidationError(
                 "No se puede eliminar un detalle finalizado.")
         super().perform_destroy(instance)
@@ -234,17 +460,16 @@ class VariantesDisponiblesListView(generics.ListAPIView):
 # PANEL DE COCINA
 # ================================
 
-class PedidosCocinaListView(generics.ListAPIView):
+class PedidosCocinaListView(LecturaRapidaMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = PedidoSerializer
 
     def get_queryset(self):
-        hoy = localdate()
-
         return (
             Pedido.objects.filter(
-                fecha_pedido__date=hoy,
-                estado__nombre__in=["Pendiente", "En cocina"]
+                **fechas.filtro_dia("fecha_pedido"),
+                estado_id__in=catalogos.estados_pedido.ids(
+                    [estados.PENDIENTE, estados.EN_COCINA])
             )
             .select_related("estado", "cliente", "empleado", "metodo_pago")
             .prefetch_related(
@@ -258,54 +483,205 @@ class PedidosCocinaListView(generics.ListAPIView):
             .order_by("fecha_pedido")
         )
 
+    def list(self, request, *args, **kwargs):
+        # El seq se toma ANTES de consultar: el stream repite lo posterior
+        seq = eventos.bus().ultimo_seq()
+        response = super().list(request, *args, **kwargs)
+        response["X-Eventos-Seq"] = seq
+        return response
+
+
+# ================================
+# COLAS DE COCINA POR ESTACIÓN (ver cocina.py)
+# ================================
+
+class EstacionesCocinaView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = EstacionCocinaSerializer
+
+    def get_queryset(self):
+        return (
+            EstacionCocina.objects.filter(activo=True)
+            .annotate(abiertos=Count(
+                "tickets", filter=Q(tickets__estado__in=TicketCocina.ABIERTOS)))
+            .prefetch_related("cocineros", "subcategorias")
+            .order_by("nombre")
+        )
+
+
+class ColaEstacionView(generics.ListAPIView):
+    """Tickets abiertos de la estación en orden de preparación."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = TicketCocinaSerializer
+
+    def get_queryset(self):
+        return cocina.cola(self.kwargs["pk"])
+
+
+class TicketCocinaEstadoView(APIView):
+    """
+    Avanza un ticket. Body: { "estado": "preparando" | "listo" }
+    Un cocinero que inicia un ticket de otra cola lo toma para sí.
+    """
+    permission_classes = [IsAuthenticated, EsCocinero | EsAdmin]
+
+    def patch(self, request, pk):
+        serializer = TicketEstadoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ticket = TicketCocina.objects.get(pk=pk)
+        except TicketCocina.DoesNotExist:
+            return Response({"error": "Ticket no encontrado"}, status=404)
+
+        try:
+            if serializer.validated_data["estado"] == TicketCocina.PREPARANDO:
+                cocinero = request.user if request.user.rol == "COCINERO" else None
+                cocina.iniciar(ticket, cocinero)
+            else:
+                cocina.completar(ticket)
+        except ValidationError as e:
+            return Response({"error": " ".join(e.messages)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            **TicketCocinaSerializer(ticket).data,
+            "pedido_listo": cocina.pedido_listo(ticket.pedido_id),
+        })
+
+
+# ================================
+# STREAM DE EVENTOS PARA COCINA (SSE, requiere ASGI)
+# ================================
+
+SSE_PING_SEGUNDOS = 15
+
+
+async def _usuario_jwt(request):
+    """EventSource no envía headers: el token puede venir en ?token="""
+    auth = JWTAuthentication()
+    raw = request.GET.get("token")
+    if not raw:
+        header = auth.get_header(request)
+        raw = auth.get_raw_token(header) if header else None
+    if not raw:
+        return None
+    try:
+        token = auth.get_validated_token(raw)
+        return await sync_to_async(auth.get_user)(token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+async def _stream_sse(desde):
+    suscripcion = eventos.bus().suscribir(desde=desde)
+    siguiente = asyncio.ensure_future(anext(suscripcion))
+    yield "retry: 3000\n\n"
+    try:
+        while True:
+            hecho, _ = await asyncio.wait({siguiente}, timeout=SSE_PING_SEGUNDOS)
+            if not hecho:
+                yield ": ping\n\n"
+                continue
+            evento = siguiente.result()
+            siguiente = asyncio.ensure_future(anext(suscripcion))
+            datos = json.dumps(evento, cls=DjangoJSONEncoder)
+            yield f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+    finally:
+        siguiente.cancel()
+        try:
+            await siguiente
+        except (asyncio.CancelledError, StopAsyncIteration):
+            pass
+        await suscripcion.aclose()
+
+
+async def pedidos_cocina_eventos(request):
+    """
+    Deltas del panel de cocina como server-sent events.
+    Flujo: GET pedidos/cocina/ (snapshot + header X-Eventos-Seq) y luego
+    este stream con ?desde=<seq>. Un evento `resync` pide recargar el snapshot.
+    """
+    usuario = await _usuario_jwt(request)
+    if usuario is None or not usuario.is_active:
+        return JsonResponse({"detail": "No autenticado."}, status=401)
+
+    desde = request.GET.get("desde") or request.headers.get("Last-Event-ID")
+    desde = int(desde) if desde and desde.isdigit() else None
+
+    response = StreamingHttpResponse(
+        _stream_sse(desde), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 
 # ================================
 # PEDIDOS ÚLTIMOS 15 DÍAS
 # ================================
 
-class PedidosUltimos15DiasView(generics.ListAPIView):
+class PedidosUltimos15DiasView(LecturaRapidaMixin, generics.ListAPIView):
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PedidoCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         ahora = timezone.now()
         hace_15 = ahora - timedelta(days=15)
 
-        return (
-            Pedido.objects.filter(cliente=user, fecha_pedido__gte=hace_15)
-            .select_related("cliente", "empleado", "estado", "metodo_pago")
-            .prefetch_related(
-                Prefetch(
-                    "detalles",
-                    queryset=DetallePedido.objects.select_related(
-                        "variante", "variante__producto"
-                    ),
-                )
-            )
-            .order_by("-fecha_pedido")
-        )
+        # Vivo + archivo: el corte de archivar_pedidos puede ser menor a 15 días
+        return archivo.historial(cliente=user, fecha_pedido__gte=hace_15)
 
 
 # ================================
 # MIS PEDIDOS COMPLETOS
 # ================================
 
-class MisPedidosTodosView(generics.ListAPIView):
+class MisPedidosTodosView(LecturaRapidaMixin, generics.ListAPIView):
     serializer_class = PedidoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PedidoCursorPagination
 
     def get_queryset(self):
-        return (
-            Pedido.objects.filter(cliente=self.request.user)
-            .select_related("cliente", "empleado", "estado", "metodo_pago")
-            .prefetch_related(
-                Prefetch(
-                    "detalles",
-                    queryset=DetallePedido.objects.select_related(
-                        "variante", "variante__producto"
-                    ),
-                )
-            )
-            .order_by("-fecha_pedido")
-        )
+        # Historial completo: pedidos vivos y archivados (ver archivo.py)
+        return archivo.historial(cliente=self.request.user)
+
+
+# ================================
+# REPORTES DE VENTAS (rollup VentaDiaria)
+# ================================
+
+class ReporteVentasView(APIView):
+    """
+    Ventas entregadas entre ?desde= y ?hasta= (YYYY-MM-DD, por defecto los
+    últimos 30 días), por día, por método de pago y por tipo de pedido.
+    """
+    permission_classes = [EsAdmin]
+
+    def get(self, request):
+        try:
+            hasta = self._fecha(request, "hasta") or localdate()
+            desde = self._fecha(request, "desde") or hasta - timedelta(days=30)
+        except ValueError:
+            return Response({"error": "Fechas en formato YYYY-MM-DD."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ventas = VentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        totales = dict(unidades=Sum("unidades"), ingresos=Sum("ingresos"),
+                       costo=Sum("costo"))
+        return Response({
+            "desde": desde,
+            "hasta": hasta,
+            "por_dia": list(ventas.values("fecha")
+                            .annotate(**totales).order_by("fecha")),
+            "por_metodo_pago": list(ventas.values(
+                metodo=F("metodo_pago__nombre"))
+                .annotate(**totales).order_by("-ingresos")),
+            "por_tipo": list(ventas.values("tipo")
+                             .annotate(**totales).order_by("-ingresos")),
+        })
+
+    @staticmethod
+    def _fecha(request, nombre):
+        valor = request.query_params.get(nombre)
+        return date.fromisoformat(valor) if valor else None
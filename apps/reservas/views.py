@@ -10,6 +10,7 @@ from django.utils.decorators import method_decorator
 from datetime import datetime, timedelta, time as dt_time
 
 from .models import Reserva, Mesa, Ubicacion, EstadoReserva
+from apps.core import catalogos
 from .serializers import (
     ReservaSerializer,
     MesaSerializer,
@@ -119,9 +120,10 @@ def confirmar_reserva_con_codigo(request):
     codigo = request.data.get("codigo")
     try:
         reserva = Reserva.objects.get(codigo_confirmacion=codigo.upper())
-        if reserva.estado.nombre == "Confirmada":
+        if catalogos.estados_reserva.nombre(reserva.estado_id) == "Confirmada":
             return Response({"detail": "Esta reserva ya está confirmada."}, status=400)
-        reserva.estado = EstadoReserva.objects.get(nombre="Confirmada")
+        reserva.estado = catalogos.estados_reserva.obtener(
+            "Confirmada", crear=False)
         reserva.save()
         return Response({"detail": "Reserva confirmada exitosamente."})
     except Reserva.DoesNotExist:
@@ -162,7 +164,7 @@ class ReservasMeseroPendientesHoyView(generics.ListAPIView):
             Reserva.objects.filter(
                 fecha=hoy,
                 hora_inicio__gte=hora_actual,
-                estado__nombre="Pendiente"
+                estado_id__in=catalogos.estados_reserva.ids(["Pendiente"])
             )
             .select_related('usuario', 'mesa', 'mesa__ubicacion', 'estado')
             .order_by('hora_inicio')
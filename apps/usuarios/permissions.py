@@ -8,6 +8,10 @@ class EsMesero(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.rol == "MESERO"
 
+class EsCocinero(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.rol == "COCINERO"
+
 class EsCliente(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.rol == "CLIENTE"
\ No newline at end of file
@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
+# Servir con un servidor ASGI (uvicorn/daphne) para que el stream SSE
+# de cocina (api/pedidos/pedidos/cocina/eventos/) no bloquee un worker.
 application = get_asgi_application()
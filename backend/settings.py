@@ -14,6 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'django_filters',
 
     # modulos de aplicaciones
+    'apps.core',
     'apps.usuarios',
     'apps.inventario',
     'apps.pedidos',
@@ -99,6 +101,10 @@ CORS_ALLOWED_ORIGINS = [
 # (opcional, para desarrollo)
 CORS_ALLOW_ALL_ORIGINS = False
 
+# Reintentos seguros de POST (ver apps.core.idempotencia)
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed"]
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -132,6 +138,19 @@ DATABASES = {
 
 }
 
+# Las pruebas de concurrencia necesitan ajustes de SQLite propios de los
+# tests (ver backend/test_runner.py).
+TEST_RUNNER = "backend.test_runner.Runner"
+
+# Bus de eventos de pedidos (stream de cocina). Con varios workers usar
+# PEDIDOS_EVENTOS_REDIS_URL para compartir el canal entre procesos.
+PEDIDOS_EVENTOS = {"BACKEND": "apps.pedidos.eventos.BusMemoria"}
+if os.environ.get("PEDIDOS_EVENTOS_REDIS_URL"):
+    PEDIDOS_EVENTOS = {
+        "BACKEND": "apps.pedidos.eventos.BusRedis",
+        "OPTIONS": {"url": os.environ["PEDIDOS_EVENTOS_REDIS_URL"]},
+    }
+
 # users authentication
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class Runner(DiscoverRunner):
+    """
+    Con SQLite las pruebas usan un archivo (no memoria) para que los tests
+    de concurrencia compartan la BD entre conexiones, y BEGIN IMMEDIATE
+    para evitar "database is locked" al pasar de lectura a escritura con
+    varios hilos. Solo en tests: en dev/prod cada atomic() de lectura
+    tomaría el candado de escritura.
+    """
+
+    def setup_databases(self, **kwargs):
+        for conexion in connections.all():
+            if conexion.vendor == "sqlite":
+                conexion.close()
+                conexion.settings_dict["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+                conexion.settings_dict["TEST"]["NAME"] = settings.BASE_DIR / "test_db.sqlite3"
+        return super().setup_databases(**kwargs)